@@ -1,592 +1,6212 @@
-import requests
+import atexit
+import importlib
+import json
+import os
 import random
+import secrets
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, deque
+from functools import lru_cache
+from itertools import combinations, combinations_with_replacement
+from math import comb
+
+
+class LazyModule:
+    def __init__(self, name, alias):
+        """
+        Stand in for a module bound to the global alias, importing it on first attribute access.
+        """
+        self.name = name
+        self.alias = alias
+
+    def __getattr__(self, attribute):
+        """
+        Import the module, rebind the global to it so later lookups skip this proxy, and return the attribute.
+        """
+        module = importlib.import_module(self.name)
+        globals()[self.alias] = module
+        return getattr(module, attribute)
+
+
+# Heavy or optional modules load when a game first needs them, keeping the menu instant
+np = LazyModule("numpy", "np")
+requests = LazyModule("requests", "requests")
+asyncio = LazyModule("asyncio", "asyncio")
+sqlite3 = LazyModule("sqlite3", "sqlite3")
+futures = LazyModule("concurrent.futures", "futures")
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pypop")  # Precomputed tables live here
+DATA_DIR = os.path.join(os.path.expanduser("~"), ".local", "share", "pypop")  # The chip ledger lives here
+
+
+# ------------------ Metrics ------------------
+
+# Histogram bounds in seconds, from a payout lookup (microseconds) to a round a person plays (a minute)
+METRIC_BUCKETS = (0.000001, 0.000005, 0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005,
+                  0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+
+class Metrics:
+    def __init__(self, buckets=METRIC_BUCKETS, prefix="pypop", statsd=None):
+        """
+        Initialize a registry of counters, gauges and latency histograms, optionally mirrored to StatsD.
+
+        Instrumented code only records when the module-level _metrics is set (see set_metrics), so with
+        instrumentation off a hot path pays one global lookup and nothing else.
+        """
+        self.buckets = buckets
+        self.prefix = prefix
+        self.statsd = statsd  # StatsdExporter receiving every update, or None
+        self.lock = threading.Lock()  # Updates come from game loops, refill threads and the ledger writer
+        self.counters = {}  # (name, labels) -> total
+        self.gauges = {}  # (name, labels) -> latest value
+        self.histograms = {}  # (name, labels) -> [observations per bucket with +Inf last, sum, count]
+
+    def inc(self, name, value=1, **labels):
+        """
+        Add value to a counter.
+        """
+        key = (name, tuple(labels.items()))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        if self.statsd:
+            self.statsd.send(name, value, "c", labels)
+
+    def gauge(self, name, value, **labels):
+        """
+        Set a gauge to its current value.
+        """
+        with self.lock:
+            self.gauges[name, tuple(labels.items())] = value
+        if self.statsd:
+            self.statsd.send(name, value, "g", labels)
+
+    def observe(self, name, seconds, **labels):
+        """
+        Record one duration in a histogram.
+        """
+        key = (name, tuple(labels.items()))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bisect_left(self.buckets, seconds)] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+        if self.statsd:
+            self.statsd.send(name, seconds * 1000, "ms", labels)
+
+    @staticmethod
+    def format_labels(labels):
+        """
+        Render label pairs as a Prometheus label set, e.g. {game="slots"}.
+        """
+        return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}" if labels else ""
+
+    def prometheus_text(self):
+        """
+        Render every metric in the Prometheus text exposition format.
+        """
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted((key, (list(counts), total, count))
+                                for key, (counts, total, count) in self.histograms.items())
+        lines = []
+        typed = set()
+        for kind, metrics in (("counter", counters), ("gauge", gauges)):
+            for (name, labels), value in metrics:
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {self.prefix}_{name} {kind}")
+                lines.append(f"{self.prefix}_{name}{self.format_labels(labels)} {value}")
+        for (name, labels), (counts, total, count) in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {self.prefix}_{name} histogram")
+            cumulative = 0
+            for bound, observed in zip(self.buckets + ("+Inf",), counts):
+                cumulative += observed
+                lines.append(f"{self.prefix}_{name}_bucket{self.format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.prefix}_{name}_sum{self.format_labels(labels)} {total}")
+            lines.append(f"{self.prefix}_{name}_count{self.format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+class StatsdExporter:
+    def __init__(self, host="127.0.0.1", port=8125, prefix="pypop", interval=1.0, packet_size=1432):
+        """
+        Initialize a StatsD client that batches metric lines into UDP packets sent every interval seconds.
+
+        Labels are folded into the dotted metric name (pypop.round_seconds.slots), which every StatsD
+        server understands.
+        """
+        import socket
+
+        self.address = (host, port)
+        self.prefix = prefix
+        self.interval = interval
+        self.packet_size = packet_size  # Stays under a typical MTU so packets are never fragmented
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.lock = threading.Lock()
+        self.counters = {}  # Metric path -> increments since the last flush
+        self.gauges = {}  # Metric path -> latest value
+        self.timings = []  # Timing lines, sent one per observation
+        self.packets_sent = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.flush_loop, daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def send(self, name, value, kind, labels):
+        """
+        Queue one update of the given StatsD type ('c', 'g' or 'ms').
+
+        Counter increments are summed and gauges keep their latest value until the next flush, so a hot
+        counter costs one line per interval rather than one per event.
+        """
+        path = ".".join([self.prefix, name, *(str(value).replace(".", "_").replace(":", "_")
+                                              for value in labels.values())])
+        with self.lock:
+            if kind == "c":
+                self.counters[path] = self.counters.get(path, 0) + value
+            elif kind == "g":
+                self.gauges[path] = value
+            else:
+                self.timings.append(f"{path}:{value:g}|{kind}")
+
+    def flush(self):
+        """
+        Send every queued update, packing as many lines as fit into each packet.
+        """
+        with self.lock:
+            lines = [f"{path}:{value:g}|c" for path, value in self.counters.items()]
+            lines += [f"{path}:{value:g}|g" for path, value in self.gauges.items()]
+            lines += self.timings
+            self.counters, self.gauges, self.timings = {}, {}, []
+        packet = ""
+        for line in lines:
+            if packet and len(packet) + len(line) + 1 > self.packet_size:
+                self.send_packet(packet)
+                packet = ""
+            packet = f"{packet}\n{line}" if packet else line
+        if packet:
+            self.send_packet(packet)
+
+    def send_packet(self, packet):
+        """
+        Send one packet; StatsD is fire-and-forget, so a missing server is ignored.
+        """
+        try:
+            self.socket.sendto(packet.encode(), self.address)
+            self.packets_sent += 1
+        except OSError:
+            pass
+
+    def flush_loop(self):
+        """
+        Flush the queue every interval seconds until closed.
+        """
+        while not self.stopped.wait(self.interval):
+            self.flush()
+
+    def close(self):
+        """
+        Stop the flush thread, send what is still queued and close the socket.
+        """
+        self.stopped.set()
+        self.thread.join()
+        self.flush()
+        self.socket.close()
+
+
+class MetricsServer:
+    def __init__(self, metrics, port=9108, host="127.0.0.1"):
+        """
+        Serve the registry for Prometheus to scrape at http://host:port/metrics from a background thread.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.port = self.server.server_port
+        self.url = f"http://{host}:{self.port}/metrics"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        """
+        Stop the server.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ProfileSession:
+    MODES = ("cpu", "memory")
+
+    def __init__(self, modes=("cpu",), output="pypop-profile", top=15):
+        """
+        Initialize a cProfile and/or tracemalloc capture of the session, written to output.pstats and
+        output.memory.txt when stopped.
+        """
+        unknown = set(modes) - set(self.MODES)
+        if unknown:
+            raise ValueError(f"Unknown profile mode {', '.join(sorted(unknown))}; choose cpu and/or memory.")
+        self.modes = tuple(modes)
+        self.output = output
+        self.top = top
+        self.profiler = None
+
+    def start(self):
+        """
+        Start capturing.
+        """
+        if "memory" in self.modes:
+            import tracemalloc
+
+            tracemalloc.start(10)  # Frames kept per allocation, enough to see which game call made it
+        if "cpu" in self.modes:
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def stop(self):
+        """
+        Stop capturing, write the results and print a short summary of each.
+        """
+        if self.profiler is not None:
+            self.profiler.disable()  # Before the snapshot below, so writing the results stays out of both
+        if "memory" in self.modes:
+            import tracemalloc
+
+            if tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                statistics = snapshot.statistics("lineno")
+                with open(f"{self.output}.memory.txt", "w", encoding="utf-8") as file:
+                    file.write(f"current {current} bytes, peak {peak} bytes\n")
+                    file.writelines(f"{statistic}\n" for statistic in statistics)
+                print(f"\nMemory profile written to {self.output}.memory.txt; peak {peak / 1024:.0f} KiB, "
+                      f"top {self.top} lines still allocated:")
+                for statistic in statistics[:self.top]:
+                    print(f"  {statistic}")
+        if self.profiler is not None:
+            import pstats
+
+            self.profiler.dump_stats(f"{self.output}.pstats")
+            print(f"\nCPU profile written to {self.output}.pstats; top {self.top} by cumulative time:")
+            pstats.Stats(self.profiler).sort_stats("cumulative").print_stats(self.top)
+            self.profiler = None
+
+
+_metrics = None
+
+
+def get_metrics():
+    """
+    Return the active metrics registry, or None while instrumentation is off.
+    """
+    return _metrics
+
+
+def set_metrics(metrics):
+    """
+    Install a Metrics registry that every instrumented path records into, or None to turn instrumentation off.
+    """
+    global _metrics
+    _metrics = metrics
+    return metrics
+
+
+def configure_metrics(arguments):
+    """
+    Apply --metrics-port N, --statsd HOST:PORT, --profile cpu,memory and --profile-out PATH from the command line;
+    return the other arguments.
+    """
+    options = {}
+    rest = []
+    arguments = iter(arguments)
+    for argument in arguments:
+        if argument in ("--metrics-port", "--statsd", "--profile", "--profile-out"):
+            options[argument] = next(arguments, "")
+        else:
+            rest.append(argument)
+    if "--metrics-port" in options or "--statsd" in options:
+        statsd = None
+        if "--statsd" in options:
+            host, _, port = options["--statsd"].rpartition(":")
+            statsd = StatsdExporter(host or "127.0.0.1", int(port or 8125))
+        metrics = set_metrics(Metrics(statsd=statsd))
+        if "--metrics-port" in options:
+            print(f"Serving metrics at {MetricsServer(metrics, int(options['--metrics-port'])).url}")
+    if "--profile" in options:
+        session = ProfileSession(options["--profile"].split(","), options.get("--profile-out", "pypop-profile"))
+        atexit.register(session.start().stop)
+    return rest
+
+
+# ------------------ HTTP Client ------------------
+
+class HttpClient:
+    def __init__(self, timeout=5.0, retries=3, backoff=0.25, pool_size=10):
+        """
+        Initialize a keep-alive session with a connection pool, timeouts and retry with backoff.
+        """
+        self.timeout = timeout
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.request_count = 0  # Requests sent, for measuring how well prefetching batches calls
+        retry = Retry(total=retries, backoff_factor=backoff,
+                      status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url, params=None):
+        """
+        Send a GET request through the pooled session and raise on an HTTP error status.
+        """
+        self.request_count += 1
+        started = time.perf_counter()
+        try:
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException:
+            if _metrics:
+                _metrics.inc("http_errors_total", host=url.split("/")[2])
+            raise
+        if _metrics:
+            _metrics.observe("http_request_seconds", time.perf_counter() - started, host=url.split("/")[2])
+        return response
+
+    def close(self):
+        """
+        Close every pooled connection.
+        """
+        self.session.close()
+
+
+_shared_client = None
+
+
+def get_http_client():
+    """
+    Return the HttpClient shared by every remote backend, creating it on first use.
+    """
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = HttpClient()
+    return _shared_client
+
+
+class RandomOrgIntegers:
+    def __init__(self, low, high, block_size=500, client=None,
+                 base_url="https://www.random.org/integers/"):
+        """
+        Initialize a buffer of random.org integers in [low, high], fetched block_size at a time.
+        """
+        self.low = low
+        self.high = high
+        self.block_size = block_size
+        self.client = client or get_http_client()
+        self.base_url = base_url
+        self.buffer = []
+
+    def fetch_block(self, count):
+        """
+        Fetch count integers from random.org in a single request.
+
+        Raises ValueError if the response is not count integers in range.
+        """
+        params = {
+            "num": count, "min": self.low, "max": self.high, "col": 1,
+            "base": 10, "format": "plain", "rnd": "new"
+        }
+        response = self.client.get(self.base_url, params=params)
+        numbers = list(map(int, response.text.split()))
+        if len(numbers) != count or not all(self.low <= number <= self.high for number in numbers):
+            raise ValueError(f"random.org sent {len(numbers)} integers for {count} in [{self.low}, {self.high}].")
+        return numbers
+
+    def take(self, count):
+        """
+        Return count integers from the local buffer, refilling it with one request when short.
+        """
+        if len(self.buffer) < count:
+            self.buffer += self.fetch_block(max(self.block_size, count - len(self.buffer)))
+        numbers = self.buffer[:count]
+        del self.buffer[:count]
+        return numbers
+
+
+class EntropyPool:
+    def __init__(self, low, high, source=None, block_size=1000, low_water=250, retry_delay=30.0):
+        """
+        Initialize a pool of integers in [low, high], refilled in bulk from a remote source in the background.
+        """
+        self.low = low
+        self.high = high
+        self.source = source or RandomOrgIntegers(low, high)
+        self.block_size = block_size
+        self.low_water = low_water  # Start a background refill when the buffer drops below this
+        self.retry_delay = retry_delay  # Seconds to wait before retrying after a failed refill
+        self.buffer = deque()
+        self.lock = threading.Lock()
+        self.refilling = False
+        self.next_refill = 0.0
+        self.refills = 0
+        self.refill_errors = 0
+        self.fallbacks = 0
+        self.start_refill()
+
+    @property
+    def depth(self):
+        """
+        Number of remote integers currently buffered.
+        """
+        return len(self.buffer)
+
+    def stats(self):
+        """
+        Return the pool counters as a dict.
+        """
+        return {"depth": self.depth, "refills": self.refills,
+                "refill_errors": self.refill_errors, "fallbacks": self.fallbacks}
+
+    def take(self, count):
+        """
+        Return count integers from the buffer, topping up from the local CSPRNG if it runs dry.
+        """
+        with self.lock:
+            numbers = [self.buffer.popleft() for _ in range(min(count, len(self.buffer)))]
+            if len(self.buffer) < self.low_water:
+                self.start_refill()
+            if len(numbers) < count:
+                self.fallbacks += 1
+        if len(numbers) < count:
+            if _metrics:
+                _metrics.inc("entropy_fallbacks_total")
+            span = self.high - self.low + 1
+            numbers += [self.low + secrets.randbelow(span) for _ in range(count - len(numbers))]
+        return numbers
+
+    def start_refill(self):
+        """
+        Launch a background refill unless one is running or a failed refill is still cooling down.
+        """
+        if self.refilling or time.monotonic() < self.next_refill:
+            return
+        self.refilling = True
+        threading.Thread(target=self.refill, daemon=True).start()
+
+    def refill(self):
+        """
+        Fetch one block from the remote source and append it to the buffer.
+
+        A failed request or a malformed response counts as a refill error and starts the retry cooldown.
+        """
+        started = time.perf_counter()
+        try:
+            numbers = self.source.fetch_block(self.block_size)
+        except (requests.RequestException, ValueError, KeyError):
+            with self.lock:
+                self.refill_errors += 1
+                self.next_refill = time.monotonic() + self.retry_delay
+            if _metrics:
+                _metrics.inc("entropy_refill_errors_total")
+        else:
+            with self.lock:
+                self.buffer.extend(numbers)
+                self.refills += 1
+            if _metrics:
+                _metrics.observe("entropy_refill_seconds", time.perf_counter() - started)
+                _metrics.gauge("entropy_pool_depth", self.depth)
+        finally:
+            self.refilling = False
+
+
+# ------------------ Random Sources ------------------
+
+# Every game draws through a RandomSource. Subclasses supply integers(), permutation() and spawn();
+# the other draws are built on those and may be overridden with faster paths.
+class RandomSource:
+    def integers(self, low, high, count):
+        """
+        Return a list of count integers drawn uniformly from [low, high].
+        """
+        raise NotImplementedError
+
+    def permutation(self, count):
+        """
+        Return a uniformly random ordering of range(count) as a list.
+        """
+        raise NotImplementedError
+
+    def spawn(self, count):
+        """
+        Return count independent child sources, e.g. one per table or per worker.
+        """
+        raise NotImplementedError
+
+    def randint(self, low, high):
+        """
+        Return one integer drawn uniformly from [low, high].
+        """
+        return self.integers(low, high, 1)[0]
+
+    def choice(self, items):
+        """
+        Return a uniformly chosen element of a sequence.
+        """
+        return items[self.randint(0, len(items) - 1)]
+
+    def shuffle(self, items):
+        """
+        Shuffle a list or array in place.
+        """
+        original = list(items)
+        for index, source in enumerate(self.permutation(len(items))):
+            items[index] = original[source]
+
+    def integer_array(self, low, high, shape):
+        """
+        Return a NumPy array of the given shape filled with integers from [low, high].
+        """
+        return np.array(self.integers(low, high, int(np.prod(shape))), dtype=np.int64).reshape(shape)
+
+
+class NumpySource(RandomSource):
+    BIT_GENERATORS = ("PCG64", "PCG64DXSM", "Philox", "SFC64")
+
+    def __init__(self, seed=None, bit_generator="PCG64", block_size=4096):
+        """
+        Initialize a fast local stream from a NumPy bit generator, seeded by an int or a SeedSequence.
+
+        Scalar draws are served from per-range blocks to amortize the per-call cost of NumPy. A range's
+        block starts small and doubles up to block_size each time it is used up, so one-off ranges such
+        as random raise sizes stay cheap.
+        """
+        if bit_generator not in self.BIT_GENERATORS:
+            raise ValueError(f"Unknown bit generator {bit_generator}.")
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.bit_generator = bit_generator
+        self.generator = np.random.Generator(getattr(np.random, bit_generator)(self.seed_sequence))
+        self.block_size = block_size
+        self.blocks = {}  # (low, high) -> [list of buffered integers, position of the next one]
+
+    def integers(self, low, high, count):
+        """
+        Return a list of count integers from [low, high], served from a buffered block when count is small.
+        """
+        if count > 64:  # Smaller than any block, so one fresh block always covers the request
+            return self.generator.integers(low, high, size=count, endpoint=True).tolist()
+        block = self.blocks.get((low, high))
+        if block is None or block[1] + count > len(block[0]):
+            block = self.new_block(low, high)
+        start = block[1]
+        block[1] += count
+        return block[0][start:block[1]]
+
+    def randint(self, low, high):
+        """
+        Return one integer from [low, high] out of the buffered block.
+        """
+        block = self.blocks.get((low, high))
+        if block is None or block[1] >= len(block[0]):
+            block = self.new_block(low, high)
+        block[1] += 1
+        return block[0][block[1] - 1]
+
+    def new_block(self, low, high):
+        """
+        Draw a fresh block of buffered integers for [low, high], dropping what was left of the old one.
+        """
+        previous = self.blocks.get((low, high))
+        size = min(2 * len(previous[0]), self.block_size) if previous else 64  # At least 64, see integers()
+        if previous is None and len(self.blocks) >= 256:
+            self.blocks.clear()  # Bound the memory held for ranges that are no longer drawn from
+        block = [self.generator.integers(low, high, size=size, endpoint=True).tolist(), 0]
+        self.blocks[low, high] = block
+        return block
+
+    def permutation(self, count):
+        """
+        Return a random ordering of range(count).
+        """
+        return self.generator.permutation(count).tolist()
+
+    def shuffle(self, items):
+        """
+        Shuffle a list or array in place; byte arrays such as a shoe are shuffled through a NumPy view.
+        """
+        if isinstance(items, array) and items.typecode == 'B':
+            self.generator.shuffle(np.frombuffer(items, dtype=np.uint8))
+        else:
+            self.generator.shuffle(items)
+
+    def integer_array(self, low, high, shape):
+        """
+        Return a NumPy array of integers from [low, high] straight from the generator.
+        """
+        return self.generator.integers(low, high, size=shape, endpoint=True)
+
+    def spawn(self, count):
+        """
+        Return count statistically independent child streams of the same bit generator.
+        """
+        return [NumpySource(child, self.bit_generator, self.block_size) for child in self.seed_sequence.spawn(count)]
+
+
+class SystemSource(RandomSource):
+    def __init__(self):
+        """
+        Initialize a source backed by the operating system's CSPRNG; it cannot be seeded.
+        """
+        self.system = secrets.SystemRandom()
+
+    def integers(self, low, high, count):
+        """
+        Return a list of count integers from [low, high].
+        """
+        return [self.system.randint(low, high) for _ in range(count)]
+
+    def permutation(self, count):
+        """
+        Return a random ordering of range(count).
+        """
+        order = list(range(count))
+        self.system.shuffle(order)
+        return order
+
+    def spawn(self, count):
+        """
+        Return count more CSPRNG sources; they are independent by construction.
+        """
+        return [SystemSource() for _ in range(count)]
+
+
+class RemoteSource(RandomSource):
+    WORD_RANGE = 65536  # The pool holds random.org integers in [0, 65535]
+
+    def __init__(self, pool=None):
+        """
+        Initialize a source drawing 16-bit words from a random.org EntropyPool, with its CSPRNG fallback.
+        """
+        self.pool = pool or EntropyPool(0, self.WORD_RANGE - 1)
+
+    def integers(self, low, high, count):
+        """
+        Return a list of count integers from [low, high], mapping words by rejection sampling to avoid bias.
+        """
+        span = high - low + 1
+        if span > self.WORD_RANGE:
+            raise ValueError("Remote draws are limited to ranges of 65536 values.")
+        limit = self.WORD_RANGE - self.WORD_RANGE % span  # Words at or above this would favour small values
+        numbers = []
+        while len(numbers) < count:
+            numbers += [low + word % span for word in self.pool.take(count - len(numbers)) if word < limit]
+        return numbers
+
+    def permutation(self, count):
+        """
+        Return a random ordering of range(count) by a Fisher-Yates shuffle.
+        """
+        order = list(range(count))
+        for index in range(count - 1, 0, -1):
+            other = self.randint(0, index)
+            order[index], order[other] = order[other], order[index]
+        return order
+
+    def spawn(self, count):
+        """
+        Return count sources sharing this pool; every word is handed out once, so streams never overlap.
+        """
+        return [RemoteSource(self.pool) for _ in range(count)]
+
+
+class RecordingSource(RandomSource):
+    def __init__(self, source, log=None, stream="0"):
+        """
+        Wrap a source and append every draw to a log as (stream, method, arguments, result) for later replay.
+        """
+        self.source = source
+        self.log = [] if log is None else log
+        self.stream = stream
+        self.children = 0
+
+    def record(self, method, arguments, result):
+        """
+        Append one draw to the log and return its result.
+        """
+        self.log.append((self.stream, method, arguments, result))
+        return result
+
+    def integers(self, low, high, count):
+        """
+        Draw integers from the wrapped source and record them.
+        """
+        return self.record("integers", [low, high, count], self.source.integers(low, high, count))
+
+    def randint(self, low, high):
+        """
+        Draw one integer from the wrapped source and record it.
+        """
+        return self.record("randint", [low, high], self.source.randint(low, high))
+
+    def permutation(self, count):
+        """
+        Draw a permutation from the wrapped source and record it.
+        """
+        return self.record("permutation", [count], self.source.permutation(count))
+
+    def integer_array(self, low, high, shape):
+        """
+        Draw an integer array from the wrapped source and record it.
+        """
+        values = self.source.integer_array(low, high, shape)
+        self.record("integer_array", [low, high, list(np.shape(values))], values.tolist())
+        return values
+
+    def spawn(self, count):
+        """
+        Return recording children that write to the same log under their own stream names.
+        """
+        children = self.source.spawn(count)
+        self.children += count
+        first = self.children - count + 1
+        return [RecordingSource(child, self.log, f"{self.stream}.{first + index}") for index, child in enumerate(children)]
+
+    def save(self, path):
+        """
+        Write the log as JSON lines.
+        """
+        with open(path, "w") as file:
+            for entry in self.log:
+                file.write(json.dumps(entry) + "\n")
+
+
+class ReplaySource(RandomSource):
+    def __init__(self, log, stream="0"):
+        """
+        Replay the draws of one stream of a recorded log, failing loudly if the caller asks for anything else.
+        """
+        self.log = log
+        self.stream = stream
+        self.entries = deque(entry for entry in log if entry[0] == stream)
+        self.children = 0
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a log written by RecordingSource.save and replay its root stream.
+        """
+        with open(path) as file:
+            return cls([tuple(json.loads(line)) for line in file if line.strip()])
+
+    def replay(self, method, arguments):
+        """
+        Return the next recorded result, checking it was recorded for the same call.
+        """
+        if not self.entries:
+            raise ValueError(f"The replay log has no more draws for stream {self.stream}.")
+        _, recorded_method, recorded_arguments, result = self.entries.popleft()
+        if recorded_method != method or list(recorded_arguments) != list(arguments):
+            raise ValueError(f"Replay diverged on stream {self.stream}: expected {recorded_method}"
+                             f"{tuple(recorded_arguments)}, got {method}{tuple(arguments)}.")
+        return result
+
+    def integers(self, low, high, count):
+        """
+        Return the recorded integers.
+        """
+        return self.replay("integers", [low, high, count])
+
+    def randint(self, low, high):
+        """
+        Return the recorded integer.
+        """
+        return self.replay("randint", [low, high])
+
+    def permutation(self, count):
+        """
+        Return the recorded permutation.
+        """
+        return self.replay("permutation", [count])
+
+    def integer_array(self, low, high, shape):
+        """
+        Return the recorded integer array.
+        """
+        dimensions = [shape] if isinstance(shape, int) else list(shape)
+        return np.array(self.replay("integer_array", [low, high, dimensions]), dtype=np.int64).reshape(shape)
+
+    def spawn(self, count):
+        """
+        Return replays of the child streams, named the same way RecordingSource names them.
+        """
+        self.children += count
+        first = self.children - count + 1
+        return [ReplaySource(self.log, f"{self.stream}.{first + index}") for index in range(count)]
+
+
+RANDOM_SOURCE_KINDS = ("pcg64", "philox", "system", "remote")
+
+
+def make_random_source(kind="pcg64", seed=None):
+    """
+    Build a random source by name: 'pcg64' or 'philox' (seedable, fast), 'system' (CSPRNG) or 'remote' (random.org).
+    """
+    if kind == "pcg64":
+        return NumpySource(seed, "PCG64")
+    if kind == "philox":
+        return NumpySource(seed, "Philox")
+    if kind == "system":
+        return SystemSource()
+    if kind == "remote":
+        return RemoteSource()
+    raise ValueError(f"Unknown random source {kind}; choose one of {', '.join(RANDOM_SOURCE_KINDS)}.")
+
+
+_random_source = None
+
+
+def get_random_source():
+    """
+    Return the shared random source every game draws from by default, a fresh PCG64 stream unless one was set.
+    """
+    global _random_source
+    if _random_source is None:
+        _random_source = make_random_source()
+    return _random_source
+
+
+def set_random_source(source):
+    """
+    Make source the shared default, e.g. a seeded stream for a reproducible session or a recording for audits.
+    """
+    global _random_source
+    _random_source = source
+    return source
+
+
+def configure_random_source(arguments):
+    """
+    Apply --rng KIND, --seed N, --record PATH and --replay PATH from the command line; return the other arguments.
+    """
+    options = {}
+    rest = []
+    arguments = iter(arguments)
+    for argument in arguments:
+        if argument in ("--rng", "--seed", "--record", "--replay"):
+            options[argument] = next(arguments, "")
+        else:
+            rest.append(argument)
+    if not options:
+        return rest
+    if "--replay" in options:
+        source = ReplaySource.load(options["--replay"])
+    else:
+        seed = int(options["--seed"]) if "--seed" in options else None
+        source = make_random_source(options.get("--rng", "pcg64"), seed)
+    if "--record" in options:
+        source = RecordingSource(source)
+        atexit.register(source.save, options["--record"])
+    set_random_source(source)
+    return rest
+
+
+# ------------------ Snapshots ------------------
+
+# Shoes, games and tables save their state with snapshot() and load it back with restore(data), as
+# struct-packed records holding integer cards. Every record starts with a header naming its kind, and
+# nested records and names are length-prefixed. Random sources are not saved: a restored object keeps
+# drawing from its own stream, so the cards already in a shoe come out in order but later shuffles differ.
+SNAPSHOT_MAGIC = b"PP"
+SNAPSHOT_VERSION = 4
+SNAPSHOT_KINDS = ("shoe", "remote_deck", "tracker", "blackjack", "slots", "roulette", "holdem",
+                  "blackjack_table", "roulette_table", "slot_table", "holdem_table", "table_server")
+SNAPSHOT_HEADER = struct.Struct("<2sBB")  # Magic, format version, kind
+SNAPSHOT_HEADERS = {kind: SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, index)
+                    for index, kind in enumerate(SNAPSHOT_KINDS)}
+BLOB_LENGTH = struct.Struct("<I")
+
+
+def read_snapshot_header(data, kind):
+    """
+    Check that data is a snapshot of the given kind and return the offset of the record after the header.
+    """
+    if data[:SNAPSHOT_HEADER.size] != SNAPSHOT_HEADERS[kind]:
+        if len(data) < SNAPSHOT_HEADER.size or data[:2] != SNAPSHOT_MAGIC:
+            raise ValueError("Not a PyPop snapshot.")
+        _, version, index = SNAPSHOT_HEADER.unpack_from(data)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {version}.")
+        found = SNAPSHOT_KINDS[index] if index < len(SNAPSHOT_KINDS) else f"kind {index}"
+        raise ValueError(f"Expected a {kind} snapshot, got {found}.")
+    return SNAPSHOT_HEADER.size
+
+
+def pack_blob(blob):
+    """
+    Return bytes prefixed with their length, for a nested record or a name.
+    """
+    return BLOB_LENGTH.pack(len(blob)) + blob
+
+
+def unpack_blob(data, offset):
+    """
+    Return the length-prefixed bytes at offset and the offset just past them.
+    """
+    (length,) = BLOB_LENGTH.unpack_from(data, offset)
+    start = offset + BLOB_LENGTH.size
+    if start + length > len(data):
+        raise ValueError("The snapshot is truncated.")
+    return data[start:start + length], start + length
+
+
+def snapshot_player(players, name):
+    """
+    Return the player a snapshot names from a name -> player mapping, raising ValueError if it has no such player.
+
+    With no mapping the name itself stands for the player, as ledger accounts do.
+    """
+    name = bytes(name).decode()
+    if players is None:
+        return name
+    try:
+        return players[name]
+    except KeyError:
+        raise ValueError(f"The snapshot seats {name}, who is not among the players given.") from None
+
+
+def pack_names(players):
+    """
+    Return the names of players, or of accounts given as plain names, as one record in order.
+    """
+    return BLOB_LENGTH.pack(len(players)) + b"".join(pack_blob(getattr(player, "name", player).encode())
+                                                     for player in players)
+
+
+def unpack_names(data, offset, players):
+    """
+    Return the players named by a pack_names() record at offset, looked up with snapshot_player(),
+    and the offset just past the record.
+    """
+    (count,) = BLOB_LENGTH.unpack_from(data, offset)
+    offset += BLOB_LENGTH.size
+    found = []
+    for _ in range(count):
+        name, offset = unpack_blob(data, offset)
+        found.append(snapshot_player(players, name))
+    return found, offset
+
+
+# ------------------ Deck Backends ------------------
+
+SUITS = ["SPADES", "HEARTS", "DIAMONDS", "CLUBS"]
+RANKS = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "JACK", "QUEEN", "KING", "ACE"]
+RANK_CODES = "234567890JQKA"  # deckofcardsapi uses '0' for the ten
+
+
+def make_card_dict(card):
+    """
+    Build a deckofcardsapi-style card dict for an integer card (rank * 4 + suit).
+    """
+    rank, suit = divmod(card, 4)
+    return {"code": RANK_CODES[rank] + SUITS[suit][0], "value": RANKS[rank], "suit": SUITS[suit]}
+
+
+CARD_DICTS = [make_card_dict(card) for card in range(52)]
+CARD_INDEX = {card['code']: index for index, card in enumerate(CARD_DICTS)}  # API code -> integer card
+CARD_NAMES = [f"{card['value']} of {card['suit']}" for card in CARD_DICTS]
+CARD_CODES = [card['code'] for card in CARD_DICTS]
+
+
+def card_index(card):
+    """
+    Convert a deckofcardsapi-style card dict to its integer card.
+    """
+    return CARD_INDEX[card['code']]
+
+
+def card_name(card):
+    """
+    Return the display name of an integer card, e.g. 'ACE of SPADES'.
+    """
+    return CARD_NAMES[card]
+
+
+SHOE_RECORD = struct.Struct("<BdHH")  # Deck count, penetration, position of the next card, cut card
+
+
+class LocalShoe:
+    def __init__(self, deck_count=6, penetration=0.75, rng=None, tracker=None):
+        """
+        Initialize an in-process shoe of deck_count decks, reshuffled once the cut card is reached.
+        """
+        self.deck_count = deck_count
+        self.penetration = penetration  # Fraction of the shoe dealt before the cut card
+        self.rng = rng  # Random source; the shared one unless given, picked up on the first shuffle
+        self.tracker = tracker  # ShoeTracker told about every card dealt, or None
+        self.cards = array('B', range(52)) * deck_count
+        self.position = len(self.cards)  # Index of the next card to deal; the shoe starts empty until shuffled
+        self.cut_card = 0
+
+    def shuffle(self):
+        """
+        Shuffle every card back into the shoe and place the cut card.
+        """
+        started = time.perf_counter()
+        if self.rng is None:
+            self.rng = get_random_source()
+        self.rng.shuffle(self.cards)
+        self.position = 0
+        self.cut_card = int(len(self.cards) * self.penetration)
+        if self.tracker:
+            self.tracker.reset()
+        if _metrics:
+            _metrics.observe("deck_shuffle_seconds", time.perf_counter() - started, backend="local")
+
+    @property
+    def remaining(self):
+        """
+        Number of cards left to deal before the shoe is empty.
+        """
+        return len(self.cards) - self.position
+
+    @property
+    def needs_shuffle(self):
+        """
+        True once the cut card has come out and the shoe should be reshuffled between rounds.
+        """
+        return self.position >= self.cut_card
+
+    def draw(self, count=1):
+        """
+        Deal count cards from the shoe, reshuffling first if it would run dry.
+
+        Raises ValueError if count is more than the whole shoe holds, as RemoteDeck does.
+        """
+        if count > 52 * self.deck_count:
+            raise ValueError(f"A shoe of {self.deck_count} decks cannot deal {count} cards.")
+        if count > self.remaining:
+            self.shuffle()
+        if _metrics:
+            _metrics.inc("cards_drawn_total", count, backend="local")
+        start = self.position
+        self.position += count
+        cards = self.cards[start:self.position].tolist()
+        if self.tracker:
+            self.tracker.see(cards)
+        return cards
+
+    def snapshot(self):
+        """
+        Return the shoe's cards, position and cut card, and its tracker's counts if it has one, as a binary record.
+        """
+        return b"".join((SNAPSHOT_HEADERS["shoe"],
+                         SHOE_RECORD.pack(self.deck_count, self.penetration, self.position, self.cut_card),
+                         self.cards.tobytes(), self.tracker.snapshot() if self.tracker else b""))
+
+    def restore(self, data):
+        """
+        Load a record written by snapshot() and return the shoe, ready to deal the card it would have dealt next.
+        """
+        offset = read_snapshot_header(data, "shoe")
+        self.deck_count, self.penetration, self.position, self.cut_card = SHOE_RECORD.unpack_from(data, offset)
+        offset += SHOE_RECORD.size
+        end = offset + 52 * self.deck_count
+        if end > len(data):
+            raise ValueError("The snapshot is truncated.")
+        self.cards = array('B', data[offset:end])
+        self.tracker = (self.tracker or ShoeTracker(self.deck_count)).restore(data[end:]) if end < len(data) else None
+        return self
+
+
+class RemoteDeck:
+    def __init__(self, deck_count=6, penetration=0.75, client=None,
+                 base_url="https://deckofcardsapi.com/api/deck/", tracker=None):
+        """
+        Initialize a shoe hosted by deckofcardsapi.com, with the same interface as LocalShoe.
+        """
+        self.deck_count = deck_count
+        self.penetration = penetration
+        self.client = client or get_http_client()
+        self.base_url = base_url
+        self.deck_id = None
+        self.buffer = array('B')  # The whole shoe as integer cards, prefetched in one request
+        self.position = 0
+        self.cut_card = 0  # The shoe is requested on the first shuffle or draw, not here
+        self.tracker = tracker  # ShoeTracker told about every card dealt, or None
+
+    def shuffle(self):
+        """
+        Request a new shuffled shoe from the API and prefetch all of its cards.
+        """
+        started = time.perf_counter()
+        if self.deck_id is None:
+            response = self.client.get(f"{self.base_url}new/shuffle/", params={"deck_count": self.deck_count})
+            self.deck_id = response.json()['deck_id']
+        else:
+            self.client.get(f"{self.base_url}{self.deck_id}/shuffle/")
+        response = self.client.get(f"{self.base_url}{self.deck_id}/draw/", params={"count": 52 * self.deck_count})
+        self.buffer = array('B', [card_index(card) for card in response.json()['cards']])
+        if len(self.buffer) != 52 * self.deck_count:
+            raise ValueError(f"The deck API dealt {len(self.buffer)} of {52 * self.deck_count} cards.")
+        self.position = 0
+        self.cut_card = int(len(self.buffer) * self.penetration)
+        if self.tracker:
+            self.tracker.reset()
+        if _metrics:
+            _metrics.observe("deck_shuffle_seconds", time.perf_counter() - started, backend="remote")
+
+    @property
+    def remaining(self):
+        """
+        Number of prefetched cards left to deal before the shoe is empty.
+        """
+        return len(self.buffer) - self.position
+
+    @property
+    def needs_shuffle(self):
+        """
+        True once the cut card has come out and the shoe should be reshuffled between rounds.
+        """
+        return self.position >= self.cut_card
+
+    def draw(self, count=1):
+        """
+        Deal count cards from the prefetched shoe, reshuffling first if it would run dry.
+
+        Raises ValueError if count is more than the whole shoe holds, as LocalShoe does.
+        """
+        if count > 52 * self.deck_count:
+            raise ValueError(f"A shoe of {self.deck_count} decks cannot deal {count} cards.")
+        if count > self.remaining:
+            self.shuffle()
+        if _metrics:
+            _metrics.inc("cards_drawn_total", count, backend="remote")
+        start = self.position
+        self.position += count
+        cards = self.buffer[start:self.position].tolist()
+        if self.tracker:
+            self.tracker.see(cards)
+        return cards
+
+    def snapshot(self):
+        """
+        Return the deck id and the prefetched shoe with its position, as a binary record like LocalShoe's.
+
+        A restored deck deals from the prefetched cards without asking the API, which is only needed again
+        to reshuffle the same deck id.
+        """
+        return b"".join((SNAPSHOT_HEADERS["remote_deck"],
+                         SHOE_RECORD.pack(self.deck_count, self.penetration, self.position, self.cut_card),
+                         pack_blob((self.deck_id or "").encode()), pack_blob(self.buffer.tobytes()),
+                         self.tracker.snapshot() if self.tracker else b""))
+
+    def restore(self, data):
+        """
+        Load a record written by snapshot() and return the deck.
+        """
+        offset = read_snapshot_header(data, "remote_deck")
+        self.deck_count, self.penetration, self.position, self.cut_card = SHOE_RECORD.unpack_from(data, offset)
+        deck_id, offset = unpack_blob(data, offset + SHOE_RECORD.size)
+        buffer, offset = unpack_blob(data, offset)
+        self.deck_id = bytes(deck_id).decode() or None
+        self.buffer = array('B', buffer)
+        self.tracker = (self.tracker or ShoeTracker(self.deck_count)).restore(data[offset:]) \
+            if offset < len(data) else None
+        return self
+
+
+# ------------------ Chip Ledger ------------------
+
+class ChipLedger:
+    def __init__(self, path=None, batch_size=1000, flush_interval=0.05):
+        """
+        Open (or create) an append-only chip ledger in SQLite WAL mode with an indexed balance table.
+
+        Entries are buffered and written in group commits of up to batch_size entries, at least every
+        flush_interval seconds. Each commit writes the entries and the balances they touch in one
+        transaction, so a crash loses at most the last unflushed batch and never leaves the two out of step.
+        """
+        self.path = path or os.path.join(DATA_DIR, "ledger.sqlite3")
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")  # WAL stays consistent; fsync at checkpoints
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY, time REAL, account TEXT, game TEXT, kind TEXT,
+                amount INTEGER, balance INTEGER);
+            CREATE TABLE IF NOT EXISTS balances (
+                account TEXT PRIMARY KEY, chips INTEGER, last_entry INTEGER);
+            CREATE INDEX IF NOT EXISTS entries_account ON entries (account, id);
+        """)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()  # Guards the pending list and balances
+        self.write_lock = threading.Lock()  # Serializes commits so batches reach the log in order
+        self.wake = threading.Event()  # Set when a batch is full to commit it ahead of the interval
+        self.pending = []  # Entries not yet committed: (id, time, account, game, kind, amount, balance)
+        self.balances = {}  # Account -> chips, including pending entries
+        self.next_id = 1
+        self.commits = 0
+        self.closed = False
+        self.replay()
+        threading.Thread(target=self.flush_loop, daemon=True).start()
+
+    def replay(self, full=False):
+        """
+        Load the balance table and apply any log entries it has not seen yet, or rebuild it from the whole log.
+
+        Balances and entries are committed together, so every entry up to the newest one the balance
+        table has seen is already applied and normally nothing is left to do. A full replay sums the
+        whole log per account in one pass.
+        """
+        with self.write_lock, self.lock:
+            self.write(self.pending)
+            self.pending = []
+            if full:
+                self.connection.execute("DELETE FROM balances")
+            self.balances = dict(self.connection.execute("SELECT account, chips FROM balances"))
+            seen = self.connection.execute("SELECT COALESCE(MAX(last_entry), 0) FROM balances").fetchone()[0]
+            last = {}
+            for account, total, last_id in self.connection.execute(
+                    "SELECT account, SUM(amount), MAX(id) FROM entries WHERE id > ? GROUP BY account", (seen,)):
+                self.balances[account] = self.balances.get(account, 0) + total
+                last[account] = last_id
+            if last:
+                self.connection.execute("BEGIN")
+                self.connection.executemany(
+                    "INSERT INTO balances VALUES (?, ?, ?) ON CONFLICT(account) DO UPDATE "
+                    "SET chips = excluded.chips, last_entry = excluded.last_entry",
+                    [(account, self.balances[account], last_id) for account, last_id in last.items()])
+                self.connection.execute("COMMIT")
+            self.next_id = self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM entries").fetchone()[0] + 1
+        return self
+
+    def balance(self, account):
+        """
+        Return an account's chips, including entries still waiting to be committed.
+        """
+        return self.balances.get(account, 0)
+
+    def open_account(self, account, chips):
+        """
+        Credit an account with starting chips if it is new or has gone broke, and return its balance.
+        """
+        balance = self.balance(account)
+        if balance <= 0:
+            balance = self.record(account, "casino", "open", chips - balance)
+        return balance
+
+    def bet(self, account, game, amount):
+        """
+        Record chips staked on a bet, and return the new balance.
+        """
+        return self.record(account, game, "bet", -amount) if amount else self.balance(account)
+
+    def pay(self, account, game, amount):
+        """
+        Record chips paid out to an account, and return the new balance.
+        """
+        return self.record(account, game, "payout", amount) if amount else self.balance(account)
+
+    def record(self, account, game, kind, amount):
+        """
+        Append one entry to the ledger and update the balance at once; the commit happens in the background.
+        """
+        amount = int(amount)
+        with self.lock:
+            balance = self.balances.get(account, 0) + amount
+            self.balances[account] = balance
+            self.pending.append((self.next_id, time.time(), account, game, kind, amount, balance))
+            self.next_id += 1
+            backlog = len(self.pending)
+        if _metrics:
+            _metrics.inc("ledger_chips_total", abs(amount), game=game, kind=kind)
+        if backlog >= self.batch_size:
+            self.wake.set()
+            if backlog >= 8 * self.batch_size:
+                self.flush()  # The writer is falling behind; commit on the caller's thread instead
+        return balance
+
+    def flush(self):
+        """
+        Commit every pending entry now.
+        """
+        with self.write_lock:
+            with self.lock:
+                batch, self.pending = self.pending, []
+            if not self.closed:
+                self.write(batch)
+
+    def write(self, batch):
+        """
+        Write a batch of entries and the balances they leave behind in one transaction.
+        """
+        if not batch:
+            return
+        started = time.perf_counter()
+        touched = {}
+        for entry in batch:
+            touched[entry[2]] = (entry[2], entry[6], entry[0])  # The last entry per account holds its balance
+        self.connection.execute("BEGIN")
+        self.connection.executemany("INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+        self.connection.executemany(
+            "INSERT INTO balances VALUES (?, ?, ?) ON CONFLICT(account) DO UPDATE "
+            "SET chips = excluded.chips, last_entry = excluded.last_entry", touched.values())
+        self.connection.execute("COMMIT")
+        self.commits += 1
+        if _metrics:
+            _metrics.observe("ledger_commit_seconds", time.perf_counter() - started)
+            _metrics.inc("ledger_entries_total", len(batch))
+
+    def flush_loop(self):
+        """
+        Commit pending entries whenever a batch fills up, or every flush_interval seconds, until closed.
+        """
+        while not self.closed:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    def history(self, account, limit=20):
+        """
+        Return an account's most recent entries, newest first.
+        """
+        self.flush()
+        return self.connection.execute(
+            "SELECT id, time, game, kind, amount, balance FROM entries WHERE account = ? "
+            "ORDER BY id DESC LIMIT ?", (account, limit)).fetchall()
+
+    def close(self):
+        """
+        Commit pending entries and close the database.
+        """
+        if self.closed:
+            return
+        self.flush()
+        with self.write_lock:
+            self.closed = True
+            self.connection.close()
+        self.wake.set()
+
+
+_chip_ledger = None
+
+
+def get_chip_ledger():
+    """
+    Return the shared ChipLedger, opening it on first use and closing it at exit.
+    """
+    global _chip_ledger
+    if _chip_ledger is None:
+        _chip_ledger = ChipLedger()
+        atexit.register(_chip_ledger.close)
+    return _chip_ledger
 
 
 # ------------------ Blackjack Game ------------------
 
-class BlackjackGame:
-    def __init__(self):
+HARD_POINTS = [min(card // 4 + 2, 10) if card < 48 else 1 for card in range(52)]  # Aces count 1 here
+
+_blackjack_rules = None
+MAX_DECKS = 15  # Strategy tables pack each rank's count into 8 bits, and 16 decks hold 256 ten-valued cards
+
+
+class BlackjackRules:
+    def __init__(self, decks=6, dealer_hits_soft_17=False, blackjack_payout=1.5, double_after_split=True,
+                 surrender=False):
+        """
+        Initialize a set of blackjack rules; the defaults are a common six-deck game.
+
+        Rules every variant shares: the dealer checks for blackjack under an Ace or ten-valued upcard before
+        the player acts, so a dealer blackjack only takes the opening bet. The player may double on any two
+        cards and split one pair of equal-valued cards once, split Aces taking one card each, and surrender
+        is late, after the dealer has checked.
+
+        Raises ValueError for a shoe of more than MAX_DECKS decks.
+        """
+        if not 1 <= decks <= MAX_DECKS:
+            raise ValueError(f"Blackjack is dealt from 1 to {MAX_DECKS} decks.")
+        self.decks = decks
+        self.dealer_hits_soft_17 = dealer_hits_soft_17
+        self.blackjack_payout = blackjack_payout  # Paid per unit bet on a natural, 1.5 for 3:2
+        self.double_after_split = double_after_split
+        self.surrender = surrender
+
+    @property
+    def key(self):
+        """
+        The rules as a tuple, for caching anything computed from them.
+        """
+        return (self.decks, self.dealer_hits_soft_17, self.blackjack_payout, self.double_after_split,
+                self.surrender)
+
+    def __str__(self):
+        return f"{self.decks} deck{'s' * (self.decks != 1)}, {'H17' if self.dealer_hits_soft_17 else 'S17'}, " \
+               f"blackjack pays {self.blackjack_payout:g} to 1, " \
+               f"{'double after split' if self.double_after_split else 'no double after split'}, " \
+               f"{'late surrender' if self.surrender else 'no surrender'}"
+
+
+def get_blackjack_rules():
+    """
+    Return the process-wide blackjack rules, the defaults unless configured.
+    """
+    return _blackjack_rules or BlackjackRules()
+
+
+def set_blackjack_rules(rules):
+    """
+    Replace the process-wide blackjack rules and return them.
+    """
+    global _blackjack_rules
+    _blackjack_rules = rules
+    return rules
+
+
+def configure_blackjack_rules(arguments):
+    """
+    Apply --decks N, --h17, --blackjack-payout X, --no-das and --surrender from the command line;
+    return the other arguments.
+    """
+    rules = {}
+    rest = []
+    arguments = iter(arguments)
+    for argument in arguments:
+        if argument == "--decks":
+            rules["decks"] = int(next(arguments, "6"))
+        elif argument == "--blackjack-payout":
+            rules["blackjack_payout"] = float(next(arguments, "1.5"))
+        elif argument == "--h17":
+            rules["dealer_hits_soft_17"] = True
+        elif argument == "--no-das":
+            rules["double_after_split"] = False
+        elif argument == "--surrender":
+            rules["surrender"] = True
+        else:
+            rest.append(argument)
+    if rules:
+        set_blackjack_rules(BlackjackRules(**rules))
+    return rest
+
+
+class BlackjackHand:
+    __slots__ = ("cards", "hard_total", "aces", "split")
+
+    def __init__(self, cards=(), split=False):
+        """
+        Initialize a hand of integer cards whose total is kept up to date as cards are added.
+
+        A hand made by splitting a pair starts with one card of the pair and is never a natural.
+        """
+        self.cards = array('B')
+        self.hard_total = 0  # Total with every Ace counted as 1
+        self.aces = 0
+        self.split = split
+        self.add(cards)
+
+    def add(self, cards):
+        """
+        Add integer cards to the hand and update its running total.
+        """
+        for card in cards:
+            self.cards.append(card)
+            points = HARD_POINTS[card]
+            self.hard_total += points
+            self.aces += points == 1
+        return self
+
+    __iadd__ = add
+
+    @property
+    def total(self):
+        """
+        Best total of the hand, counting one Ace as 11 when that does not bust.
+        """
+        if self.aces and self.hard_total <= 11:
+            return self.hard_total + 10
+        return self.hard_total
+
+    @property
+    def natural(self):
+        """
+        True for a blackjack: 21 on the first two cards of a hand that was not split.
+        """
+        return len(self.cards) == 2 and self.hard_total == 11 and self.aces > 0 and not self.split
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __iter__(self):
+        return iter(self.cards)
+
+    def __getitem__(self, index):
+        return self.cards[index]
+
+
+BLACKJACK_PHASES = ("idle", "player", "settled")
+HIT_OR_STAND = ("hit", "stand")  # All a hand of three or more cards may do
+BLACKJACK_RECORD = struct.Struct("<BqbdBBB")  # Phase, bet, outcome, exact payout, active hand, hands, dealer cards
+BLACKJACK_HAND_RECORD = struct.Struct("<qB")  # Stake and card count of each hand
+
+
+class BlackjackCore:
+    ACTIONS = ("hit", "stand", "double", "split", "surrender")
+
+    def __init__(self, deck=None, penetration=0.75, rules=None):
+        """
+        Initialize the blackjack rules: dealing, the dealer's play and settlement, with no terminal I/O.
+
+        A round is start_round(bet), then apply_action() with one of legal_actions() until the phase is
+        'settled'; a natural on either side settles the round as it is dealt. Both return (state, events):
+        a dict describing the table and a list of event dicts for whatever happened, so a terminal,
+        a simulator or a network table can each drive the same rules. Doubling or splitting stakes the
+        current hand's bet again, so callers take that much more from the player first.
+        The default shoe is reshuffled once penetration of it has been dealt, and tracks the count as it goes.
+        """
+        self.rules = rules or get_blackjack_rules()
+        self.deck = deck or LocalShoe(deck_count=self.rules.decks, penetration=penetration,
+                                      tracker=ShoeTracker(self.rules.decks))
+        self.hands = [BlackjackHand()]  # Player's hands, two after a split
+        self.bets = [0]  # Stake on each hand
+        self.active = 0  # Index of the hand the player is acting on
+        self.player_hand = self.hands[0]  # That hand, or the last one once every hand is played
+        self.dealer_hand = BlackjackHand()  # Dealer's cards
+        self.phase = "idle"  # 'player' while the player acts, 'settled' once the bet is paid
+        self.bet = 0  # Opening bet
+        self.surrendered = False
+        self.outcome = None  # 1 if the player comes out ahead, -1 if behind, 0 if even
+        self.payout = 0  # Whole chips returned to the player, stakes included
+        self.exact_payout = 0  # The same before rounding down, for simulators betting one unit
+
+    @property
+    def staked(self):
+        """
+        Chips the player has on the round, counting doubles and splits.
+        """
+        return sum(self.bets)
+
+    def shuffle_new_deck(self):
+        """
+        Shuffle all cards back into the shoe.
+        """
+        self.deck.shuffle()
+
+    def draw_card(self, count=1):
+        """
+        Draw a specified number of cards from the deck.
+        """
+        return self.deck.draw(count)
+
+    @staticmethod
+    def card_value(card):
+        """
+        Calculate the value of a single card (handle face cards and Ace).
+        """
+        points = HARD_POINTS[card]
+        return 11 if points == 1 else points  # Treat ACE as 11 initially
+
+    @staticmethod
+    def calculate_hand(hand):
+        """
+        Calculate the total value of a hand of cards, adjusting for Aces if necessary.
+        """
+        if not isinstance(hand, BlackjackHand):
+            hand = BlackjackHand(hand)
+        return hand.total
+
+    def dealer_turn(self):
+        """
+        Handle the dealer's turn, hitting until the total is at least 17, and on a soft 17 under H17 rules.
+        """
+        hand = self.dealer_hand
+        hits_soft_17 = self.rules.dealer_hits_soft_17
+        while hand.total < 17 or hits_soft_17 and hand.hard_total == 7 and hand.aces:
+            hand += self.draw_card(1)
+
+    def next_hand(self):
+        """
+        Move on from the hand just played to the next split hand, if there is one.
+        """
+        self.active += 1
+        if self.active < len(self.hands):
+            self.player_hand = self.hands[self.active]
+
+    def hand_result(self, hand):
+        """
+        Return 1 if a hand beats the dealer, -1 if the dealer wins and 0 for a tie, naturals aside.
+        """
+        player_total = hand.total
+        dealer_total = self.dealer_hand.total
+
+        if player_total > 21:
+            return -1  # A busted player loses whatever the dealer holds
+        elif dealer_total > 21 or player_total > dealer_total:
+            return 1
+        elif player_total < dealer_total:
+            return -1
+        elif dealer_total == 21 and self.dealer_hand.natural:
+            return 0 if hand.natural else -1
+        return 0
+
+    def legal_actions(self):
+        """
+        Return the actions the player may take now.
+        """
+        if self.phase != "player":
+            return ()
+        hand = self.player_hand
+        if len(hand.cards) != 2:
+            return HIT_OR_STAND
+        actions = ["hit", "stand"]
+        if not hand.split or self.rules.double_after_split:
+            actions.append("double")
+        if len(self.hands) == 1:
+            if HARD_POINTS[hand[0]] == HARD_POINTS[hand[1]]:
+                actions.append("split")
+            if self.rules.surrender:
+                actions.append("surrender")
+        return tuple(actions)
+
+    def state(self):
+        """
+        Return the round as a dict; the dealer's hole card stays hidden until the round is settled.
+        """
+        settled = self.phase == "settled"
+        player = self.player_hand.cards.tolist()
+        if len(self.hands) == 1:
+            hands, totals = [player], [self.player_hand.total]
+        else:
+            hands, totals = [hand.cards.tolist() for hand in self.hands], [hand.total for hand in self.hands]
+        return {"phase": self.phase, "bet": self.bet, "player": player, "player_total": self.player_hand.total,
+                "hands": hands, "totals": totals, "active": self.active, "staked": self.staked,
+                "dealer": self.dealer_hand.cards.tolist() if settled else self.dealer_hand.cards[:1].tolist(),
+                "dealer_total": self.dealer_hand.total if settled else None,
+                "outcome": self.outcome, "payout": self.payout, "actions": self.legal_actions()}
+
+    def start_round(self, bet):
+        """
+        Deal a round for a bet, reshuffling first if the cut card is out, and settle it at once on a natural.
+        """
+        if self.phase == "player":
+            raise ValueError("Finish the current round first.")
+        events = []
+        if self.deck.needs_shuffle:
+            self.shuffle_new_deck()
+            events.append({"event": "shuffle"})
+        self.bet = bet
+        self.bets = [bet]
+        self.active = 0
+        self.surrendered = False
+        self.outcome = None
+        self.payout = self.exact_payout = 0
+        self.player_hand = BlackjackHand(self.draw_card(2))
+        self.hands = [self.player_hand]
+        self.dealer_hand = BlackjackHand(self.draw_card(2))
+        self.phase = "player"
+        events.append({"event": "deal", "cards": self.hands[0].cards.tolist(), "upcard": self.dealer_hand[0]})
+        if self.player_hand.total == 21 or self.dealer_hand.total == 21:  # A natural, and the dealer peeks
+            events.append(self.settle())
+        return self.state(), events
+
+    def apply_action(self, action):
+        """
+        Apply one of the player's legal actions, playing out the dealer and settling once every hand is done.
+        """
+        if self.phase != "player":
+            raise ValueError("Place a bet first.")
+        if action != "hit" and action != "stand" and action not in self.legal_actions():
+            raise ValueError(f"Invalid action {action}. Please choose one of: {', '.join(self.legal_actions())}.")
+        hand = self.player_hand
+        events = []
+        if action == "surrender":
+            self.surrendered = True
+            events = [{"event": "surrender"}, self.settle()]
+            return self.state(), events
+        if action == "split":
+            self.hands = [BlackjackHand((card, *self.draw_card(1)), split=True) for card in hand]
+            self.bets.append(self.bet)
+            self.player_hand = self.hands[0]
+            events.append({"event": "split", "hands": [split.cards.tolist() for split in self.hands]})
+            if HARD_POINTS[hand[0]] == 1:  # Split Aces take one card each
+                self.next_hand()
+                self.next_hand()
+        elif action == "stand":
+            self.next_hand()
+        else:
+            if action == "double":
+                self.bets[self.active] *= 2
+            card = self.draw_card(1)[0]
+            hand += (card,)
+            events.append({"event": "double" if action == "double" else "card", "card": card, "total": hand.total})
+            if hand.total > 21:
+                events.append({"event": "bust", "cards": hand.cards.tolist(), "total": hand.total})
+            if hand.total > 21 or action == "double":
+                self.next_hand()
+        if self.active >= len(self.hands):
+            if any(hand.total <= 21 for hand in self.hands):
+                self.dealer_turn()
+                events.append({"event": "dealer", "cards": self.dealer_hand.cards.tolist(),
+                               "total": self.dealer_hand.total})
+            events.append(self.settle())
+        return self.state(), events
+
+    def settle(self):
+        """
+        Settle every hand against the dealer's and return the settle event.
+
+        A surrender on an odd bet, or a natural paid at a fractional rate such as 6:5 on a bet that is not a
+        multiple of 5, comes to part of a chip. The payout is rounded down to whole chips, the house keeping
+        the fraction, and that one integer is what the outcome, the ledger, risk limits and hand history see.
+        exact_payout keeps the unrounded amount for simulators measuring the edge on one unit bets.
+        """
+        started = time.perf_counter() if _metrics else 0.0
+        natural = self.hands[0].natural
+        dealer_natural = self.dealer_hand.natural
+        if self.surrendered:
+            self.exact_payout = self.bet / 2
+        elif natural and not dealer_natural:
+            self.exact_payout = self.bet + self.bet * self.rules.blackjack_payout
+        else:
+            self.exact_payout = 0
+            for hand, bet in zip(self.hands, self.bets):
+                self.exact_payout += bet + bet * self.hand_result(hand)
+        self.payout = int(self.exact_payout)  # Payouts are never negative, so this rounds down
+        net = self.payout - self.staked
+        self.outcome = (net > 0) - (net < 0)
+        self.phase = "settled"
+        if _metrics:
+            _metrics.observe("payout_seconds", time.perf_counter() - started, game="blackjack")
+        return {"event": "settle", "outcome": self.outcome, "payout": self.payout,
+                "dealer_bust": self.dealer_hand.total > 21, "blackjack": natural, "dealer_blackjack": dealer_natural}
+
+    def snapshot(self, include_deck=True):
+        """
+        Return the round as a binary record, followed by the shoe's unless include_deck is False,
+        as when several seats share one shoe that is saved once.
+        """
+        dealer = self.dealer_hand.cards
+        return b"".join([SNAPSHOT_HEADERS["blackjack"],
+                         BLACKJACK_RECORD.pack(BLACKJACK_PHASES.index(self.phase), self.bet, self.outcome or 0,
+                                               self.exact_payout, self.active, len(self.hands), len(dealer)),
+                         dealer.tobytes()]
+                        + [BLACKJACK_HAND_RECORD.pack(bet, len(hand)) + hand.cards.tobytes()
+                           for hand, bet in zip(self.hands, self.bets)]
+                        + [self.deck.snapshot() if include_deck else b""])
+
+    def restore(self, data):
+        """
+        Load a record written by snapshot() and return the game, restoring the shoe too if the record has it.
+        """
+        offset = read_snapshot_header(data, "blackjack")
+        phase, self.bet, outcome, self.exact_payout, self.active, hands, dealer = \
+            BLACKJACK_RECORD.unpack_from(data, offset)
+        self.payout = int(self.exact_payout)
+        offset += BLACKJACK_RECORD.size
+        self.dealer_hand = BlackjackHand(data[offset:offset + dealer])
+        offset += dealer
+        self.hands, self.bets = [], []
+        for _ in range(hands):
+            if offset + BLACKJACK_HAND_RECORD.size > len(data):
+                raise ValueError("The snapshot is truncated.")
+            bet, cards = BLACKJACK_HAND_RECORD.unpack_from(data, offset)
+            offset += BLACKJACK_HAND_RECORD.size
+            self.hands.append(BlackjackHand(data[offset:offset + cards], split=hands > 1))
+            self.bets.append(bet)
+            offset += cards
+        if offset > len(data) or not hands:
+            raise ValueError("The snapshot is truncated.")
+        self.player_hand = self.hands[min(self.active, hands - 1)]
+        self.phase = BLACKJACK_PHASES[phase]
+        self.outcome = outcome if self.phase == "settled" else None
+        self.surrendered = False  # Only read while settling, and a surrendered round is already settled
+        if offset < len(data):
+            self.deck.restore(data[offset:])
+        return self
+
+
+class BlackjackGame(BlackjackCore):
+    def __init__(self, deck=None, ledger=None, account="player", penetration=0.75, rules=None):
+        """
+        Initialize the terminal Blackjack game over the rules core, with the player's ledger account.
+        """
+        super().__init__(deck, penetration, rules)
+        self.ledger = ledger  # Opened in play() so headless rounds never touch the ledger
+        self.account = account
+
+    @property
+    def chips(self):
+        """
+        The player's current balance in the ledger.
+        """
+        return self.ledger.balance(self.account)
+
+    def show_hand(self, hand, owner="Player"):
+        """
+        Display the hand of a player or dealer.
+        """
+        cards = ", ".join([card_name(card) for card in hand])
+        total = self.calculate_hand(hand)
+        print(f"{owner}'s hand: {cards} (Total: {total})")
+
+    def show_events(self, events):
+        """
+        Print what happened in a round.
+        """
+        for event in events:
+            kind = event["event"]
+            if kind == "shuffle":
+                print("The cut card is out. Shuffling the shoe...")
+            elif kind == "deal":
+                print(f"Dealer's first card: {card_name(event['upcard'])}")
+            elif kind == "bust":
+                self.show_hand(event["cards"], "Player")
+                print("Bust! You've gone over 21.")
+            elif kind == "split":
+                print("You split your pair into two hands.")
+            elif kind == "double":
+                print(f"You double down and draw {card_name(event['card'])} (Total: {event['total']}).")
+            elif kind == "settle":
+                self.show_hand(self.dealer_hand, "Dealer")
+                if len(self.hands) > 1:
+                    for number, hand in enumerate(self.hands, 1):
+                        print(f"Hand {number}: {', '.join(card_name(card) for card in hand)} (Total: {hand.total})")
+                elif event["blackjack"] or event["dealer_blackjack"]:
+                    self.show_hand(self.player_hand, "Player")
+                if event["dealer_blackjack"]:
+                    print("Both have blackjack. It's a tie!" if event["blackjack"] else "Dealer has blackjack!")
+                elif event["blackjack"]:
+                    print("Blackjack! You win!")
+                elif self.surrendered:
+                    print("You surrender and get half your bet back.")
+                elif event["outcome"] < 0:
+                    print("Dealer wins. Better luck next time.")
+                elif event["dealer_bust"]:
+                    print("Dealer busts! You win!")
+                elif event["outcome"] > 0:
+                    print("Congratulations, you win!")
+                else:
+                    print("It's a tie!")
+
+    def place_bet(self):
+        """
+        Allow the player to place a bet and validate the amount.
+        """
+        while True:
+            print(f"You have {self.chips} chips.")
+            try:
+                bet = int(input("Place your bet: "))
+                if bet > self.chips or bet <= 0:
+                    print("Invalid bet amount. Try again.")
+                elif _risk and _risk.place_bet(self.account, "blackjack", bet):
+                    print(_risk.breaches[-1]["message"])
+                else:
+                    return bet
+            except ValueError:
+                print("Please enter a valid number.")
+
+    def player_turn(self):
+        """
+        Ask the player for an action or a hint until their turn is over, taking the extra stake for a double or split.
+        """
+        while self.phase == "player":
+            if len(self.hands) > 1:
+                print(f"Playing hand {self.active + 1} of {len(self.hands)}.")
+            self.show_hand(self.player_hand, "Player")
+            actions = self.legal_actions()
+            action = input(f"Do you want to {', '.join(repr(action) for action in actions)} or get a 'hint'? ").lower()
+            if action == 'hint':
+                suggestion = blackjack_best_action(self.player_hand, self.dealer_hand[0], self.rules)
+                print(f"Optimal strategy says: {suggestion}.")
+            elif action not in actions:
+                print(f"Invalid action. Please choose one of: {', '.join(actions)}.")
+            elif action in ("double", "split") and self.bets[self.active] > self.chips:
+                print(f"You need {self.bets[self.active]} more chips to {action}.")
+            elif action in ("double", "split") and _risk \
+                    and _risk.place_bet(self.account, "blackjack", self.bets[self.active]):
+                print(_risk.breaches[-1]["message"])
+            else:
+                if action in ("double", "split"):
+                    self.ledger.bet(self.account, "blackjack", self.bets[self.active])
+                self.show_events(self.apply_action(action)[1])
+
+    def play(self):
+        """
+        Play the Blackjack game, allowing the player to bet and take turns.
+        """
+        print("Welcome to Blackjack!")
+        self.ledger = self.ledger or get_chip_ledger()
+        self.ledger.open_account(self.account, 1000)  # Starting chips for a new or broke player
+        while self.chips > 0:
+            if _risk and _risk.session_limit_reached(self.account):
+                print("You have reached your session loss limit. Game over.")
+                break
+            started = time.perf_counter()
+            bet = self.place_bet()
+            self.ledger.bet(self.account, "blackjack", bet)
+            self.show_events(self.start_round(bet)[1])
+            self.player_turn()
+            self.ledger.pay(self.account, "blackjack", self.payout)
+            if _risk:
+                _risk.settle(self.account, self.staked, self.payout)
+            if _history:
+                _history.record("blackjack", self.account, self.staked, self.payout)
+            if _metrics:
+                _metrics.observe("round_seconds", time.perf_counter() - started, game="blackjack")
+
+            if self.chips <= 0:
+                print("You're out of chips! Game over.")
+                break
+            else:
+                play_again = input("Do you want to play another round? (yes/no): ").lower()
+                if play_again != 'yes':
+                    print(f"You left the game with {self.chips} chips. Goodbye!")
+                    break
+
+# ------------------ Blackjack Strategy Tables ------------------
+
+DEALER_TOTALS = [17, 18, 19, 20, 21]  # Dealer outcome vectors hold these totals, then the bust probability
+
+
+def shoe_key(counts):
+    """
+    Pack ten per-rank card counts (Ace, 2-9, ten-valued) into one integer, eight bits per rank.
+
+    Raises ValueError if a count does not fit in eight bits, as in a shoe of more than MAX_DECKS decks.
+    """
+    if max(counts) > 0xFF:
+        raise ValueError(f"A shoe key holds at most 255 cards of a rank, not {max(counts)}.")
+    key = 0
+    for index, count in enumerate(counts):
+        key |= count << (8 * index)
+    return key
+
+
+def shoe_counts(key):
+    """
+    Unpack a shoe key into its ten per-rank card counts.
+    """
+    return [(key >> (8 * index)) & 0xFF for index in range(10)]
+
+
+POINT_INDEX = [points - 1 for points in HARD_POINTS]  # Strategy-table rank index: 0 for an Ace, else points - 1
+
+
+class BlackjackStrategy:
+    def __init__(self, deck_count=6, cache_size=200_000):
+        """
+        Initialize hit/stand strategy tables for a shoe of deck_count decks.
+
+        The dealer stands on all 17s and the player may only hit or stand; BlackjackAnalysis plays every rule.
+        Tables are indexed [has_ace][hard_total][upcard_index], where the hard total counts Aces as 1.
+        """
+        self.deck_count = deck_count
+        self.full_shoe = shoe_key([4 * deck_count] * 9 + [16 * deck_count])
+        self.dealer_outcomes = lru_cache(maxsize=cache_size)(self._dealer_outcomes)
+        self.tables_for = lru_cache(maxsize=256)(self._tables_for)
+        self.stand_ev = self.hit_ev = self.actions = None
+
+    def build(self):
+        """
+        Compute the EV and action tables for a full shoe.
+        """
+        self.stand_ev, self.hit_ev, self.actions = self.tables_for(self.full_shoe)
+        return self
+
+    def _dealer_outcomes(self, total, has_ace, key):
+        """
+        Return the probabilities of the dealer finishing on 17-21 or busting from a hard total and shoe key.
+        """
+        best = total + 10 if has_ace and total <= 11 else total
+        if best > 21:
+            return (0.0,) * 5 + (1.0,)
+        if best >= 17:
+            return tuple(1.0 if best == final else 0.0 for final in DEALER_TOTALS) + (0.0,)
+        counts = shoe_counts(key)
+        remaining = sum(counts)
+        outcomes = [0.0] * 6
+        for index, count in enumerate(counts):
+            if count:
+                following = self.dealer_outcomes(total + index + 1, has_ace or index == 0,
+                                                 key - (1 << (8 * index)))
+                for position in range(6):
+                    outcomes[position] += count / remaining * following[position]
+        return tuple(outcomes)
+
+    def dealer_distribution(self, upcard_index, key=None):
+        """
+        Return the dealer's final-total distribution for an upcard, drawing from the shoe minus that upcard.
+        """
+        key = (key or self.full_shoe) - (1 << (8 * upcard_index))
+        return self.dealer_outcomes(upcard_index + 1, upcard_index == 0, key)
+
+    def _tables_for(self, key):
+        """
+        Compute (stand_ev, hit_ev, actions) tables for a shoe composition.
+
+        Card probabilities come from the shoe minus the dealer's upcard and stay fixed while the player draws.
+        """
+        stand_ev = np.full((2, 22, 10), -1.0)
+        hit_ev = np.full((2, 22, 10), -1.0)
+        for upcard in range(10):
+            counts = shoe_counts(key)
+            counts[upcard] -= 1
+            probabilities = [count / sum(counts) for count in counts]
+            dealer = self.dealer_distribution(upcard, key)
+            for has_ace in (0, 1):
+                for total in range(2, 22):
+                    best = total + 10 if has_ace and total <= 11 else total
+                    won = dealer[5] + sum(dealer[position] for position, final in enumerate(DEALER_TOTALS)
+                                          if final < best)
+                    lost = sum(dealer[position] for position, final in enumerate(DEALER_TOTALS) if final > best)
+                    stand_ev[has_ace, total, upcard] = won - lost
+            # Hitting only ever raises the hard total, so fill the table from 21 downwards
+            for total in range(21, 1, -1):
+                for has_ace in (0, 1):
+                    ev = 0.0
+                    for index, probability in enumerate(probabilities):
+                        drawn = total + index + 1
+                        if drawn > 21:
+                            ev -= probability
+                        else:
+                            drawn_ace = int(has_ace or index == 0)
+                            ev += probability * max(stand_ev[drawn_ace, drawn, upcard], hit_ev[drawn_ace, drawn, upcard])
+                    hit_ev[has_ace, total, upcard] = ev
+        actions = np.where(hit_ev > stand_ev, "hit", "stand")
+        return stand_ev, hit_ev, actions
+
+    def best_action(self, player_hand, upcard):
+        """
+        Return 'hit' or 'stand' for a player hand against the dealer's upcard.
+        """
+        if not isinstance(player_hand, BlackjackHand):
+            player_hand = BlackjackHand(player_hand)
+        if player_hand.hard_total > 21:
+            return "stand"
+        return self.actions[int(player_hand.aces > 0), player_hand.hard_total, POINT_INDEX[upcard]]
+
+    def save(self, path):
+        """
+        Write the full-shoe tables to a JSON file.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as file:
+            json.dump({"deck_count": self.deck_count, "stand_ev": self.stand_ev.tolist(),
+                       "hit_ev": self.hit_ev.tolist()}, file)
+
+    def load(self, path):
+        """
+        Read full-shoe tables written by save().
+        """
+        with open(path) as file:
+            tables = json.load(file)
+        if tables["deck_count"] != self.deck_count:
+            raise ValueError(f"{path} holds tables for {tables['deck_count']} decks, not {self.deck_count}.")
+        self.stand_ev = np.array(tables["stand_ev"])
+        self.hit_ev = np.array(tables["hit_ev"])
+        self.actions = np.where(self.hit_ev > self.stand_ev, "hit", "stand")
+        return self
+
+
+_blackjack_strategies = {}
+
+
+def get_blackjack_strategy(deck_count=6):
+    """
+    Return the shared BlackjackStrategy for deck_count decks, loading cached tables or building them once.
+    """
+    if deck_count not in _blackjack_strategies:
+        strategy = BlackjackStrategy(deck_count)
+        path = os.path.join(CACHE_DIR, f"blackjack_strategy_{deck_count}deck.json")
+        try:
+            strategy.load(path)
+        except (OSError, ValueError, KeyError):
+            strategy.build()
+            try:
+                strategy.save(path)
+            except OSError:
+                pass  # Read-only home directory; the tables are simply rebuilt next time
+        _blackjack_strategies[deck_count] = strategy
+    return _blackjack_strategies[deck_count]
+
+
+# ------------------ Blackjack Analysis ------------------
+
+@lru_cache(maxsize=8)
+def falling_factorials(size, depth):
+    """
+    Return a (size + 1, depth + 1) array whose [n, d] entry is n * (n - 1) * ... * (n - d + 1).
+    """
+    table = np.ones((size + 1, depth + 1))
+    counts = np.arange(size + 1, dtype=float)
+    for drawn in range(1, depth + 1):
+        table[:, drawn] = table[:, drawn - 1] * np.maximum(counts - drawn + 1, 0)
+    return table
+
+
+@lru_cache(maxsize=32)
+def dealer_draws(upcard, hits_soft_17):
+    """
+    Enumerate every order the dealer can draw cards in behind an upcard rank index, hole card first,
+    leaving out a dealer blackjack, and group the orders by the cards drawn.
+
+    Returns (draws, orderings, finals): an array of per-rank counts of the cards each group draws, how many
+    orders draw exactly those cards, and where the group's final total falls in DEALER_TOTALS, 5 for a bust.
+    """
+    groups = {}
+    stack = [(upcard + 1, upcard == 0, (0,) * 10, 0)]
+    while stack:
+        hard, has_ace, drawn, size = stack.pop()
+        best = hard + 10 if has_ace and hard <= 11 else hard
+        if size and (best > 17 or best == 17 and not (hits_soft_17 and hard == 7)):
+            if size > 1 or best != 21:
+                group = groups.setdefault(drawn, [0, min(best, 22) - 17])
+                group[0] += 1
+            continue
+        for rank in range(10):
+            stack.append((hard + rank + 1, has_ace or rank == 0,
+                          drawn[:rank] + (drawn[rank] + 1,) + drawn[rank + 1:], size + 1))
+    orderings, finals = zip(*groups.values())
+    return np.array(list(groups), dtype=np.intp), np.array(orderings, dtype=float), np.array(finals)
+
+
+class BlackjackAnalysis:
+    def __init__(self, rules=None, upcard=0):
+        """
+        Initialize the exact analysis of rounds dealt against one dealer upcard rank index (0 for an Ace,
+        else points - 1) under a set of rules.
+
+        Every value is the player's expected net per unit of the opening bet, given the dealer has no
+        blackjack, and is found by recursion over the shoe compositions the player's cards leave, with each
+        subproblem memoized by its shoe key. The player's decisions use every card in their hand, so they
+        play the best composition-dependent strategy. A split hand is valued with its pair and the upcard out
+        of the shoe but not the cards the other hand draws, the usual approximation for splits.
+        """
+        self.rules = rules or get_blackjack_rules()
+        self.upcard = upcard
+        counts = [4 * self.rules.decks] * 9 + [16 * self.rules.decks]
+        counts[upcard] -= 1
+        self.shoe = shoe_key(counts)  # Shoe key of the full shoe less the upcard
+        self.hole = {0: 9, 9: 0}.get(upcard)  # Hole card that gives the dealer blackjack, if one can
+        self.counts = counts
+        self.draws, orderings, finals = dealer_draws(upcard, self.rules.dealer_hits_soft_17)
+        self.sizes = self.draws.sum(axis=1)
+        self.falling = falling_factorials(sum(counts), int(self.sizes.max()))
+        self.weights = orderings * self.falling[counts, self.draws].prod(axis=1) \
+            / self.falling[sum(counts), self.sizes]  # Probability of each group of draws from the full shoe
+        self.finals = np.eye(6)[finals]  # One-hot final total of each group
+        self.removal_factor = lru_cache(maxsize=None)(self._removal_factor)
+        self.dealer_outcomes = lru_cache(maxsize=None)(self._dealer_outcomes)
+        self.draw_probabilities = lru_cache(maxsize=None)(self._draw_probabilities)
+        self.play_ev = lru_cache(maxsize=None)(self._play_ev)
+        self.hand_values = lru_cache(maxsize=None)(self._hand_values)
+
+    def _removal_factor(self, rank, removed):
+        """
+        Return how each group's probability scales when removed cards of a rank (or, for rank None, of any rank)
+        leave the full shoe.
+
+        A group drawing d cards of a rank holding n has probability proportional to n * (n - 1) * ... * (n - d + 1)
+        over the same product for the whole shoe, so only the ranks the player holds need rescaling.
+        """
+        if rank is None:
+            cards = sum(self.counts)
+            return self.falling[cards, self.sizes] / self.falling[cards - removed, self.sizes]
+        count = self.counts[rank]
+        full = self.falling[count, self.draws[:, rank]]
+        return np.divide(self.falling[count - removed, self.draws[:, rank]], full, out=np.zeros_like(full),
+                         where=full > 0)
+
+    def _dealer_outcomes(self, key):
+        """
+        Return the probabilities of the dealer finishing on 17-21 or busting, drawing from a shoe key.
+        """
+        counts = shoe_counts(key)
+        weights = self.weights * self.removal_factor(None, sum(self.counts) - sum(counts))
+        for rank, (full, left) in enumerate(zip(self.counts, counts)):
+            if full != left:
+                weights = weights * self.removal_factor(rank, full - left)
+        outcomes = weights @ self.finals
+        return tuple((outcomes / outcomes.sum()).tolist())
+
+    def _draw_probabilities(self, key):
+        """
+        Return the probability of the player drawing each rank from a shoe key, knowing the hole card
+        does not give the dealer blackjack.
+        """
+        counts = shoe_counts(key)
+        remaining = sum(counts)
+        if self.hole is None:
+            return tuple(count / remaining for count in counts)
+        blackjack = counts[self.hole]
+        scale = (remaining - blackjack) * (remaining - 1)
+        return tuple(count * (remaining - blackjack - (rank != self.hole)) / scale
+                     for rank, count in enumerate(counts))
+
+    def stand_ev(self, key, total):
+        """
+        Return the value of standing on a best total, the dealer drawing from a shoe key.
+        """
+        if total > 21:
+            return -1.0
+        dealer = self.dealer_outcomes(key)
+        won = dealer[5] + sum(dealer[position] for position, final in enumerate(DEALER_TOTALS) if final < total)
+        lost = sum(dealer[position] for position, final in enumerate(DEALER_TOTALS) if final > total)
+        return won - lost
+
+    def hit_ev(self, key, hard_total, has_ace, double=False):
+        """
+        Return the value of taking a card on a hard total and playing on, or of doubling for exactly one card.
+        """
+        ev = 0.0
+        for rank, probability in enumerate(self.draw_probabilities(key)):
+            if probability:
+                drawn = hard_total + rank + 1
+                if drawn > 21:
+                    ev -= probability
+                elif double:
+                    ev += probability * self.stand_ev(key - (1 << (8 * rank)),
+                                                      drawn + 10 if (has_ace or rank == 0) and drawn <= 11 else drawn)
+                else:
+                    ev += probability * self.play_ev(key - (1 << (8 * rank)), drawn, has_ace or rank == 0)
+        return 2 * ev if double else ev
+
+    def _play_ev(self, key, hard_total, has_ace):
+        """
+        Return the value of the better of hitting and standing on a hand that may do nothing else.
+        """
+        best = hard_total + 10 if has_ace and hard_total <= 11 else hard_total
+        stand = self.stand_ev(key, best)
+        return stand if best >= 21 else max(stand, self.hit_ev(key, hard_total, has_ace))
+
+    def split_ev(self, rank):
+        """
+        Return the value of splitting a pair of a rank into two hands, each played on with a card drawn to it.
+        """
+        key = self.shoe - (2 << (8 * rank))
+        ev = 0.0
+        for drawn, probability in enumerate(self.draw_probabilities(key)):
+            if probability:
+                if rank == 0:  # Split Aces take one card each
+                    ev += probability * self.stand_ev(key - (1 << (8 * drawn)), 21 if drawn == 9 else drawn + 12)
+                else:
+                    values = self.hand_values(tuple(sorted((rank, drawn))), rank)
+                    ev += probability * max(values.values())
+        return 2 * ev
+
+    def _hand_values(self, ranks, partner=None):
+        """
+        Return {action: value} over the legal actions for a hand of rank indices, where partner is the rank
+        of the pair it was split from, if any.
+        """
+        key = self.shoe - sum(1 << (8 * rank) for rank in ranks) - (0 if partner is None else 1 << (8 * partner))
+        hard_total = sum(ranks) + len(ranks)
+        has_ace = 0 in ranks
+        best = hard_total + 10 if has_ace and hard_total <= 11 else hard_total
+        if best > 21:
+            return {"stand": -1.0}
+        values = {"hit": self.hit_ev(key, hard_total, has_ace), "stand": self.stand_ev(key, best)}
+        if len(ranks) == 2:
+            if partner is None or self.rules.double_after_split:
+                values["double"] = self.hit_ev(key, hard_total, has_ace, double=True)
+            if partner is None and ranks[0] == ranks[1]:
+                values["split"] = self.split_ev(ranks[0])
+            if partner is None and self.rules.surrender:
+                values["surrender"] = -0.5
+        return values
+
+    def best_action(self, player_hand):
+        """
+        Return the best legal action for a BlackjackHand against this upcard.
+        """
+        ranks = tuple(sorted(POINT_INDEX[card] for card in player_hand))
+        values = self.hand_values(ranks, POINT_INDEX[player_hand[0]] if player_hand.split else None)
+        return max(values, key=values.get)
+
+    def expected_return(self):
+        """
+        Return the player's expected net per unit bet over every two-card hand dealt against this upcard,
+        naturals and dealer blackjacks included.
+        """
+        counts = shoe_counts(self.shoe)
+        remaining = sum(counts)
+        ev = 0.0
+        for first, second in combinations_with_replacement(range(10), 2):
+            probability = counts[first] * (counts[second] - (first == second)) / (remaining * (remaining - 1))
+            if not probability:
+                continue
+            if first != second:
+                probability *= 2
+            left = shoe_counts(self.shoe - (1 << (8 * first)) - (1 << (8 * second)))
+            blackjack = left[self.hole] / sum(left) if self.hole is not None else 0.0
+            if (first, second) == (0, 9):
+                value = (1 - blackjack) * self.rules.blackjack_payout
+            else:
+                value = (1 - blackjack) * max(self.hand_values((first, second)).values()) - blackjack
+            ev += probability * value
+        return ev
+
+
+_blackjack_analyses = {}
+
+
+def get_blackjack_analysis(rules=None, upcard=0):
+    """
+    Return the shared BlackjackAnalysis for a set of rules and an upcard rank index, keeping its memoized values.
+    """
+    rules = rules or get_blackjack_rules()
+    if (rules.key, upcard) not in _blackjack_analyses:
+        _blackjack_analyses[rules.key, upcard] = BlackjackAnalysis(rules, upcard)
+    return _blackjack_analyses[rules.key, upcard]
+
+
+def blackjack_best_action(player_hand, upcard, rules=None):
+    """
+    Return the best legal action for a BlackjackHand against an integer dealer upcard, by exact analysis.
+    """
+    return get_blackjack_analysis(rules, POINT_INDEX[upcard]).best_action(player_hand)
+
+
+def upcard_expected_return(rules, upcard):
+    """
+    Return the player's exact expected net per unit bet against one upcard rank index.
+    """
+    return BlackjackAnalysis(rules, upcard).expected_return()
+
+
+def exact_house_edge(rules=None, workers=None):
+    """
+    Compute the house edge of a set of rules exactly, each dealer upcard analysed on its own worker process.
+
+    Returns (edge, returns): the house edge per unit of the opening bet, and the player's expected net
+    against each upcard from Ace to ten.
+    """
+    rules = rules or get_blackjack_rules()
+    arguments = ([rules] * 10, range(10))
+    if workers == 1:
+        returns = list(map(upcard_expected_return, *arguments))
+    else:
+        with futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            returns = list(executor.map(upcard_expected_return, *arguments))
+    counts = [4] * 9 + [16]
+    return -sum(count / 52 * ev for count, ev in zip(counts, returns)), returns
+
+
+def run_house_edge(rules=None, workers=None):
+    """
+    Print the exact house edge of a set of rules and the player's return against each upcard.
+    """
+    rules = rules or get_blackjack_rules()
+    started = time.perf_counter()
+    edge, returns = exact_house_edge(rules, workers)
+    print(f"Blackjack with {rules}")
+    print(f"{'upcard':>6} {'return':>8}")
+    for name, ev in zip(["A", *map(str, range(2, 11))], returns):
+        print(f"{name:>6} {ev:>+8.2%}")
+    print(f"House edge {edge:.3%}, computed exactly in {time.perf_counter() - started:.1f}s")
+    return edge
+
+
+# ------------------ Card Counting ------------------
+
+# Count tag of each rank, 2 through Ace
+COUNT_SYSTEMS = {
+    "hi-lo": (1, 1, 1, 1, 1, 0, 0, 0, -1, -1, -1, -1, -1),
+    "ko": (1, 1, 1, 1, 1, 1, 0, 0, -1, -1, -1, -1, -1),  # Unbalanced: a full shoe does not sum to zero
+    "hi-opt-1": (0, 1, 1, 1, 1, 0, 0, 0, -1, -1, -1, -1, 0),
+    "omega-2": (1, 1, 2, 2, 2, 1, 0, -1, -2, -2, -2, -2, 0),
+}
+
+
+TRACKER_RECORD = struct.Struct("<BBiH")  # Deck count, count system, running count, cards left
+
+
+class ShoeTracker:
+    def __init__(self, deck_count=6, system="hi-lo"):
+        """
+        Initialize a tracker of the cards dealt from a shoe of deck_count decks, counted with a COUNT_SYSTEMS tag set.
+
+        A shoe holding a tracker reports every card it deals and every reshuffle, so the running count,
+        true count and remaining-rank histogram are always current at O(1) cost per card.
+        """
+        if system not in COUNT_SYSTEMS:
+            raise ValueError(f"Unknown count system {system}; choose one of {', '.join(COUNT_SYSTEMS)}.")
+        self.deck_count = deck_count
+        self.system = system
+        self.tags = [COUNT_SYSTEMS[system][card >> 2] for card in range(52)]  # Tag of each integer card
+        self.reset()
+
+    def reset(self):
+        """
+        Start tracking a freshly shuffled shoe.
+        """
+        self.remaining = array('H', [4 * self.deck_count]) * 13  # Cards left of each rank, 2 through Ace
+        self.cards_left = 52 * self.deck_count
+        self.running_count = 0
+
+    def see(self, cards):
+        """
+        Update the counts for integer cards dealt from the shoe.
+        """
+        remaining = self.remaining
+        tags = self.tags
+        for card in cards:
+            remaining[card >> 2] -= 1
+            self.running_count += tags[card]
+        self.cards_left -= len(cards)
+
+    @property
+    def decks_left(self):
+        """
+        Number of decks still in the shoe.
+        """
+        return self.cards_left / 52
+
+    @property
+    def true_count(self):
+        """
+        Running count per deck still in the shoe.
+        """
+        return self.running_count * 52 / self.cards_left if self.cards_left else 0.0
+
+    @property
+    def penetration(self):
+        """
+        Fraction of the shoe dealt since the last shuffle.
+        """
+        return 1 - self.cards_left / (52 * self.deck_count)
+
+    def rank_histogram(self):
+        """
+        Return {rank name: cards left} for the unseen part of the shoe.
+        """
+        return dict(zip(RANKS, self.remaining))
+
+    def composition(self):
+        """
+        Return the cards left as strategy-table counts (Ace, 2-9, ten-valued), ready for shoe_key().
+        """
+        remaining = self.remaining
+        return [remaining[12], *remaining[:8], sum(remaining[8:12])]
+
+    def snapshot(self):
+        """
+        Return the counts as a binary record, stored after the shoe's own.
+        """
+        return b"".join((SNAPSHOT_HEADERS["tracker"],
+                         TRACKER_RECORD.pack(self.deck_count, list(COUNT_SYSTEMS).index(self.system),
+                                             self.running_count, self.cards_left),
+                         self.remaining.tobytes()))
+
+    def restore(self, data):
+        """
+        Load a record written by snapshot() and return the tracker.
+        """
+        offset = read_snapshot_header(data, "tracker")
+        self.deck_count, system, self.running_count, self.cards_left = TRACKER_RECORD.unpack_from(data, offset)
+        offset += TRACKER_RECORD.size
+        if list(COUNT_SYSTEMS)[system] != self.system:
+            self.system = list(COUNT_SYSTEMS)[system]
+            self.tags = [COUNT_SYSTEMS[self.system][card >> 2] for card in range(52)]
+        self.remaining = array('H', data[offset:offset + 26])
+        return self
+
+
+class CountEdgeStats:
+    def __init__(self, limit=10):
+        """
+        Initialize per-true-count results; counts are floored and clamped to [-limit, limit].
+        """
+        self.limit = limit
+        self.bins = {}  # Floored true count -> SimulationStats of the rounds started at that count
+        self.shoes = 0
+
+    def add(self, true_count, net_return):
+        """
+        Record a round's net return per unit bet under the true count it was dealt at.
+        """
+        index = max(-self.limit, min(self.limit, int(true_count // 1)))
+        stats = self.bins.get(index)
+        if stats is None:
+            stats = self.bins[index] = SimulationStats()
+        stats.add(net_return)
+
+    def merge(self, other):
+        """
+        Fold another CountEdgeStats into this one.
+        """
+        self.shoes += other.shoes
+        for index, stats in other.bins.items():
+            self.bins.setdefault(index, SimulationStats()).merge(stats)
+        return self
+
+    @property
+    def overall(self):
+        """
+        SimulationStats over every round regardless of count.
+        """
+        total = SimulationStats()
+        for stats in self.bins.values():
+            total.merge(stats)
+        return total
+
+    def summary(self):
+        """
+        Return one row per true count: its share of rounds, the player's edge and its 95% confidence interval.
+        """
+        rounds = sum(stats.rounds for stats in self.bins.values())
+        rows = []
+        for index in sorted(self.bins):
+            stats = self.bins[index]
+            low, high = stats.confidence_interval()
+            rows.append({"true_count": index, "rounds": stats.rounds, "share": stats.rounds / rounds,
+                         "edge": stats.mean, "ci_low": low, "ci_high": high})
+        return rows
+
+
+def simulate_count_edge(shoes, seed=None, deck_count=6, penetration=0.75, system="hi-lo"):
+    """
+    Deal shoes to the cut card, playing the exact full-shoe strategy (doubles, splits and surrender included)
+    at one unit per round, and record the player's edge by the true count at the start of each round.
+    """
+    tracker = ShoeTracker(deck_count, system)
+    rules = BlackjackRules(deck_count, *get_blackjack_rules().key[1:])
+    game = BlackjackCore(deck=LocalShoe(deck_count, penetration, NumpySource(seed), tracker=tracker), rules=rules)
+    stats = CountEdgeStats()
+    stats.shoes = shoes
+    for _ in range(shoes):
+        game.shuffle_new_deck()
+        while not game.deck.needs_shuffle:
+            true_count = tracker.true_count
+            game.start_round(1)
+            while game.phase == "player":
+                game.apply_action(blackjack_best_action(game.player_hand, game.dealer_hand[0], rules))
+            stats.add(true_count, game.exact_payout - game.staked)
+    return stats
+
+
+def run_count_analysis(shoes=10_000, deck_count=6, penetration=0.75, system="hi-lo", workers=None, seed=None):
+    """
+    Simulate shoes across worker processes and print the player's edge at each true count.
+    """
+    stats = run_sharded("count_edge", shoes, seed=seed, shards=min(64, shoes), workers=workers,
+                        deck_count=deck_count, penetration=penetration, system=system)
+    overall = stats.overall
+    print(f"{stats.shoes:,} shoes of {deck_count} decks dealt to {penetration:.0%} penetration, "
+          f"{overall.rounds:,} rounds, {system} count")
+    print(f"{'true count':>10} {'rounds':>12} {'share':>7} {'edge':>8} {'95% interval':>18}")
+    for row in stats.summary():
+        print(f"{row['true_count']:>+10} {row['rounds']:>12,} {row['share']:>7.1%} {row['edge']:>+8.2%} "
+              f"{row['ci_low']:>+8.2%} to {row['ci_high']:+.2%}")
+    print(f"{'overall':>10} {overall.rounds:>12,} {1:>7.0%} {overall.mean:>+8.2%}")
+    return stats
+
+
+# ------------------ Slot Machine Game ------------------
+
+SLOT_PAYLINES = [(1, 1, 1), (0, 0, 0), (2, 2, 2), (0, 1, 2), (2, 1, 0)]  # Row shown on each reel; 0 is the top row
+
+
+def build_reel_strip(weights, seed=0):
+    """
+    Lay out a reel strip from {symbol index: number of stops}, spread in a fixed shuffled order.
+    """
+    strip = [symbol for symbol, count in sorted(weights.items()) for _ in range(count)]
+    random.Random(seed).shuffle(strip)
+    return strip
+
+
+FIVE_LINE_WEIGHTS = {0: 7, 1: 6, 2: 5, 3: 4, 4: 3, 5: 2, 6: 2, 7: 1, 8: 1, 9: 1}  # 32 stops, low symbols heavy
+FIVE_LINE_SLOT = {  # Weighted five-line machine paying two-of-a-kind on fruit: 96.9% RTP, 40.7% hit frequency
+    "reels": [build_reel_strip(FIVE_LINE_WEIGHTS, seed=reel) for reel in range(3)],
+    "paylines": SLOT_PAYLINES,
+    "partial_pays": {"🍒": 4, "🍋": 3, "🍊": 1},
+}
+
+
+SLOT_RECORD = struct.Struct("<Bqq")  # Phase, bet, net payout; the window's nine symbol indices follow
+
+
+class SlotCore:
+    def __init__(self, rng=None, reels=None, paylines=None, partial_pays=None):
+        """
+        Initialize the slot machine rules with symbols, their values, reel strips and paylines, with no terminal I/O.
+
+        Each reel strip lists the symbol index at every stop, and all reels have the same number of stops.
+        By default every symbol has one stop per reel and only the middle row pays, on three of a kind.
+        A round is a single start_round(bet), which spins and settles at once and returns (state, events).
+        """
+        self.emojis = ["🍒", "🍋", "🍊", "🍉", "🍇", "⭐", "🔔", "🍀", "💎", "👑"]
+        self.values = {
+            "🍒": 10, "🍋": 20, "🍊": 30, "🍉": 50,
+            "🍇": 75, "⭐": 100, "🔔": 150, "🍀": 200,
+            "💎": 300, "👑": 500
+        }
+        self.reels = reels or [list(range(len(self.emojis)))] * 3
+        self.paylines = paylines or SLOT_PAYLINES[:1]
+        self.partial_pays = partial_pays or {}  # Symbol -> pay for a match on the first two reels only
+        self.stops = len(self.reels[0])
+        if any(len(reel) != self.stops for reel in self.reels):
+            raise ValueError("Every reel strip needs the same number of stops.")
+        self.rng = rng  # Random source; the shared one unless given, picked up on the first spin
+
+        # windows[reel, stop, row] is the symbol index shown on a row when the reel stops there
+        strips = np.array(self.reels)
+        self.windows = np.stack([np.roll(strips, 1 - row, axis=1) for row in range(3)], axis=2)
+        self.three_pays = np.array([self.values[emoji] for emoji in self.emojis])
+        self.two_pays = np.array([self.partial_pays.get(emoji, 0) for emoji in self.emojis])
+        self.phase = "idle"
+        self.bet = 0
+        self.window = None  # Rows of symbols shown by the last spin
+        self.payout = 0  # Net chips won or lost on the last spin
+
+    def spin(self):
+        """
+        Simulate a spin of the slot machine by drawing three reel stops from the random source.
+
+        Returns the visible window as three rows of three symbols.
+        """
+        if self.rng is None:
+            self.rng = get_random_source()
+        stops = self.rng.integers(0, self.stops - 1, 3)
+        if _metrics:
+            _metrics.inc("spins_total", game="slots")
+        return [[self.emojis[self.windows[reel, stop, row]] for reel, stop in enumerate(stops)] for row in range(3)]
+
+    def line_pays(self, result):
+        """
+        Return what each payline pays per chip bet on it for a spin result.
+        """
+        pays = []
+        for line in self.paylines:
+            first, second, third = (result[row][reel] for reel, row in enumerate(line))
+            if first == second == third:
+                pays.append(self.values[first])
+            elif first == second:
+                pays.append(self.partial_pays.get(first, 0))
+            else:
+                pays.append(0)
+        return pays
+
+    def calculate_payout(self, result, bet):
+        """
+        Calculate the payout based on the spin result, for a bet on each payline.
+        """
+        return sum(self.line_pays(result)) * bet
+
+    def net_payout(self, result, bet):
+        """
+        Return the change in chips for a spin: winning lines pay their payout, losing lines lose their bet.
+        """
+        return sum(pay * bet if pay else -bet for pay in self.line_pays(result))
+
+    def spin_batch(self, count, rng):
+        """
+        Spin count times at once with a random source and return the net payout per chip per line of each spin.
+        """
+        stops = rng.integer_array(0, self.stops - 1, (count, 3))
+        net = np.zeros(count)
+        for line in self.paylines:
+            first, second, third = (self.windows[reel, stops[:, reel], row] for reel, row in enumerate(line))
+            pays = np.where(first == second, np.where(second == third, self.three_pays[first], self.two_pays[first]), 0)
+            net += np.where(pays > 0, pays, -1)
+        return net / len(self.paylines)
+
+    def paytable_report(self):
+        """
+        Compute the exact RTP, hit frequency and variance by enumerating every combination of reel stops.
+        """
+        shape = (self.stops,) * 3
+        net = np.zeros(shape)
+        hit = np.zeros(shape, dtype=bool)
+        for line in self.paylines:
+            first, second, third = (self.windows[reel, :, row] for reel, row in enumerate(line))
+            # Outer comparisons give the pay of this line for every (stop 1, stop 2, stop 3) at once
+            pairs = first[:, None] == second[None, :]
+            triples = pairs[:, :, None] & (second[None, :, None] == third[None, None, :])
+            pays = np.where(triples, self.three_pays[first][:, None, None],
+                            np.where(pairs, self.two_pays[first][:, None], 0)[:, :, None])
+            net += np.where(pays > 0, pays, -1)
+            hit |= pays > 0
+        net /= len(self.paylines)
+        return {"rtp": 1 + float(net.mean()), "hit_frequency": float(hit.mean()), "variance": float(net.var()),
+                "combinations": net.size}
+
+    def legal_actions(self):
+        """
+        Slot rounds take no actions after the spin.
+        """
+        return ()
+
+    def state(self):
+        """
+        Return the last spin as a dict.
+        """
+        return {"phase": self.phase, "bet": self.bet, "lines": len(self.paylines), "window": self.window,
+                "payout": self.payout, "actions": ()}
+
+    def start_round(self, bet):
+        """
+        Spin for a bet on every payline and settle it.
+        """
+        self.window = self.spin()
+        started = time.perf_counter() if _metrics else 0.0
+        self.payout = self.net_payout(self.window, bet)
+        if _metrics:
+            _metrics.observe("payout_seconds", time.perf_counter() - started, game="slots")
+        self.bet = bet
+        self.phase = "settled"
+        return self.state(), [{"event": "spin", "window": self.window},
+                              {"event": "settle", "payout": self.payout,
+                               "returned": self.payout + bet * len(self.paylines)}]
+
+    def apply_action(self, action):
+        """
+        Reject any action; a slot round is settled as soon as it starts.
+        """
+        raise ValueError("Slot rounds have no actions; start a new round to spin again.")
+
+    def snapshot(self):
+        """
+        Return the last spin as a binary record; restore it into a machine with the same reels and paylines.
+        """
+        window = bytes(self.emojis.index(symbol) for row in self.window for symbol in row) if self.window else b""
+        return b"".join((SNAPSHOT_HEADERS["slots"],
+                         SLOT_RECORD.pack(self.phase == "settled", self.bet, self.payout), window))
+
+    def restore(self, data):
+        """
+        Load a record written by snapshot() and return the machine.
+        """
+        offset = read_snapshot_header(data, "slots")
+        settled, self.bet, self.payout = SLOT_RECORD.unpack_from(data, offset)
+        window = data[offset + SLOT_RECORD.size:]
+        self.phase = "settled" if settled else "idle"
+        self.window = [[self.emojis[index] for index in window[row:row + 3]] for row in range(0, 9, 3)] \
+            if window else None
+        return self
+
+
+class SlotMachine(SlotCore):
+    def __init__(self, rng=None, reels=None, paylines=None, partial_pays=None, ledger=None, account="player"):
+        """
+        Initialize the terminal slot machine over the rules core, with the player's ledger account.
+        """
+        super().__init__(rng, reels, paylines, partial_pays)
+        self.ledger = ledger  # Opened in play() so headless spins never touch the ledger
+        self.account = account
+
+    @property
+    def chips(self):
+        """
+        The player's current balance in the ledger.
+        """
+        return self.ledger.balance(self.account)
+
+    def place_bet(self):
+        """
+        Allow the player to place a bet and validate the amount.
+        """
+        lines = len(self.paylines)
+        while True:
+            print(f"You have {self.chips} chips.")
+            try:
+                bet = int(input("Place your bet: " if lines == 1 else f"Place your bet per line ({lines} lines): "))
+                if bet * lines > self.chips or bet <= 0:
+                    print("Invalid bet amount. Please try again.")
+                elif _risk and _risk.place_bet(self.account, "slots", bet * lines):
+                    print(_risk.breaches[-1]["message"])
+                else:
+                    return bet
+            except ValueError:
+                print("Please enter a valid number.")
+
+    def play(self):
+        """
+        Play the slot machine, allowing the player to place bets and spin.
+        """
+        print("Welcome to the Slot Machine!")
+        self.ledger = self.ledger or get_chip_ledger()
+        self.ledger.open_account(self.account, 500)  # Starting chips for a new or broke player
+        while self.chips > 0:
+            if _risk and _risk.session_limit_reached(self.account):
+                print("You have reached your session loss limit. Game over.")
+                break
+            started = time.perf_counter()
+            bet = self.place_bet()
+            self.ledger.bet(self.account, "slots", bet * len(self.paylines))
+            state, events = self.start_round(bet)
+            print("Result:")
+            for row in state["window"]:
+                print(f"  {' | '.join(row)}")
+
+            payout = state["payout"]
+            if payout > 0:
+                print(f"Congratulations! You won {payout} chips!")
+            elif payout == 0:
+                print("You broke even on this spin.")
+            else:
+                print("Sorry, you did not win this time.")
+            self.ledger.pay(self.account, "slots", events[-1]["returned"])
+            if _risk:
+                _risk.settle(self.account, bet * len(self.paylines), events[-1]["returned"])
+            if _history:
+                _history.record("slots", self.account, bet * len(self.paylines), events[-1]["returned"], "spin")
+            if _metrics:
+                _metrics.observe("round_seconds", time.perf_counter() - started, game="slots")
+
+            if self.chips <= 0:
+                print("You have no chips left! Game over.")
+                break
+            else:
+                play_again = input("Do you want to spin again? (yes/no): ").lower()
+                if play_again != 'yes':
+                    print(f"You left the game with {self.chips} chips. Goodbye!")
+                    break
+
+# ------------------ Roulette Game ------------------
+
+ROULETTE_PAYOUTS = {
+    "straight": 35, "split": 17, "street": 11, "corner": 8, "six_line": 5,
+    "dozen": 2, "column": 2, "color": 1, "odd_even": 1, "low_high": 1
+}
+INSIDE_BET_TYPES = {7: "split", 8: "street", 9: "corner", 10: "six_line"}
+
+
+def roulette_groups():
+    """
+    Build the legal number groups for split, street, corner and six line bets on the table layout.
+    """
+    rows = [[3 * row + 1, 3 * row + 2, 3 * row + 3] for row in range(12)]
+    splits = [{0, 1}, {0, 2}, {0, 3}]
+    splits += [{number, number + 1} for row in rows for number in row[:2]]
+    splits += [{number, number + 3} for number in range(1, 34)]
+    streets = [set(row) for row in rows] + [{0, 1, 2}, {0, 2, 3}]
+    corners = [{number, number + 1, number + 3, number + 4} for row in rows[:11] for number in row[:2]]
+    six_lines = [set(rows[row] + rows[row + 1]) for row in range(11)]
+    return {bet_type: {frozenset(group) for group in groups}
+            for bet_type, groups in (("split", splits), ("street", streets),
+                                     ("corner", corners), ("six_line", six_lines))}
+
+
+ROULETTE_GROUPS = roulette_groups()
+
+
+def choose_bet_type():
+    """
+    Display the list of bet types and allow the player to choose one.
+    """
+    print("\nBet Types:")
+    print("1: Straight Bet (bet on a single number, 35:1 payout)")
+    print("2: Color Bet (bet on Red or Black, 1:1 payout)")
+    print("3: Odd/Even Bet (bet on Odd or Even numbers, 1:1 payout)")
+    print("4: Low/High Bet (bet on Low 1-18 or High 19-36, 1:1 payout)")
+    print("5: Dozen Bet (bet on 1-12, 13-24 or 25-36, 2:1 payout)")
+    print("6: Column Bet (bet on one of the three columns, 2:1 payout)")
+    print("7: Split Bet (bet on two adjacent numbers, 17:1 payout)")
+    print("8: Street Bet (bet on a row of three numbers, 11:1 payout)")
+    print("9: Corner Bet (bet on four numbers meeting at a corner, 8:1 payout)")
+    print("10: Six Line Bet (bet on two adjacent rows, 5:1 payout)")
+
+    while True:
+        try:
+            choice = int(input("Choose a bet type (1-10): "))
+            if 1 <= choice <= 10:
+                return choice
+            else:
+                print("Invalid choice. Please choose a valid bet type.")
+        except ValueError:
+            print("Please enter a number between 1 and 10.")
+
+
+BET_DETAIL_PROMPTS = {
+    1: ("straight", "Enter a number to bet on (0-36): "),
+    2: ("color", "Enter 'red' or 'black': "),
+    3: ("odd_even", "Enter 'odd' or 'even': "),
+    4: ("low_high", "Enter 'low' (1-18) or 'high' (19-36): "),
+    5: ("dozen", "Enter the dozen to bet on (1-3): "),
+    6: ("column", "Enter the column to bet on (1-3): "),
+    **{choice: (bet_type, "Enter the numbers separated by spaces: ") for choice, bet_type in INSIDE_BET_TYPES.items()},
+}
+
+
+def parse_roulette_bet(args, wheel):
+    """
+    Parse roulette bet details such as 'straight 17', 'color red', 'dozen 2' or 'corner 1 2 4 5'.
+
+    Raises ValueError with a message fit for the player when the words do not name a bet on the layout.
+    """
+    if len(args) < 2:
+        raise ValueError("Usage: BET <amount> <type> <choice>.")
+    bet_type, choices = args[0].lower(), [choice.lower() for choice in args[1:]]
+    if bet_type not in ROULETTE_PAYOUTS:
+        raise ValueError("Invalid bet type.")
+    if bet_type in ROULETTE_GROUPS:
+        if not all(choice.isdigit() for choice in choices):
+            raise ValueError("Please enter valid numbers.")
+        bet_details = {"type": bet_type, "numbers": [int(choice) for choice in choices]}
+    elif len(choices) != 1:
+        raise ValueError(f"Please give exactly one choice for a {bet_type.replace('_', ' ')} bet.")
+    elif bet_type in ("straight", "dozen", "column"):
+        if not choices[0].isdigit():
+            raise ValueError("Please enter a valid number.")
+        bet_details = {"type": bet_type, "number" if bet_type == "straight" else bet_type: int(choices[0])}
+    else:
+        bet_details = {"type": bet_type, bet_type: choices[0]}
+    wheel.winning_numbers(bet_details)
+    return bet_details
+
+
+ROULETTE_PHASES = ("idle", "betting", "settled")
+ROULETTE_RECORD = struct.Struct("<BbHI")  # Phase, result (-1 before the spin), payout vectors, bets
+ROULETTE_BET_TYPES = tuple(ROULETTE_PAYOUTS)
+
+
+class RouletteCore:
+    def __init__(self, rng=None):
+        """
+        Initialize the roulette rules: the wheel, the layout and settlement of a book of bets, with no terminal I/O.
+
+        A round is start_round(), any number of apply_action('bet', player, bet_details, amount), then
+        apply_action('spin'), which settles every bet. Each call returns (state, events).
+        """
+        self.rng = rng  # Random source; the shared one unless given, picked up on the first spin
+        self.red_numbers = {1, 3, 5, 7, 9, 12, 14, 16, 18, 19, 21, 23, 25, 27, 30, 32, 34, 36}
+        self.black_numbers = {2, 4, 6, 8, 10, 11, 13, 15, 17, 20, 22, 24, 26, 28, 29, 31, 33, 35}
+        self.payout_vectors = {}  # Bet key -> compiled payout vector
+        self.phase = "idle"  # 'betting' while bets are taken, 'settled' after the spin
+        self.book = None  # RouletteBetBook of the round in progress
+        self.result = None
+
+    def spin_wheel(self):
+        """
+        Simulate a spin of the roulette wheel.
+        """
+        if self.rng is None:
+            self.rng = get_random_source()
+        if _metrics:
+            _metrics.inc("spins_total", game="roulette")
+        return self.rng.randint(0, 36)
+
+    def winning_numbers(self, bet_details):
+        """
+        Return the set of numbers a bet wins on, raising ValueError for a bet that is not on the layout.
+        """
+        bet_type = bet_details["type"]
+        if bet_type == "straight":
+            if not 0 <= bet_details["number"] <= 36:
+                raise ValueError("Invalid number. Please choose a number between 0 and 36.")
+            return {bet_details["number"]}
+        elif bet_type in ROULETTE_GROUPS:
+            numbers = frozenset(bet_details["numbers"])
+            if numbers not in ROULETTE_GROUPS[bet_type]:
+                raise ValueError(f"Invalid {bet_type.replace('_', ' ')}. Those numbers are not adjacent on the layout.")
+            return set(numbers)
+        elif bet_type in ("dozen", "column"):
+            if bet_details[bet_type] not in (1, 2, 3):
+                raise ValueError("Invalid choice. Please choose 1, 2 or 3.")
+            if bet_type == "dozen":
+                return set(range(12 * bet_details["dozen"] - 11, 12 * bet_details["dozen"] + 1))
+            return set(range(bet_details["column"], 37, 3))
+        elif bet_type == "color":
+            if bet_details["color"] not in ("red", "black"):
+                raise ValueError("Invalid color. Please choose 'red' or 'black'.")
+            return self.red_numbers if bet_details["color"] == "red" else self.black_numbers
+        elif bet_type == "odd_even":
+            if bet_details["odd_even"] not in ("odd", "even"):
+                raise ValueError("Invalid choice. Please choose 'odd' or 'even'.")
+            return set(range(1 if bet_details["odd_even"] == "odd" else 2, 37, 2))
+        elif bet_type == "low_high":
+            if bet_details["low_high"] not in ("low", "high"):
+                raise ValueError("Invalid choice. Please choose 'low' or 'high'.")
+            return set(range(1, 19)) if bet_details["low_high"] == "low" else set(range(19, 37))
+        raise ValueError("Invalid bet type.")
+
+    def payout_vector(self, bet_details):
+        """
+        Return the 37-slot vector of net payouts per chip staked on a bet, indexed by the winning number.
+        """
+        key = tuple(sorted((name, tuple(value) if isinstance(value, list) else value)
+                           for name, value in bet_details.items()))
+        vector = self.payout_vectors.get(key)
+        if vector is None:
+            vector = np.full(37, -1, dtype=np.int64)
+            vector[list(self.winning_numbers(bet_details))] = ROULETTE_PAYOUTS[bet_details["type"]]
+            self.payout_vectors[key] = vector
+        return vector
+
+    def determine_payout(self, result, bet_details, bet_amount):
+        """
+        Determine the payout based on the result and the bet placed.
+        """
+        return int(self.payout_vector(bet_details)[result]) * bet_amount
+
+    def legal_actions(self):
+        """
+        Return the actions open now.
+        """
+        return ("bet", "spin") if self.phase == "betting" else ()
+
+    def state(self):
+        """
+        Return the round as a dict.
+        """
+        return {"phase": self.phase, "bets": len(self.book.stakes) if self.book else 0, "result": self.result,
+                "actions": self.legal_actions()}
+
+    def start_round(self):
+        """
+        Open a fresh book of bets for the next spin.
+        """
+        self.book = RouletteBetBook(self)
+        self.phase = "betting"
+        self.result = None
+        return self.state(), [{"event": "open"}]
+
+    def apply_action(self, action, player=None, bet_details=None, amount=0):
+        """
+        Apply 'bet', adding a player's bet to the book, or 'spin', which settles every bet in the book.
+        """
+        if self.phase != "betting":
+            raise ValueError("Betting is closed; start a new round.")
+        if action == "bet":
+            if amount <= 0:
+                raise ValueError("Invalid bet amount.")
+            self.book.add(player, bet_details, amount)
+            return self.state(), [{"event": "bet", "player": player, "bet": bet_details, "amount": amount}]
+        if action == "spin":
+            self.result = self.spin_wheel()
+            started = time.perf_counter() if _metrics else 0.0
+            staked = self.book.player_stakes()
+            payouts = self.book.settle_players(self.result)
+            events = [{"event": "result", "number": self.result}]
+            events += [{"event": "settle", "player": player, "payout": int(payouts[player]),
+                        "returned": int(staked[number] + payouts[player])}
+                       for player, number in self.book.players.items()]
+            if _metrics:
+                _metrics.observe("payout_seconds", time.perf_counter() - started, game="roulette")
+            self.phase = "settled"
+            return self.state(), events
+        raise ValueError(f"Unknown action {action}.")
+
+    def snapshot(self):
+        """
+        Return the round as a binary record: the book's payout vectors, players and bets, and the result.
+
+        Payout vectors fit in int8, with a byte for each one's bet type, and bet rows and player numbers fit
+        in uint16, so each bet takes 12 bytes.
+        """
+        book = self.book
+        if book is None:
+            return SNAPSHOT_HEADERS["roulette"] + ROULETTE_RECORD.pack(0, -1, 0, 0)
+        numbers = array('H', book.players.values())
+        return b"".join((SNAPSHOT_HEADERS["roulette"],
+                         ROULETTE_RECORD.pack(ROULETTE_PHASES.index(self.phase),
+                                              -1 if self.result is None else self.result,
+                                              len(book.vectors), len(book.stakes)),
+                         np.array(book.vectors, dtype=np.int8).tobytes(),
+                         bytes(ROULETTE_BET_TYPES.index(bet_type) for bet_type in book.bet_types),
+                         pack_names(book.players), numbers.tobytes(),
+                         np.frombuffer(book.player_numbers, dtype=np.int64).astype(np.uint16).tobytes(),
+                         np.frombuffer(book.bet_rows, dtype=np.int64).astype(np.uint16).tobytes(),
+                         book.stakes.tobytes()))
+
+    def restore(self, data, players=None):
+        """
+        Load a record written by snapshot() and return the wheel, finding each bettor by name in players.
+        """
+        offset = read_snapshot_header(data, "roulette")
+        phase, result, vectors, bets = ROULETTE_RECORD.unpack_from(data, offset)
+        offset += ROULETTE_RECORD.size
+        self.phase = ROULETTE_PHASES[phase]
+        self.result = None if result < 0 else result
+        if self.phase == "idle":
+            self.book = None
+            return self
+        book = self.book = RouletteBetBook(self)
+        book.vectors = list(np.frombuffer(data, np.int8, 37 * vectors, offset).astype(np.int64).reshape(-1, 37))
+        book.bet_ids = {vector.tobytes(): bet_id for bet_id, vector in enumerate(book.vectors)}
+        offset += 37 * vectors
+        book.bet_types = [ROULETTE_BET_TYPES[bet_type] for bet_type in data[offset:offset + vectors]]
+        bettors, offset = unpack_names(data, offset + vectors, players)
+        numbers = np.frombuffer(data, np.uint16, len(bettors), offset)
+        book.players = dict(zip(bettors, numbers.tolist()))
+        offset += 2 * len(bettors)
+        book.player_numbers = array('q', np.frombuffer(data, np.uint16, bets, offset).astype(np.int64).tobytes())
+        book.bet_rows = array('q', np.frombuffer(data, np.uint16, bets, offset + 2 * bets).astype(np.int64).tobytes())
+        book.stakes = array('d', np.frombuffer(data, np.float64, bets, offset + 4 * bets).tobytes())
+        return self
+
+
+class RouletteGame(RouletteCore):
+    def __init__(self, ledger=None, account="player", rng=None):
+        """
+        Initialize the terminal Roulette game over the rules core, with the player's ledger account.
+        """
+        super().__init__(rng)
+        self.ledger = ledger  # Opened in play() so headless spins never touch the ledger
+        self.account = account
+
+    @property
+    def chips(self):
+        """
+        The player's current balance in the ledger.
+        """
+        return self.ledger.balance(self.account)
+
+    def place_bet(self, available=None):
+        """
+        Allow the player to place a bet and validate the amount against the chips still available.
+        """
+        available = self.chips if available is None else available
+        while True:
+            print(f"You have {available} chips.")
+            try:
+                bet = int(input("Place your bet amount: "))
+                if bet > available or bet <= 0:
+                    print("Invalid bet amount. Try again.")
+                else:
+                    return bet
+            except ValueError:
+                print("Please enter a valid number.")
+
+    def get_bet_details(self, choice):
+        """
+        Ask for the details of the selected bet type until they describe a bet on the layout.
+        """
+        bet_type, prompt = BET_DETAIL_PROMPTS[choice]
+        while True:
+            words = input(prompt).lower().split()
+            if not words:
+                print("Please enter your choice.")
+                continue
+            try:
+                return parse_roulette_bet([bet_type, *words], self)
+            except ValueError as error:
+                print(error)
+
+    def play(self):
+        """
+        Play the Roulette game, allowing the player to place and resolve bets.
+        """
+        print("Welcome to the Roulette Game!")
+        self.ledger = self.ledger or get_chip_ledger()
+        self.ledger.open_account(self.account, 1000)  # Starting chips for a new or broke player
+        while self.chips > 0:
+            if _risk and _risk.session_limit_reached(self.account):
+                print("You have reached your session loss limit. Game over.")
+                break
+            started = time.perf_counter()
+            self.start_round()
+            while True:
+                bet_amount = self.place_bet()
+                bet_details = self.get_bet_details(choose_bet_type())
+                if _risk and _risk.place_bet(self.account, "roulette", bet_amount, self.payout_vector(bet_details)):
+                    print(_risk.breaches[-1]["message"])
+                else:
+                    self.apply_action("bet", self.account, bet_details, bet_amount)
+                    self.ledger.bet(self.account, "roulette", bet_amount)
+                if self.book.stakes and (self.chips <= 0 or input("Add another bet? (yes/no): ").lower() != 'yes'):
+                    break
+            state, events = self.apply_action("spin")
+            print(f"\nThe ball landed on: {state['result']}")
+
+            payout = events[-1]["payout"]
+            if payout > 0:
+                print(f"Congratulations! You won {payout} chips!")
+            else:
+                print("Sorry, you lost." if payout < 0 else "You broke even.")
+            self.ledger.pay(self.account, "roulette", events[-1]["returned"])
+            if _risk:
+                _risk.settle(self.account, events[-1]["returned"] - payout, events[-1]["returned"])
+                _risk.clear_exposure("roulette")
+            if _history:
+                _history.record_book("roulette", self.book, state["result"])
+            if _metrics:
+                _metrics.observe("round_seconds", time.perf_counter() - started, game="roulette")
+
+            print(f"You have {self.chips} chips remaining.")
+            if self.chips <= 0:
+                print("You're out of chips! Game over.")
+                break
+            else:
+                play_again = input("Do you want to play another round? (yes/no): ").lower()
+                if play_again != 'yes':
+                    print(f"You left the game with {self.chips} chips. Goodbye!")
+                    break
+
+
+class RouletteBetBook:
+    def __init__(self, game=None):
+        """
+        Initialize an empty book of bets for one spin, settled together with NumPy.
+        """
+        self.game = game or RouletteCore()
+        self.bet_ids = {}  # Bet key -> row of the compiled payout matrix
+        self.vectors = []  # Distinct payout vectors, one per bet id
+        self.bet_types = []  # Bet type of each bet id, e.g. 'straight'
+        self.players = {}  # Player -> player number
+        self.player_numbers = array('q')
+        self.bet_rows = array('q')
+        self.stakes = array('d')
+        self.matrix = np.zeros((0, 37), dtype=np.int64)
+
+    def bet_id(self, bet_details):
+        """
+        Return the id of a bet's compiled payout vector, compiling it the first time the bet is seen.
+        """
+        vector = self.game.payout_vector(bet_details)
+        key = vector.tobytes()
+        if key not in self.bet_ids:
+            self.bet_ids[key] = len(self.vectors)
+            self.vectors.append(vector)
+            self.bet_types.append(bet_details["type"])
+        return self.bet_ids[key]
+
+    def add(self, player, bet_details, amount):
+        """
+        Add one bet by a player to the book.
+        """
+        self.add_batch([self.players.setdefault(player, len(self.players))], [self.bet_id(bet_details)], [amount])
+
+    def add_batch(self, player_numbers, bet_ids, amounts):
+        """
+        Add many bets at once from parallel sequences of player numbers, bet ids and amounts.
+        """
+        self.player_numbers.extend(player_numbers)
+        self.bet_rows.extend(bet_ids)
+        self.stakes.extend(amounts)
+
+    def compiled(self):
+        """
+        Return the payout matrix, one row per bet id, rebuilding it when new bet types were added.
+        """
+        if len(self.matrix) != len(self.vectors):
+            self.matrix = np.array(self.vectors, dtype=np.int64).reshape(-1, 37)
+        return self.matrix
+
+    def settle(self, result):
+        """
+        Return the net payout of every bet in the book for a winning number.
+        """
+        column = self.compiled()[:, result].astype(float)
+        return column[np.frombuffer(self.bet_rows, dtype=np.int64)] * np.frombuffer(self.stakes)
+
+    def settle_players(self, result):
+        """
+        Return each player's total net payout for a winning number as a dict.
+        """
+        totals = np.bincount(np.frombuffer(self.player_numbers, dtype=np.int64), weights=self.settle(result),
+                             minlength=len(self.players))
+        return {player: totals[number] for player, number in self.players.items()}
+
+    def player_stakes(self):
+        """
+        Return the total staked by each player number.
+        """
+        return np.bincount(np.frombuffer(self.player_numbers, dtype=np.int64), weights=np.frombuffer(self.stakes),
+                           minlength=len(self.players))
+
+    def remove_player(self, player):
+        """
+        Remove every bet a player has in the book and return the total they had staked.
+
+        Later players are renumbered down by one, so player numbers stay 0..len(players) - 1 and a player
+        added afterwards never shares a number with one still in the book.
+        """
+        number = self.players.pop(player, None)
+        if number is None:
+            return 0
+        staked = self.player_stakes()[number]
+        numbers = np.frombuffer(self.player_numbers, dtype=np.int64)
+        keep = numbers != number
+        numbers = numbers[keep]
+        self.player_numbers = array('q', (numbers - (numbers > number)).tobytes())
+        self.players = {bettor: bettor_number - (bettor_number > number)
+                        for bettor, bettor_number in self.players.items()}
+        self.bet_rows = array('q', np.frombuffer(self.bet_rows, dtype=np.int64)[keep].tobytes())
+        self.stakes = array('d', np.frombuffer(self.stakes)[keep].tobytes())
+        return staked
+
+    def exposure(self):
+        """
+        Return the table's total net payout to players for each of the 37 possible results.
+        """
+        staked = np.bincount(np.frombuffer(self.bet_rows, dtype=np.int64), weights=np.frombuffer(self.stakes),
+                             minlength=len(self.vectors))
+        return staked @ self.compiled()
+
+
+# ------------------ Texas Hold'em Poker Game ------------------
+
+HAND_CATEGORIES = ["High Card", "One Pair", "Two Pair", "Three of a Kind", "Straight",
+                   "Flush", "Full House", "Four of a Kind", "Straight Flush"]
+RANK_PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41]
+# Per-rank keys whose sums are unique over every 7-card rank multiset, giving a perfect hash
+RANK_KEYS = [0, 1, 5, 22, 98, 453, 2031, 8698, 22854, 83661, 262349, 636345, 1479181]
+SUIT_KEYS = [0, 1, 8, 57]  # Seven card suit key sums identify the flush suit, if any
+SUIT_KEY_BITS = 9  # Suit key sums stay below 512, so each card packs both keys into one integer
+
+
+def five_card_strength(ranks, flush):
+    """
+    Return a (category, tiebreak ranks) key for five card ranks, ordered so a stronger hand sorts higher.
+    """
+    counts = Counter(ranks)
+    ordered = sorted(counts, key=lambda rank: (counts[rank], rank), reverse=True)
+    shape = sorted(counts.values(), reverse=True)
+    if len(counts) == 5:
+        straight_high = None
+        if ordered[0] - ordered[4] == 4:
+            straight_high = ordered[0]
+        elif ordered == [12, 3, 2, 1, 0]:
+            straight_high = 3  # The wheel (A-2-3-4-5) plays as five-high
+        if straight_high is not None:
+            return (8 if flush else 4, (straight_high,))
+        return (5 if flush else 0, tuple(ordered))
+    category = {(4, 1): 7, (3, 2): 6, (3, 1, 1): 3, (2, 2, 1): 2, (2, 1, 1, 1): 1}[tuple(shape)]
+    return (category, tuple(ordered))
+
+
+class HandEvaluator:
+    def __init__(self):
+        """
+        Build the lookup tables. Hand values run from 1 (seven-high) to 7462 (royal flush).
+        """
+        self.card_codes = [(RANK_KEYS[card >> 2] << SUIT_KEY_BITS) | SUIT_KEYS[card & 3] for card in range(52)]
+        self.card_code_array = np.array(self.card_codes, dtype=np.int64)
+        self.card_suits = np.arange(52) & 3
+        self.card_bits = 1 << (np.arange(52) >> 2)
+
+        # Every distinct five card hand class, weakest first
+        classes = []
+        for ranks in combinations_with_replacement(range(13), 5):
+            if max(Counter(ranks).values()) <= 4:
+                classes.append((five_card_strength(ranks, False), ranks, False))
+                if len(set(ranks)) == 5:
+                    classes.append((five_card_strength(ranks, True), ranks, True))
+        classes.sort()
+        self.categories = np.zeros(len(classes) + 1, dtype=np.uint8)
+        self.flush5 = np.zeros(1 << 13, dtype=np.uint16)  # Rank bitmask -> value, for five suited cards
+        self.products5 = {}  # Prime product of ranks -> value, for unsuited five card hands
+        for value, (strength, ranks, flush) in enumerate(classes, start=1):
+            self.categories[value] = strength[0]
+            if flush:
+                self.flush5[sum(1 << rank for rank in ranks)] = value
+            else:
+                self.products5[int(np.prod([RANK_PRIMES[rank] for rank in ranks]))] = value
+
+        # Seven cards holding a flush can never make quads or a full house, so the best flush always plays
+        self.flush7 = np.zeros(1 << 13, dtype=np.uint16)
+        for size in (5, 6, 7):
+            for ranks in combinations(range(13), size):
+                self.flush7[sum(1 << rank for rank in ranks)] = max(
+                    self.flush5[sum(1 << rank for rank in five)] for five in combinations(ranks, 5))
+
+        # Unsuited seven card hands: best five of seven for every rank multiset, indexed by the rank key sum
+        multisets = np.array([ranks for ranks in combinations_with_replacement(range(13), 7)
+                              if max(Counter(ranks).values()) <= 4])
+        subsets = multisets[:, list(combinations(range(7), 5))]  # (hands, 21, 5)
+        products = np.array(RANK_PRIMES, dtype=np.int64)[subsets].prod(axis=2)
+        product_keys = np.array(sorted(self.products5))
+        product_values = np.array([self.products5[key] for key in product_keys], dtype=np.uint16)
+        found = np.searchsorted(product_keys, np.minimum(products, product_keys[-1]))
+        values = np.where(product_keys[found] == products, product_values[found], 0).max(axis=1)
+        rank_sums = np.array(RANK_KEYS, dtype=np.int64)[multisets].sum(axis=1)
+        self.unsuited7 = np.zeros(rank_sums.max() + 1, dtype=np.uint16)
+        self.unsuited7[rank_sums] = values
+
+        # Suit key sum -> flush suit (-1 for none) for every way seven cards can split across suits
+        self.flush_suits = np.full(1 << SUIT_KEY_BITS, -1, dtype=np.int8)
+        for split in combinations_with_replacement(range(4), 7):
+            counts = Counter(split)
+            flush_suit = max(counts, key=counts.get)
+            if counts[flush_suit] >= 5:
+                self.flush_suits[sum(SUIT_KEYS[suit] for suit in split)] = flush_suit
+        self.flush_suit_list = self.flush_suits.tolist()
+        self.unsuited7_list = self.unsuited7.tolist()
+
+    def evaluate5(self, cards):
+        """
+        Return the value of exactly five integer cards.
+        """
+        if len({card & 3 for card in cards}) == 1:
+            return int(self.flush5[sum(1 << (card >> 2) for card in cards)])
+        product = 1
+        for card in cards:
+            product *= RANK_PRIMES[card >> 2]
+        return self.products5[product]
+
+    def evaluate(self, cards):
+        """
+        Return the value of the best five card hand within five to seven integer cards.
+        """
+        if len(cards) != 7:
+            return max(self.evaluate5(five) for five in combinations(cards, 5))
+        code = 0
+        for card in cards:
+            code += self.card_codes[card]
+        flush_suit = self.flush_suit_list[code & ((1 << SUIT_KEY_BITS) - 1)]
+        if flush_suit >= 0:
+            return int(self.flush7[sum(1 << (card >> 2) for card in cards if card & 3 == flush_suit)])
+        return self.unsuited7_list[code >> SUIT_KEY_BITS]
+
+    def evaluate_batch(self, hands):
+        """
+        Return the values of many seven card hands given as an (n, 7) integer array.
+        """
+        hands = np.asarray(hands)
+        codes = self.card_code_array[hands[:, 0]]
+        for column in range(1, 7):
+            codes += self.card_code_array[hands[:, column]]
+        values = self.unsuited7[codes >> SUIT_KEY_BITS]
+        flush_suits = self.flush_suits[codes & ((1 << SUIT_KEY_BITS) - 1)]
+        flushed = np.flatnonzero(flush_suits >= 0)
+        if len(flushed):
+            flush_hands = hands[flushed]
+            in_suit = self.card_suits[flush_hands] == flush_suits[flushed, None]
+            masks = np.where(in_suit, self.card_bits[flush_hands], 0).sum(axis=1)
+            values[flushed] = self.flush7[masks]
+        return values
+
+    def category(self, value):
+        """
+        Return the name of the hand category for a hand value.
+        """
+        return HAND_CATEGORIES[self.categories[value]]
+
+
+_hand_evaluator = None
+
+
+def get_hand_evaluator():
+    """
+    Return the shared HandEvaluator, building its tables on first use.
+    """
+    global _hand_evaluator
+    if _hand_evaluator is None:
+        _hand_evaluator = HandEvaluator()
+    return _hand_evaluator
+
+
+HOLDEM_STREETS = ["preflop", "flop", "turn", "river"]
+BOARD_CARDS = [0, 3, 1, 1]  # Community cards dealt on reaching each street
+
+
+class HoldemHand:
+    def __init__(self, stacks, button=0, small_blind=5, big_blind=10, deck=None):
+        """
+        Start one hand of no-limit hold'em: post the blinds, deal hole cards and wait for the first action.
+
+        Per-seat state lives in flat arrays indexed by seat so bots and simulators can drive millions of
+        hands. Seats with an empty stack sit the hand out; if the button is one of them, it moves to the next
+        seat with chips.
+        """
+        seats = len(stacks)
+        if not 2 <= seats <= 10:
+            raise ValueError("Hold'em needs 2 to 10 seats.")
+        self.seats = seats
+        self.button = button
+        self.big_blind = big_blind
+        self.deck = deck or LocalShoe(deck_count=1, penetration=1.0)
+        self.deck.shuffle()
+        self.stacks = array('q', stacks)  # Chips behind for each seat
+        self.committed = array('q', bytes(8 * seats))  # Chips each seat has put in the pot this hand
+        self.street_bets = array('q', bytes(8 * seats))  # Chips each seat has put in on this street
+        self.acted_at = array('q', [-1]) * seats  # Bet level each seat last acted at this street, -1 if not yet
+        self.folded = bytearray(stack <= 0 for stack in stacks)
+        if seats - sum(self.folded) < 2:
+            raise ValueError("At least two seats need chips to play a hand.")
+        self.button = button if not self.folded[button] else self.next_seat(button)
+        self.hole_cards = array('B', self.deck.draw(2 * seats))  # Seat i holds cards 2i and 2i + 1
+        self.board = []
+        self.street = 0
+        self.current_bet = 0  # Highest street bet so far
+        self.min_raise = big_blind  # Size of the last full raise
+        self.payouts = None  # Chips each seat collects, set when the hand is over
+        self.values = {}  # Seat -> hand value at showdown
+
+        # Heads-up the button posts the small blind and acts first before the flop
+        small = self.button if self.live_count() == 2 else self.next_seat(self.button)
+        big = self.next_seat(small)
+        self.post(small, small_blind)
+        self.post(big, big_blind)
+        self.current_bet = max(self.street_bets)
+        self.to_act = big
+        self.advance()
+
+    @property
+    def finished(self):
+        """
+        True once the pot has been awarded.
+        """
+        return self.payouts is not None
+
+    @property
+    def pot(self):
+        """
+        Total chips in the pot.
+        """
+        return sum(self.committed)
+
+    def hole(self, seat):
+        """
+        Return a seat's two hole cards.
+        """
+        return self.hole_cards[2 * seat:2 * seat + 2].tolist()
+
+    def live_count(self):
+        """
+        Number of seats that have not folded.
+        """
+        return self.seats - sum(self.folded)
+
+    def next_seat(self, seat):
+        """
+        Return the next seat clockwise that has not folded.
+        """
+        seat = (seat + 1) % self.seats
+        while self.folded[seat]:
+            seat = (seat + 1) % self.seats
+        return seat
+
+    def post(self, seat, amount):
+        """
+        Move up to amount chips from a seat's stack into the pot.
+        """
+        amount = min(amount, self.stacks[seat])
+        self.stacks[seat] -= amount
+        self.street_bets[seat] += amount
+        self.committed[seat] += amount
+
+    def needs_action(self, seat):
+        """
+        True if a seat can act and has not yet acted on or matched the current bet.
+        """
+        return (not self.folded[seat] and self.stacks[seat] > 0 and
+                (self.acted_at[seat] < 0 or self.street_bets[seat] < self.current_bet))
+
+    def raise_range(self, seat):
+        """
+        Return the smallest and largest total street bet the seat may raise to, or None if it may not raise.
+
+        An all-in raise smaller than a full raise does not reopen the betting for seats that have already acted.
+        """
+        most = self.street_bets[seat] + self.stacks[seat]
+        if most <= self.current_bet:
+            return None
+        if self.acted_at[seat] >= 0 and self.current_bet - self.acted_at[seat] < self.min_raise:
+            return None
+        if not any(self.stacks[other] > 0 and not self.folded[other] for other in range(self.seats) if other != seat):
+            return None  # Nobody is left to call a raise
+        return min(self.current_bet + self.min_raise, most), most
+
+    def legal_actions(self):
+        """
+        Return the actions open to the seat to act, e.g. {'fold': 0, 'call': 20, 'raise': (40, 990)}.
+        """
+        seat = self.to_act
+        owed = self.current_bet - self.street_bets[seat]
+        actions = {"fold": 0, "call": min(owed, self.stacks[seat])} if owed else {"check": 0}
+        limits = self.raise_range(seat)
+        if limits:
+            actions["raise" if self.current_bet else "bet"] = limits
+        return actions
+
+    def act(self, action, amount=0):
+        """
+        Apply the seat to act's fold, check, call, bet or raise; amount is the total street bet to raise to.
+        """
+        if self.finished:
+            raise ValueError("The hand is over.")
+        seat = self.to_act
+        owed = self.current_bet - self.street_bets[seat]
+        if action == "fold":
+            self.folded[seat] = 1
+        elif action == "check":
+            if owed:
+                raise ValueError("You cannot check facing a bet.")
+        elif action == "call":
+            if not owed:
+                raise ValueError("There is nothing to call.")
+            self.post(seat, owed)
+        elif action in ("bet", "raise"):
+            limits = self.raise_range(seat)
+            if limits is None:
+                raise ValueError("You cannot raise here.")
+            if not limits[0] <= amount <= limits[1]:
+                raise ValueError(f"Raise to between {limits[0]} and {limits[1]}.")
+            if amount - self.current_bet >= self.min_raise:
+                self.min_raise = amount - self.current_bet  # Only a full raise resets the minimum
+            self.current_bet = amount
+            self.post(seat, amount - self.street_bets[seat])
+        else:
+            raise ValueError(f"Unknown action {action}.")
+        self.acted_at[seat] = self.current_bet
+        self.advance()
+
+    def advance(self):
+        """
+        Pass the action to the next seat, or deal the next street, or award the pot when the hand is over.
+        """
+        if self.live_count() == 1:
+            self.award_uncontested()
+            return
+        seat = self.to_act
+        for _ in range(self.seats):
+            seat = (seat + 1) % self.seats
+            if self.needs_action(seat):
+                self.to_act = seat
+                return
+        while self.street < 3:
+            self.street += 1
+            self.board += self.deck.draw(BOARD_CARDS[self.street])
+            for seat in range(self.seats):
+                self.street_bets[seat] = 0
+                self.acted_at[seat] = -1
+            self.current_bet = 0
+            self.min_raise = self.big_blind
+            if sum(1 for seat in range(self.seats) if not self.folded[seat] and self.stacks[seat] > 0) >= 2:
+                self.to_act = self.next_seat(self.button)
+                if not self.needs_action(self.to_act):
+                    self.advance()
+                return
+        self.showdown()
+
+    def award_uncontested(self):
+        """
+        Give the whole pot to the last seat that has not folded.
+        """
+        winner = self.folded.index(0)
+        self.payouts = array('q', bytes(8 * self.seats))
+        self.payouts[winner] = self.pot
+        self.stacks[winner] += self.pot
+        self.to_act = None
+
+    def side_pots(self):
+        """
+        Return the main pot and side pots as (amount, eligible seats), smallest all-in level first.
+        """
+        levels = sorted({self.committed[seat] for seat in range(self.seats) if not self.folded[seat]})
+        pots = []
+        previous = 0
+        for level in levels:
+            amount = sum(min(chips, level) - min(chips, previous) for chips in self.committed)
+            eligible = [seat for seat in range(self.seats) if not self.folded[seat] and self.committed[seat] >= level]
+            pots.append((amount, eligible))
+            previous = level
+        # Chips folded above the highest live commitment go to the last pot
+        amount, eligible = pots[-1]
+        pots[-1] = (amount + self.pot - sum(amount for amount, _ in pots), eligible)
+        return pots
+
+    def showdown(self):
+        """
+        Evaluate every live hand and split each pot between its best eligible hands.
+
+        Odd chips from a split go to the winners nearest the button's left.
+        """
+        started = time.perf_counter() if _metrics else 0.0
+        evaluator = get_hand_evaluator()
+        self.values = {seat: evaluator.evaluate(self.hole(seat) + self.board)
+                       for seat in range(self.seats) if not self.folded[seat]}
+        self.payouts = array('q', bytes(8 * self.seats))
+        for amount, eligible in self.side_pots():
+            best = max(self.values[seat] for seat in eligible)
+            winners = sorted((seat for seat in eligible if self.values[seat] == best),
+                             key=lambda seat: (seat - self.button - 1) % self.seats)
+            share, odd = divmod(amount, len(winners))
+            for index, seat in enumerate(winners):
+                self.payouts[seat] += share + (index < odd)
+        for seat in range(self.seats):
+            self.stacks[seat] += self.payouts[seat]
+        self.to_act = None
+        if _metrics:
+            _metrics.observe("payout_seconds", time.perf_counter() - started, game="holdem")
+
+
+HOLDEM_RECORD = struct.Struct("<qqB")  # Small blind, big blind, whether a hand follows
+# Seats, button, big blind, street, current bet, minimum raise, seat to act (-1 for none), finished and the
+# numbers of board cards and showdown values; the per-seat arrays, hole cards, board and values follow
+HOLDEM_HAND_RECORD = struct.Struct("<BBqBqqbBBB")
+
+
+class HoldemCore:
+    def __init__(self, deck=None, small_blind=5, big_blind=10):
+        """
+        Initialize the no-limit hold'em rules around HoldemHand, reporting each hand as events, with no terminal I/O.
+
+        A hand is start_round(stacks, button), then apply_action(action, amount) for the seat to act
+        until the phase is 'settled'; both return (state, events).
+        """
+        self.deck = deck or LocalShoe(deck_count=1, penetration=1.0)  # Single deck, shuffled every hand
+        self.small_blind = small_blind
+        self.big_blind = big_blind
+        self.hand = None  # HoldemHand in progress
+
+    @property
+    def phase(self):
+        """
+        'betting' while the hand is played, 'settled' once the pot is awarded.
+        """
+        if self.hand is None:
+            return "idle"
+        return "settled" if self.hand.finished else "betting"
+
+    def legal_actions(self):
+        """
+        Return the legal actions of the seat to act, as HoldemHand.legal_actions() does.
+        """
+        return self.hand.legal_actions() if self.phase == "betting" else {}
+
+    def state(self):
+        """
+        Return the hand as a dict; hole cards are left out, since each seat may only see its own.
+        """
+        hand = self.hand
+        return {"phase": self.phase, "street": HOLDEM_STREETS[hand.street], "board": list(hand.board),
+                "pot": hand.pot, "stacks": hand.stacks.tolist(), "to_act": hand.to_act,
+                "actions": self.legal_actions(), "payouts": hand.payouts.tolist() if hand.finished else None}
+
+    def start_round(self, stacks, button=0):
+        """
+        Post the blinds and deal a hand between seats with the given stacks.
+        """
+        if self.phase == "betting":
+            raise ValueError("Finish the current hand first.")
+        self.hand = HoldemHand(stacks, button, self.small_blind, self.big_blind, self.deck)
+        events = [{"event": "deal", "button": button, "small_blind": self.small_blind, "big_blind": self.big_blind}]
+        return self.state(), events + self.progress(0)
+
+    def apply_action(self, action, amount=0):
+        """
+        Apply an action for the seat to act, raising ValueError if it is not legal.
+        """
+        hand = self.hand
+        if self.phase != "betting":
+            raise ValueError("There is no hand in progress.")
+        seat = hand.to_act
+        street = hand.street
+        street_bet, committed = hand.street_bets[seat], hand.committed[seat]
+        hand.act(action, amount)
+        events = [{"event": "action", "seat": seat, "action": action,
+                   "to": street_bet + hand.committed[seat] - committed}]
+        return self.state(), events + self.progress(street)
+
+    def progress(self, street):
+        """
+        Return events for the streets dealt after street and, once the hand is over, its result.
+        """
+        hand = self.hand
+        events = [{"event": "street", "street": HOLDEM_STREETS[dealt], "board": hand.board[:2 + dealt]}
+                  for dealt in range(street + 1, hand.street + 1)]
+        if hand.finished:
+            if hand.values:
+                events.append({"event": "showdown", "values": dict(hand.values)})
+            events.append({"event": "settle", "committed": hand.committed.tolist(), "payouts": hand.payouts.tolist()})
+        return events
+
+    def snapshot(self, include_deck=True):
+        """
+        Return the blinds and the hand in progress as a binary record, followed by the deck's unless
+        include_deck is False.
+        """
+        hand = self.hand
+        parts = [SNAPSHOT_HEADERS["holdem"], HOLDEM_RECORD.pack(self.small_blind, self.big_blind, hand is not None)]
+        if hand is not None:
+            parts += [HOLDEM_HAND_RECORD.pack(hand.seats, hand.button, hand.big_blind, hand.street, hand.current_bet,
+                                              hand.min_raise, -1 if hand.to_act is None else hand.to_act,
+                                              hand.finished, len(hand.board), len(hand.values)),
+                      hand.stacks.tobytes(), hand.committed.tobytes(), hand.street_bets.tobytes(),
+                      hand.acted_at.tobytes(), hand.payouts.tobytes() if hand.finished else b"",
+                      bytes(hand.folded), hand.hole_cards.tobytes(), bytes(hand.board),
+                      bytes(hand.values), array('I', hand.values.values()).tobytes()]
+        if include_deck:
+            parts.append(self.deck.snapshot())
+        return b"".join(parts)
+
+    def restore(self, data):
+        """
+        Load a record written by snapshot() and return the game, restoring the deck too if the record has it.
+        """
+        offset = read_snapshot_header(data, "holdem")
+        self.small_blind, self.big_blind, has_hand = HOLDEM_RECORD.unpack_from(data, offset)
+        offset += HOLDEM_RECORD.size
+        self.hand = None
+        if has_hand:
+            hand = self.hand = HoldemHand.__new__(HoldemHand)  # Skip __init__, which would post blinds and deal
+            (hand.seats, hand.button, hand.big_blind, hand.street, hand.current_bet, hand.min_raise, to_act,
+             finished, board, values) = HOLDEM_HAND_RECORD.unpack_from(data, offset)
+            offset += HOLDEM_HAND_RECORD.size
+            hand.deck = self.deck
+            hand.to_act = None if to_act < 0 else to_act
+            seats = hand.seats
+            arrays = []
+            for _ in range(5 if finished else 4):
+                arrays.append(array('q', data[offset:offset + 8 * seats]))
+                offset += 8 * seats
+            hand.stacks, hand.committed, hand.street_bets, hand.acted_at = arrays[:4]
+            hand.payouts = arrays[4] if finished else None
+            hand.folded = bytearray(data[offset:offset + seats])
+            hand.hole_cards = array('B', data[offset + seats:offset + 3 * seats])
+            offset += 3 * seats
+            hand.board = list(data[offset:offset + board])
+            offset += board
+            value_seats = data[offset:offset + values]
+            hand.values = dict(zip(value_seats, array('I', data[offset + values:offset + 5 * values])))
+            offset += 5 * values
+        if offset < len(data):
+            self.deck.restore(data[offset:])
+        return self
+
+
+class TexasHoldemPoker(HoldemCore):
+    def __init__(self, deck=None, ledger=None, seats=2, small_blind=5, big_blind=10, bots=None):
+        """
+        Initialize a terminal no-limit Texas Hold'em table for 2 to 10 players sharing one screen.
+
+        bots maps seats to a HOLDEM_BOTS name or a callable bot(hand, rng) -> (action, amount) that
+        plays the seat instead of prompting.
+        """
+        super().__init__(deck, small_blind, big_blind)
+        self.bots = {seat: HOLDEM_BOTS.get(bot, bot) for seat, bot in (bots or {}).items()}
+        self.players = [f"Bot {seat + 1}" if seat in self.bots else f"Player {seat + 1}"
+                        for seat in range(seats)]  # Each name is also a ledger account
+        self.button = 0
+        self.ledger = ledger  # Opened in play()
+
+    def display_cards(self, showdown=False):
+        """
+        Display the players' hands and community cards; bots keep their cards hidden until the showdown.
+        """
+        for seat, player in enumerate(self.players):
+            if not self.hand.folded[seat] and (showdown or seat not in self.bots):
+                print(f"{player} hand: {', '.join([card_name(card) for card in self.hand.hole(seat)])}")
+        print(f"Community cards: {', '.join([card_name(card) for card in self.hand.board])}")
+
+    def show_events(self, events):
+        """
+        Print what happened in the hand.
+        """
+        for event in events:
+            kind = event["event"]
+            if kind == "deal":
+                print(f"\n{self.players[event['button']]} has the button. "
+                      f"Blinds are {event['small_blind']}/{event['big_blind']}.")
+                print("Dealing hole cards...")
+                self.display_cards()
+                print(f"\n{HOLDEM_STREETS[0].capitalize()} betting round:")
+            elif kind == "action":
+                action = event["action"]
+                print(f"{self.players[event['seat']]} {action}s"
+                      f"{' to ' + str(event['to']) if action in ('bet', 'raise') else ''}.")
+            elif kind == "street":
+                print(f"\nDealing the {event['street'].capitalize()}...")
+                self.display_cards()
+            elif kind == "settle":
+                self.show_result()
+
+    def player_action(self):
+        """
+        Ask the player to act until they choose a legal action, then apply it; a bot seat decides for itself.
+        """
+        hand = self.hand
+        seat = hand.to_act
+        player = self.players[seat]
+        if seat in self.bots:
+            print()
+            self.show_events(self.apply_action(*self.bots[seat](hand, get_random_source()))[1])
+            return
+        actions = self.legal_actions()
+        print(f"\n{player}'s turn. You have {hand.stacks[seat]} chips; the pot is {hand.pot}.")
+        choices = ", ".join(f"'{action}'" for action in actions)
+        while True:
+            action = input(f"Do you want to {choices}, or see your 'equity'? ").lower()
+            if action == "equity":
+                result = holdem_equity(hand.hole(seat), hand.board, hand.live_count() - 1)
+                print(f"{player}'s equity: {result['equity'] * 100:.1f}% ({result['method']}).")
+                continue
+            if action not in actions:
+                print(f"Invalid action. Please choose {choices} or 'equity'.")
+                continue
+            amount = 0
+            if action in ("bet", "raise"):
+                low, high = actions[action]
+                try:
+                    amount = int(input(f"Enter the total to {action} to ({low}-{high}): "))
+                except ValueError:
+                    print("Please enter a valid number.")
+                    continue
+            try:
+                _, events = self.apply_action(action, amount)
+            except ValueError as error:
+                print(error)
+                continue
+            self.show_events(events)
+            return
+
+    def show_result(self):
+        """
+        Print the showdown and what each player collects.
+        """
+        hand = self.hand
+        evaluator = get_hand_evaluator()
+        if hand.values:
+            print("\nComparing hands...")
+            self.display_cards(showdown=True)
+            for seat, value in hand.values.items():
+                print(f"{self.players[seat]} has {evaluator.category(value)}.")
+            pots = [(amount, eligible) for amount, eligible in hand.side_pots() if len(eligible) > 1]
+            if len(pots) > 1:  # A pot only one seat can win is an uncalled bet going back
+                for index, (amount, eligible) in enumerate(pots):
+                    pot_name = "Main pot" if index == 0 else f"Side pot {index}"
+                    print(f"{pot_name}: {amount} chips between {', '.join(self.players[seat] for seat in eligible)}")
+        for seat, payout in enumerate(hand.payouts):
+            if payout:
+                print(f"{self.players[seat]} wins {payout} chips!")
+
+    def play(self):
+        """
+        Play hands of no-limit Texas Hold'em with blinds, side pots and a moving button.
+        """
+        print("Welcome to Texas Hold'em Poker!")
+        self.ledger = self.ledger or get_chip_ledger()
+        while True:
+            started = time.perf_counter()
+            stacks = [self.ledger.open_account(player, 1000) for player in self.players]
+            self.show_events(self.start_round(stacks, self.button)[1])
+            while self.phase == "betting":
+                self.player_action()
+
+            # Settle the hand in the ledger: every seat's stake, then what it collected
+            for seat, player in enumerate(self.players):
+                self.ledger.bet(player, "holdem", self.hand.committed[seat])
+                self.ledger.pay(player, "holdem", self.hand.payouts[seat])
+                if _history:
+                    _history.record("holdem", player, self.hand.committed[seat], self.hand.payouts[seat])
+            if _metrics:
+                _metrics.observe("round_seconds", time.perf_counter() - started, game="holdem")
+
+            print("\nChip counts:")
+            for player in self.players:
+                print(f"{player}: {self.ledger.balance(player)} chips")
+            self.button = (self.button + 1) % len(self.players)
+            if input("Do you want to play another hand? (yes/no): ").lower() != 'yes':
+                break
+
+
+# ------------------ Hold'em Equity ------------------
+
+PREFLOP_RANKS = "23456789TJQKA"
+PAIR_INDICES = {}  # Number of cards -> (pairs, 2) index array of every two card combination
+
+
+def pair_indices(count):
+    """
+    Return the index pairs of every two card combination out of count cards, cached per count.
+    """
+    if count not in PAIR_INDICES:
+        PAIR_INDICES[count] = np.array(list(combinations(range(count), 2)), dtype=np.intp).reshape(-1, 2)
+    return PAIR_INDICES[count]
+
+
+def preflop_class(hole_cards):
+    """
+    Return the preflop class of two hole cards, e.g. 'AA', 'AKs' or 'T9o'.
+    """
+    high, low = sorted(hole_cards, reverse=True)
+    name = PREFLOP_RANKS[high >> 2] + PREFLOP_RANKS[low >> 2]
+    if high >> 2 == low >> 2:
+        return name
+    return name + ("s" if high & 3 == low & 3 else "o")
+
+
+def preflop_classes():
+    """
+    Return all 169 preflop classes, each with one representative pair of hole cards.
+    """
+    classes = {}
+    for high in range(12, -1, -1):
+        for low in range(high, -1, -1):
+            if high == low:
+                classes[preflop_class([high * 4, low * 4 + 1])] = [high * 4, low * 4 + 1]
+            else:
+                classes[preflop_class([high * 4, low * 4])] = [high * 4, low * 4]
+                classes[preflop_class([high * 4, low * 4 + 1])] = [high * 4, low * 4 + 1]
+    return classes
+
+
+def exact_equity(hole_cards, board):
+    """
+    Enumerate every board completion and opponent hand heads-up; return (equity total, wins, ties, deals).
+    """
+    evaluator = get_hand_evaluator()
+    dead = set(hole_cards) | set(board)
+    rest = [card for card in range(52) if card not in dead]
+    equity = wins = ties = deals = 0
+    for completion in combinations(rest, 5 - len(board)):
+        full_board = list(board) + list(completion)
+        hero = evaluator.evaluate(list(hole_cards) + full_board)
+        remaining = np.array([card for card in rest if card not in completion], dtype=np.intp)
+        opponents = remaining[pair_indices(len(remaining))]
+        hands = np.concatenate([opponents, np.broadcast_to(full_board, (len(opponents), 5))], axis=1)
+        values = evaluator.evaluate_batch(hands)
+        won = int((hero > values).sum())
+        tied = int((hero == values).sum())
+        equity += won + tied / 2
+        wins += won
+        ties += tied
+        deals += len(values)
+    return equity, wins, ties, deals
+
+
+def sampled_equity(hole_cards, board, opponents, samples, seed=None, chunk_size=100_000):
+    """
+    Deal random boards and opponent hands in NumPy batches; return (equity total, wins, ties, deals).
+    """
+    evaluator = get_hand_evaluator()
+    rng = np.random.default_rng(seed)
+    dead = set(hole_cards) | set(board)
+    rest = np.array([card for card in range(52) if card not in dead], dtype=np.intp)
+    missing = 5 - len(board)
+    needed = missing + 2 * opponents
+    equity = wins = ties = 0.0
+    for start in range(0, samples, chunk_size):
+        count = min(chunk_size, samples - start)
+        # The `needed` smallest of a row of random keys pick a uniform random set of cards without replacement
+        dealt = rest[np.argpartition(rng.random((count, len(rest))), needed - 1, axis=1)[:, :needed]]
+        full_board = np.concatenate([np.broadcast_to(np.array(board, dtype=np.intp), (count, len(board))),
+                                     dealt[:, :missing]], axis=1)
+        hero = evaluator.evaluate_batch(np.concatenate(
+            [np.broadcast_to(np.array(hole_cards, dtype=np.intp), (count, 2)), full_board], axis=1))
+        best = np.zeros(count, dtype=hero.dtype)
+        tied_with = np.zeros(count)
+        for opponent in range(opponents):
+            hole = dealt[:, missing + 2 * opponent:missing + 2 * opponent + 2]
+            values = evaluator.evaluate_batch(np.concatenate([hole, full_board], axis=1))
+            best = np.maximum(best, values)
+            tied_with += values == hero
+        won = hero > best
+        tied = hero == best
+        equity += won.sum() + (tied / (1 + tied_with)).sum()
+        wins += won.sum()
+        ties += tied.sum()
+    return float(equity), int(wins), int(ties), samples
+
+
+def run_equity_shard(hole_cards, board, opponents, samples, seed):
+    """
+    Run one shard of a sampled equity calculation in a worker process.
+    """
+    return sampled_equity(hole_cards, board, opponents, samples, seed)
+
+
+PREFLOP_TABLE_SEED = 169  # Root seed of the preflop table, so every build of it samples the same deals
+
+
+class PreflopEquityTable:
+    def __init__(self, path=None):
+        """
+        Initialize the on-disk table of preflop equity per hand class and number of opponents.
+
+        The table is only ever written by build(), in one seeded pass, so its contents never depend on
+        which queries happened to run first.
+        """
+        self.path = path or os.path.join(CACHE_DIR, "holdem_preflop_equity.json")
+        self.results = {}  # "AKs" -> {"1": {"equity": ..., "win": ..., "tie": ..., "deals": ...}, ...}
+        try:
+            with open(self.path) as file:
+                self.results = json.load(file).get("results", {})
+        except (OSError, ValueError, AttributeError):  # Missing, unreadable or in an older format
+            pass
+
+    def get(self, hole_cards, opponents):
+        """
+        Return the stored result for hole cards as holdem_equity() would, or None when it is not in the table.
+        """
+        result = self.results.get(preflop_class(hole_cards), {}).get(str(opponents))
+        return {**result, "method": "table"} if result else None
+
+    def save(self, samples, seed):
+        """
+        Write the table to disk with the settings it was built with, skipping quietly when the cache
+        directory is not writable.
+        """
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "w") as file:
+                json.dump({"samples": samples, "seed": seed, "results": self.results}, file)
+        except OSError:
+            pass
+
+    def build(self, max_opponents=9, samples=200_000, workers=None, seed=PREFLOP_TABLE_SEED):
+        """
+        Sample all 169 classes against 1 to max_opponents opponents and store the table.
+
+        Each entry has its own seed derived from seed, the class and the number of opponents, so a build
+        with the same arguments always produces the same table.
+        """
+        results = {}
+        for index, (name, hole_cards) in enumerate(preflop_classes().items()):
+            for opponents in range(1, max_opponents + 1):
+                result = holdem_equity(hole_cards, opponents=opponents, samples=samples, exact_limit=0,
+                                       workers=workers, seed=[seed, index, opponents], use_table=False)
+                results.setdefault(name, {})[str(opponents)] = {key: result[key]
+                                                                for key in ("equity", "win", "tie", "deals")}
+        self.results = results
+        self.save(samples, seed)
+        return self
+
+
+_preflop_table = None
+
+
+def get_preflop_table():
+    """
+    Return the shared PreflopEquityTable, loading it from disk on first use.
+    """
+    global _preflop_table
+    if _preflop_table is None:
+        _preflop_table = PreflopEquityTable()
+    return _preflop_table
+
+
+def holdem_equity(hole_cards, board=(), opponents=1, samples=200_000, exact_limit=2_000_000,
+                  workers=1, seed=None, use_table=True):
+    """
+    Return the equity of hole cards against random opponent hands, given the known community cards.
+
+    Heads-up spots with at most exact_limit deals are enumerated exactly. Preflop queries come from the
+    on-disk table when it has been built. Everything else is sampled in NumPy batches, split across a process
+    pool when workers is more than one. Equity counts a win as 1 and a tie between k players as 1/k.
+    Every method returns the same keys: equity, win, tie, deals and method.
+    """
+    hole_cards, board = list(hole_cards), list(board)
+    unseen = 50 - len(board)
+    missing = 5 - len(board)
+    deals = comb(unseen, missing) * comb(unseen - missing, 2)
+    if opponents == 1 and deals <= exact_limit:
+        equity, wins, ties, deals = exact_equity(hole_cards, board)
+        method = "exact"
+    elif use_table and not board and get_preflop_table().get(hole_cards, opponents) is not None:
+        return get_preflop_table().get(hole_cards, opponents)
+    else:
+        if workers == 1:
+            equity, wins, ties, deals = sampled_equity(hole_cards, board, opponents, samples, seed)
+        else:
+            children = np.random.SeedSequence(seed).spawn(workers or os.cpu_count() or 1)
+            sizes = [samples // len(children) + (index < samples % len(children)) for index in range(len(children))]
+            with futures.ProcessPoolExecutor(max_workers=len(children)) as executor:
+                parts = list(executor.map(run_equity_shard, [hole_cards] * len(children), [board] * len(children),
+                                          [opponents] * len(children), sizes, children))
+            equity, wins, ties, deals = (sum(part[index] for part in parts) for index in range(4))
+        method = "sampled"
+    return {"equity": equity / deals, "win": wins / deals, "tie": ties / deals, "deals": deals, "method": method}
+
+
+# ------------------ Headless Simulation ------------------
+
+class SimulationStats:
+    def __init__(self):
+        """
+        Initialize empty running statistics of the net return per unit bet of each round.
+        """
+        self.rounds = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.histogram = Counter()  # Net return -> number of rounds
+
+    def add(self, net_return):
+        """
+        Record the net return of a single round.
+        """
+        self.rounds += 1
+        self.total += net_return
+        self.total_sq += net_return * net_return
+        self.histogram[net_return] += 1
+
+    def add_counts(self, net_returns, counts):
+        """
+        Record many rounds at once as parallel arrays of net returns and how often each occurred.
+        """
+        net_returns = np.asarray(net_returns, dtype=float)
+        counts = np.asarray(counts)
+        self.rounds += int(counts.sum())
+        self.total += float(net_returns @ counts)
+        self.total_sq += float((net_returns * net_returns) @ counts)
+        for net_return, count in zip(net_returns.tolist(), counts.tolist()):
+            if count:
+                self.histogram[net_return] += count
+
+    def merge(self, other):
+        """
+        Fold another SimulationStats into this one.
+        """
+        self.rounds += other.rounds
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.histogram.update(other.histogram)
+        return self
+
+    @property
+    def mean(self):
+        """
+        Mean net return per unit bet; the house edge is its negative.
+        """
+        return self.total / self.rounds if self.rounds else 0.0
+
+    @property
+    def variance(self):
+        """
+        Sample variance of the net return per unit bet.
+        """
+        if self.rounds < 2:
+            return 0.0
+        return max(self.total_sq - self.rounds * self.mean ** 2, 0.0) / (self.rounds - 1)
+
+    def confidence_interval(self, z=1.96):
+        """
+        Return the (low, high) normal-approximation confidence interval of the mean, 95% by default.
+        """
+        margin = z * (self.variance / self.rounds) ** 0.5 if self.rounds else 0.0
+        return self.mean - margin, self.mean + margin
+
+    def summary(self):
+        """
+        Return the headline numbers as a dict.
+        """
+        low, high = self.confidence_interval()
+        return {"rounds": self.rounds, "mean_return": self.mean, "rtp": 1 + self.mean,
+                "variance": self.variance, "ci_low": low, "ci_high": high}
+
+
+def dealer_strategy(player_hand, dealer_upcard):
+    """
+    Blackjack strategy that mimics the dealer: hit below 17, otherwise stand.
+    """
+    return "hit" if BlackjackGame.calculate_hand(player_hand) < 17 else "stand"
+
+
+def basic_strategy(player_hand, dealer_upcard):
+    """
+    Blackjack strategy that plays the precomputed best action for a 6-deck shoe.
+    """
+    return get_blackjack_strategy().best_action(player_hand, dealer_upcard)
+
+
+def optimal_strategy(player_hand, dealer_upcard):
+    """
+    Blackjack strategy that plays the exact best action, doubles, splits and surrender included,
+    under the process-wide rules.
+    """
+    return blackjack_best_action(player_hand, dealer_upcard)
+
+
+def always_call(hole_cards):
+    """
+    Hold'em strategy that never folds.
+    """
+    return "call"
+
+
+def passive_bot(hand, rng):
+    """
+    Hold'em table bot that checks or calls whatever it faces.
+    """
+    actions = hand.legal_actions()
+    return ("call", 0) if "call" in actions else ("check", 0)
+
+
+def random_bot(hand, rng):
+    """
+    Hold'em table bot that picks uniformly among its legal actions, raising a random legal amount.
+    """
+    action, limits = rng.choice(list(hand.legal_actions().items()))
+    return action, rng.randint(*limits) if action in ("bet", "raise") else 0
+
+
+def value_bot(hand, rng):
+    """
+    Hold'em table bot that raises strong hands, calls playable ones and otherwise checks or folds.
+    """
+    actions = hand.legal_actions()
+    seat = hand.to_act
+    strength = get_hand_evaluator().evaluate(hand.hole(seat) + hand.board) if hand.board else \
+        7462 - 600 * (12 - max(card >> 2 for card in hand.hole(seat)))
+    limits = actions.get("raise") or actions.get("bet")
+    if strength > 6000 and limits:
+        return ("raise" if "raise" in actions else "bet"), limits[0]
+    if strength > 4000 or "check" in actions:
+        return ("call", 0) if "call" in actions else ("check", 0)
+    return "fold", 0
+
+
+HOLDEM_BOTS = {"passive": passive_bot, "random": random_bot, "value": value_bot}
+
+
+def simulate_blackjack(rounds, strategy=dealer_strategy, seed=None, history=None, rules=None):
+    """
+    Play rounds of blackjack with strategy(player_hand, dealer_upcard) choosing each action, under the
+    process-wide rules unless others are given.
+
+    Every simulator records its rounds as hand history when given a history directory.
+    """
+    rules = rules or get_blackjack_rules()
+    game = BlackjackCore(deck=LocalShoe(deck_count=rules.decks, rng=NumpySource(seed)), rules=rules)
+    recorder = HandHistory(history) if history else None
+    stats = SimulationStats()
+    for _ in range(rounds):
+        game.start_round(1)
+        while game.phase == "player":
+            game.apply_action(strategy(game.player_hand, game.dealer_hand[0]))
+        stats.add(game.exact_payout - game.staked)
+        if recorder:
+            recorder.record("blackjack", "simulator", game.staked, game.exact_payout)
+    if recorder:
+        recorder.close()
+    return stats
+
+
+def simulate_slots(rounds, seed=None, chunk_size=1_000_000, reels=None, paylines=None, partial_pays=None,
+                   history=None):
+    """
+    Spin the slot machine rounds times in NumPy batches, one unit bet per payline per spin.
+    """
+    machine = SlotCore(reels=reels, paylines=paylines, partial_pays=partial_pays)
+    rng = NumpySource(seed)
+    recorder = HandHistory(history) if history else None
+    lines = len(machine.paylines)
+    stats = SimulationStats()
+    for start in range(0, rounds, chunk_size):
+        spins = machine.spin_batch(min(chunk_size, rounds - start), rng)
+        net_returns, counts = np.unique(spins, return_counts=True)
+        stats.add_counts(net_returns, counts)
+        if recorder:
+            recorder.record_many("slots", "simulator", np.full(len(spins), lines), lines * (1 + spins), "spin")
+    if recorder:
+        recorder.close()
+    return stats
+
+
+def simulate_roulette(rounds, bet_details, seed=None, chunk_size=1_000_000, history=None):
+    """
+    Spin the roulette wheel rounds times in NumPy batches against one unit bet described by bet_details.
+    """
+    game = RouletteCore()
+    rng = NumpySource(seed)
+    recorder = HandHistory(history) if history else None
+    net_returns = [game.determine_payout(number, bet_details, 1) for number in range(37)]
+    stats = SimulationStats()
+    for start in range(0, rounds, chunk_size):
+        results = rng.integer_array(0, 36, min(chunk_size, rounds - start))
+        stats.add_counts(net_returns, np.bincount(results, minlength=37))
+        if recorder:
+            recorder.record_many("roulette", "simulator", np.ones(len(results)),
+                                 1 + np.array(net_returns)[results], bet_details["type"])
+    if recorder:
+        recorder.close()
+    return stats
+
+
+def simulate_holdem(rounds, strategies=(always_call, always_call), seed=None, ante=1, bet=1):
+    """
+    Play heads-up hold'em hands and record Player 1's net return per ante.
+
+    Both players ante; each strategy(hole_cards) then answers 'call' (adding bet to the pot) or 'fold'.
+    Hands that reach showdown are settled with the hand evaluator.
+    """
+    evaluator = get_hand_evaluator()
+    deck = LocalShoe(deck_count=1, penetration=1.0, rng=NumpySource(seed))
+    stats = SimulationStats()
+    for _ in range(rounds):
+        deck.shuffle()
+        cards = deck.draw(9)
+        hand1, hand2, board = cards[0:2], cards[2:4], cards[4:9]
+        if strategies[0](hand1) == "fold":
+            stats.add(-1)
+        elif strategies[1](hand2) == "fold":
+            stats.add(1)
+        else:
+            value1 = evaluator.evaluate(hand1 + board)
+            value2 = evaluator.evaluate(hand2 + board)
+            stats.add(((value1 > value2) - (value1 < value2)) * (ante + bet) / ante)
+    return stats
+
+
+def simulate_holdem_table(rounds, bots=("passive", "random"), seed=None, stack=1000, small_blind=5, big_blind=10,
+                          history=None):
+    """
+    Play full no-limit hands between HOLDEM_BOTS and record seat 0's net result per hand in big blinds.
+
+    Every hand starts from fresh stacks and the button moves one seat each hand. In the hand history
+    each seat is named after its bot and seat number, e.g. 'value-2'.
+    """
+    rng = NumpySource(seed)
+    deck = LocalShoe(deck_count=1, penetration=1.0, rng=rng)
+    players = [HOLDEM_BOTS[bot] for bot in bots]
+    recorder = HandHistory(history) if history else None
+    names = [f"{bot}-{seat}" for seat, bot in enumerate(bots)]
+    stats = SimulationStats()
+    for round_number in range(rounds):
+        hand = HoldemHand([stack] * len(players), round_number % len(players), small_blind, big_blind, deck)
+        while not hand.finished:
+            hand.act(*players[hand.to_act](hand, rng))
+        stats.add((hand.stacks[0] - stack) / big_blind)
+        if recorder:
+            for seat, name in enumerate(names):
+                recorder.record("holdem", name, hand.committed[seat], hand.payouts[seat])
+    if recorder:
+        recorder.close()
+    return stats
+
+
+def blind_schedule(levels=20, small_blind=5, growth=1.5):
+    """
+    Return escalating (small blind, big blind) levels, each about growth times the last, rounded to 5 chips.
+    """
+    schedule = []
+    blind = small_blind
+    for _ in range(levels):
+        small = max(5, int(blind / 5 + 0.5) * 5)
+        if not schedule or small > schedule[-1][0]:
+            schedule.append((small, 2 * small))
+        blind *= growth
+    return schedule
+
+
+BLIND_SCHEDULE = blind_schedule()
+
+
+class TournamentStats:
+    def __init__(self, entrants=(), curve_step=10, curve_points=100):
         """
-        Initialize the Blackjack game with a shuffled deck and initial chips.
+        Initialize results for tournaments between the named entrants (HOLDEM_BOTS keys, one per seat).
+
+        Chip curves are sampled every curve_step hands for curve_points samples; a finished tournament
+        holds its final stacks for the rest of the curve so every tournament contributes to every sample.
         """
-        self.base_url = "https://deckofcardsapi.com/api/deck/"
-        self.deck_id = self.shuffle_new_deck()  # Get a new shuffled deck ID
-        self.player_hand = []  # List to hold player's cards
-        self.dealer_hand = []  # List to hold dealer's cards
-        self.chips = 1000  # Starting chips for the player
+        self.entrants = list(entrants)
+        self.curve_step = curve_step
+        self.tournaments = 0
+        self.hands = 0
+        self.wins = [0] * len(self.entrants)
+        self.finish_total = [0] * len(self.entrants)  # Sum of finishing places, 1 for the winner
+        self.survived_total = [0] * len(self.entrants)  # Sum of hands played before busting or winning
+        self.curve_total = np.zeros((len(self.entrants), curve_points))
+        self.curve_total_sq = np.zeros((len(self.entrants), curve_points))
 
-    def shuffle_new_deck(self):
+    def add(self, places, hands, survived, curve):
         """
-        Shuffle a new deck with 6 decks combined and return the deck_id.
+        Record one tournament: each seat's finishing place, the hand count, each seat's hands survived and
+        its sampled stacks.
         """
-        response = requests.get(f"{self.base_url}new/shuffle/?deck_count=6")
-        deck_data = response.json()
-        return deck_data['deck_id']
+        self.tournaments += 1
+        self.hands += hands
+        for seat, place in enumerate(places):
+            self.wins[seat] += place == 1
+            self.finish_total[seat] += place
+            self.survived_total[seat] += survived[seat]
+        curve = np.asarray(curve, dtype=float)
+        self.curve_total += curve
+        self.curve_total_sq += curve * curve
 
-    def draw_card(self, count=1):
+    def merge(self, other):
         """
-        Draw a specified number of cards from the deck.
+        Fold another TournamentStats for the same entrants into this one.
         """
-        response = requests.get(f"{self.base_url}{self.deck_id}/draw/?count={count}")
-        return response.json()['cards']
+        self.tournaments += other.tournaments
+        self.hands += other.hands
+        for seat in range(len(self.entrants)):
+            self.wins[seat] += other.wins[seat]
+            self.finish_total[seat] += other.finish_total[seat]
+            self.survived_total[seat] += other.survived_total[seat]
+        self.curve_total += other.curve_total
+        self.curve_total_sq += other.curve_total_sq
+        return self
 
-    def card_value(self, card):
+    def summary(self):
         """
-        Calculate the value of a single card (handle face cards and Ace).
+        Return one row per seat: win rate, average finish, average hands survived and its mean chip curve.
+        """
+        count = max(self.tournaments, 1)
+        mean = self.curve_total / count
+        deviation = np.sqrt(np.maximum(self.curve_total_sq / count - mean * mean, 0.0))
+        return [{"seat": seat, "bot": bot, "win_rate": self.wins[seat] / count,
+                 "average_finish": self.finish_total[seat] / count,
+                 "average_hands": self.survived_total[seat] / count,
+                 "curve_hands": list(range(0, self.curve_step * mean.shape[1], self.curve_step)),
+                 "curve_mean": mean[seat].tolist(), "curve_std": deviation[seat].tolist()}
+                for seat, bot in enumerate(self.entrants)]
+
+
+def play_tournament(players, rng, deck, stack=1000, hands_per_level=30, schedule=BLIND_SCHEDULE,
+                    max_hands=20_000, curve_step=10, curve_points=100):
+    """
+    Play one freeze-out between bot callables until one seat holds every chip.
+
+    Blinds step through schedule every hands_per_level hands (the last level then holds) and the
+    button moves to the next seat with chips. A tournament still running after max_hands is ranked
+    by stack. Returns (places, hands, hands survived per seat, stacks sampled every curve_step hands).
+    """
+    seats = len(players)
+    stacks = [stack] * seats
+    places = [0] * seats
+    survived = [0] * seats
+    curve = [[stack] * curve_points for _ in range(seats)]
+    busted = 0
+    button = rng.randint(0, seats - 1)
+    hands = 0
+    while busted < seats - 1 and hands < max_hands:
+        small_blind, big_blind = schedule[min(hands // hands_per_level, len(schedule) - 1)]
+        hand = HoldemHand(stacks, button, small_blind, big_blind, deck)
+        while not hand.finished:
+            hand.act(*players[hand.to_act](hand, rng))
+        hands += 1
+        out = [seat for seat in range(seats) if stacks[seat] > 0 and hand.stacks[seat] == 0]
+        for seat in sorted(out, key=lambda seat: stacks[seat]):  # The shorter stack going in finishes lower
+            places[seat] = seats - busted
+            survived[seat] = hands
+            busted += 1
+        stacks = hand.stacks.tolist()
+        if hands % curve_step == 0 and hands // curve_step < curve_points:
+            for seat in range(seats):
+                curve[seat][hands // curve_step] = stacks[seat]
+        button = next((button + step) % seats for step in range(1, seats + 1) if stacks[(button + step) % seats])
+    remaining = sorted((seat for seat in range(seats) if not places[seat]), key=lambda seat: -stacks[seat])
+    for place, seat in enumerate(remaining, start=1):
+        places[seat] = place
+        survived[seat] = hands
+    final = hands // curve_step + 1  # Later samples hold the final stacks
+    for seat in range(seats):
+        curve[seat][final:] = [stacks[seat]] * max(curve_points - final, 0)
+    return places, hands, survived, curve
+
+
+def simulate_tournaments(tournaments, seed=None, bots=("passive", "random", "value"), stack=1000,
+                         hands_per_level=30, curve_step=10, curve_points=100):
+    """
+    Play freeze-out tournaments between HOLDEM_BOTS seated in the given order and return TournamentStats.
+    """
+    rng = NumpySource(seed)
+    deck = LocalShoe(deck_count=1, penetration=1.0, rng=rng)
+    players = [HOLDEM_BOTS[bot] for bot in bots]
+    stats = TournamentStats(bots, curve_step, curve_points)
+    for _ in range(tournaments):
+        stats.add(*play_tournament(players, rng, deck, stack, hands_per_level,
+                                   curve_step=curve_step, curve_points=curve_points))
+    return stats
+
+
+def run_tournaments(bots=("passive", "random", "value"), tournaments=1000, workers=None, seed=None, **options):
+    """
+    Run tournaments across worker processes and print each bot's results.
+    """
+    start = time.perf_counter()
+    stats = run_sharded("tournament", tournaments, seed=seed, shards=min(64, tournaments), workers=workers,
+                        bots=tuple(bots), **options)
+    elapsed = time.perf_counter() - start
+    print(f"{stats.tournaments:,} tournaments, {stats.hands:,} hands in {elapsed:.1f}s "
+          f"({stats.hands / elapsed * 60:,.0f} hands/minute)")
+    samples = [index for index in (1, 2, 4, 8, 16) if index < stats.curve_total.shape[1]]
+    checkpoints = "/".join(str(index * stats.curve_step) for index in samples)
+    print(f"{'seat':>4} {'bot':<10} {'wins':>7} {'finish':>7} {'hands':>7}   mean chips after hand {checkpoints}")
+    for row in stats.summary():
+        points = [row["curve_mean"][index] for index in samples]
+        print(f"{row['seat']:>4} {row['bot']:<10} {row['win_rate']:>7.1%} {row['average_finish']:>7.2f} "
+              f"{row['average_hands']:>7.0f}   {' / '.join(f'{value:,.0f}' for value in points)}")
+    return stats
+
+
+SIMULATORS = {
+    "blackjack": simulate_blackjack,
+    "slots": simulate_slots,
+    "roulette": simulate_roulette,
+    "holdem": simulate_holdem,
+    "holdem_table": simulate_holdem_table,
+    "count_edge": simulate_count_edge,
+    "tournament": simulate_tournaments,
+}
+
+
+def run_shard(game, rounds, seed, options):
+    """
+    Run one shard of a sharded simulation and return its SimulationStats.
+    """
+    return SIMULATORS[game](rounds, seed=seed, **options)
+
+
+def run_sharded(game, rounds, seed=None, shards=64, workers=None, **options):
+    """
+    Split a simulation into shards, run them on a process pool and merge their statistics.
+
+    Shard sizes and seeds depend only on rounds, shards and seed, and shards are merged in order,
+    so the result is identical for any number of workers. Extra options go to the game's simulator.
+    """
+    children = np.random.SeedSequence(seed).spawn(shards)
+    seeds = [int(child.generate_state(1, np.uint64)[0]) for child in children]
+    sizes = [rounds // shards + (index < rounds % shards) for index in range(shards)]
+    arguments = ([game] * shards, sizes, seeds, [options] * shards)
+    if workers == 1:
+        results = list(map(run_shard, *arguments))
+    else:
+        with futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run_shard, *arguments))
+
+    stats = results[0]  # Simulators return SimulationStats, or CountEdgeStats for count_edge
+    for result in results[1:]:
+        stats.merge(result)
+    return stats
+
+
+# ------------------ Hand History ------------------
+
+# Every settled wager is one row: when, which game and bet type, who, what was staked and what came back
+# (stake included). Rows are buffered per column and written out as chunks of .npy files, one per column,
+# that the query layer memory-maps, so neither side holds more than one chunk in RAM.
+HISTORY_GAMES = ("blackjack", "slots", "roulette", "holdem")
+HISTORY_BET_TYPES = ("hand", "spin", *ROULETTE_PAYOUTS)
+HISTORY_COLUMNS = {"time": "f8", "game": "u1", "bet_type": "u1", "player": "u4", "stake": "f8", "returned": "f8"}
+
+_history = None
+
+
+class HandHistory:
+    def __init__(self, path, chunk_rows=1 << 18):
+        """
+        Initialize a recorder appending rows to the history directory at path, chunk_rows rows per chunk.
+
+        Each process writes its own chunks, so sharded simulations can record into one directory. A chunk's
+        players are numbered in a JSON file written after its columns, which marks the chunk complete.
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.chunk_rows = chunk_rows
+        self.stem = f"{os.getpid()}-{time.time_ns()}"  # Unique to this recorder; chunk numbers follow it
+        self.chunks = 0
+        self.columns = {name: np.empty(chunk_rows, dtype) for name, dtype in HISTORY_COLUMNS.items()}
+        self.rows = 0
+        self.players = {}  # Player name -> number within the current chunk
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def player_number(self, player):
+        """
+        Return a player's number within the current chunk.
+        """
+        return self.players.setdefault(getattr(player, "name", player), len(self.players))
+
+    def record(self, game, player, stake, returned, bet_type="hand"):
+        """
+        Record one settled wager.
+        """
+        with self.lock:
+            row = self.rows
+            columns = self.columns
+            columns["time"][row] = time.time()
+            columns["game"][row] = HISTORY_GAMES.index(game)
+            columns["bet_type"][row] = HISTORY_BET_TYPES.index(bet_type)
+            columns["player"][row] = self.player_number(player)
+            columns["stake"][row] = stake
+            columns["returned"][row] = returned
+            self.rows += 1
+            if self.rows == self.chunk_rows:
+                self.flush_chunk()
+
+    def record_many(self, game, player, stakes, returned, bet_type="hand"):
+        """
+        Record many wagers by one player on one bet type from parallel arrays of stakes and returns.
+        """
+        self.write_rows(game, HISTORY_BET_TYPES.index(bet_type), [player], 0, np.asarray(stakes, dtype=float),
+                        np.asarray(returned, dtype=float))
+
+    def record_book(self, game, book, result):
+        """
+        Record every bet in a RouletteBetBook settled on a winning number.
+        """
+        players = [None] * (max(book.players.values(), default=-1) + 1)
+        for player, number in book.players.items():
+            players[number] = player
+        types = np.array([HISTORY_BET_TYPES.index(bet_type) for bet_type in book.bet_types], dtype=np.uint8)
+        stakes = np.frombuffer(book.stakes)
+        self.write_rows(game, types[np.frombuffer(book.bet_rows, dtype=np.int64)], players,
+                        np.frombuffer(book.player_numbers, dtype=np.int64), stakes, stakes + book.settle(result))
+
+    def write_rows(self, game, bet_types, players, player_index, stakes, returned):
+        """
+        Append rows, splitting them across chunks; bet_types and player_index are scalars or per-row arrays,
+        and player_index picks from the players list.
+        """
+        with self.lock:
+            now = time.time()
+            start = 0
+            while start < len(stakes):
+                count = min(len(stakes) - start, self.chunk_rows - self.rows)
+                rows = slice(self.rows, self.rows + count)
+                part = slice(start, start + count)
+                numbers = np.array([self.player_number(player) if player is not None else 0 for player in players],
+                                   dtype=np.uint32)  # Renumbered per chunk
+                columns = self.columns
+                columns["time"][rows] = now
+                columns["game"][rows] = HISTORY_GAMES.index(game)
+                columns["bet_type"][rows] = bet_types if np.isscalar(bet_types) else bet_types[part]
+                columns["player"][rows] = numbers[player_index if np.isscalar(player_index) else player_index[part]]
+                columns["stake"][rows] = stakes[part]
+                columns["returned"][rows] = returned[part]
+                self.rows += count
+                start += count
+                if self.rows == self.chunk_rows:
+                    self.flush_chunk()
+
+    def flush_chunk(self):
+        """
+        Write the buffered rows out as a chunk and start a new one; the caller holds the lock.
+        """
+        if not self.rows:
+            return
+        started = time.perf_counter()
+        stem = os.path.join(self.path, f"{self.stem}-{self.chunks:06d}")
+        for name, column in self.columns.items():
+            np.save(f"{stem}.{name}.npy", column[:self.rows])
+        with open(f"{stem}.json.tmp", "w") as file:
+            json.dump({"rows": self.rows, "players": list(self.players)}, file)
+        os.replace(f"{stem}.json.tmp", f"{stem}.json")
+        if _metrics:
+            _metrics.observe("history_flush_seconds", time.perf_counter() - started)
+            _metrics.inc("history_rows_total", self.rows)
+        self.chunks += 1
+        self.rows = 0
+        self.players = {}
+
+    def flush(self):
+        """
+        Write out any buffered rows as a (short) chunk.
+        """
+        with self.lock:
+            self.flush_chunk()
+
+    def close(self):
+        """
+        Flush the last rows; the recorder takes no more after this.
+        """
+        if not self.closed:
+            self.flush()
+            self.closed = True
+
+
+class HistoryReader:
+    def __init__(self, path):
+        """
+        Initialize queries over the complete chunks in a history directory.
+        """
+        self.path = path
+
+    def chunks(self):
+        """
+        Yield (columns, players) for each complete chunk, with every column memory-mapped read-only.
+        """
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith(".json"):
+                continue
+            stem = os.path.join(self.path, name[:-5])
+            with open(stem + ".json") as file:
+                players = json.load(file)["players"]
+            yield {column: np.load(f"{stem}.{column}.npy", mmap_mode="r") for column in HISTORY_COLUMNS}, players
+
+    def summary(self):
+        """
+        Scan every chunk once and return per-game RTP and volatility, the bet-type mix and each player's P&L.
+
+        Volatility is the standard deviation of the net return per unit staked on a wager.
         """
-        value = card['value']
-        if value in ['JACK', 'QUEEN', 'KING']:
-            return 10
-        elif value == 'ACE':
-            return 11  # Treat ACE as 11 initially
+        games, bet_types = len(HISTORY_GAMES), len(HISTORY_BET_TYPES)
+        # Per game: wagers, staked, returned, sum and sum of squares of the net return per unit staked
+        totals = np.zeros((5, games))
+        mix = np.zeros((2, games * bet_types))  # Wagers and staked per (game, bet type)
+        players = {}  # Name -> array of wagers, staked and net
+        for columns, names in self.chunks():
+            game, stake, returned = columns["game"], columns["stake"], columns["returned"]
+            unit = np.divide(returned - stake, stake, out=np.zeros(len(stake)), where=stake > 0)
+            for index, weights in enumerate((None, stake, returned, unit, unit * unit)):
+                totals[index] += np.bincount(game, weights, minlength=games)
+            pairs = game.astype(np.int64) * bet_types + columns["bet_type"]
+            mix[0] += np.bincount(pairs, minlength=games * bet_types)
+            mix[1] += np.bincount(pairs, stake, minlength=games * bet_types)
+            player = columns["player"]
+            rows = np.stack([np.bincount(player, weights, minlength=len(names))
+                             for weights in (None, stake, returned - stake)], axis=1)
+            for name, row in zip(names, rows):
+                players[name] = players.get(name, 0) + row
+        report = {"games": {}, "bet_types": {}, "players": {}}
+        for index, game in enumerate(HISTORY_GAMES):
+            wagers, staked, returned, unit, unit_sq = totals[:, index].tolist()
+            if not wagers:
+                continue
+            mean = unit / wagers
+            report["games"][game] = {"wagers": int(wagers), "staked": staked, "returned": returned,
+                                     "rtp": returned / staked if staked else 0.0,
+                                     "volatility": max(unit_sq / wagers - mean * mean, 0.0) ** 0.5}
+            counts, bet_staked = mix[:, index * bet_types:(index + 1) * bet_types].tolist()
+            report["bet_types"][game] = {bet_type: {"wagers": int(counts[type_index]),
+                                                    "share": bet_staked[type_index] / staked if staked else 0.0}
+                                         for type_index, bet_type in enumerate(HISTORY_BET_TYPES) if counts[type_index]}
+        for name, row in players.items():
+            wagers, staked, net = row.tolist()
+            report["players"][name] = {"wagers": int(wagers), "staked": staked, "net": net}
+        return report
+
+
+def get_hand_history():
+    """
+    Return the process-wide hand history recorder, or None if rounds are not being recorded.
+    """
+    return _history
+
+
+def set_hand_history(history):
+    """
+    Replace the process-wide hand history recorder, flushing it at exit, and return it.
+    """
+    global _history
+    _history = history
+    if history is not None:
+        atexit.register(history.close)
+    return history
+
+
+def configure_history(arguments):
+    """
+    Apply --history DIR from the command line, recording every settled wager there; return the other arguments.
+    """
+    if "--history" not in arguments:
+        return arguments
+    index = arguments.index("--history")
+    set_hand_history(HandHistory(arguments[index + 1]))
+    return arguments[:index] + arguments[index + 2:]
+
+
+def print_history_report(path, top=10):
+    """
+    Print the per-game, bet-type and player summary of a history directory.
+    """
+    report = HistoryReader(path).summary()
+    print(f"{'Game':<10} {'Wagers':>12} {'Staked':>14} {'RTP':>8} {'Volatility':>11}")
+    for game, row in report["games"].items():
+        print(f"{game:<10} {row['wagers']:>12,} {row['staked']:>14,.0f} {row['rtp']:>8.2%} {row['volatility']:>11.3f}")
+    for game, mix in report["bet_types"].items():
+        print(f"{game} bet mix: " + ", ".join(f"{bet_type} {row['share']:.1%}" for bet_type, row in mix.items()))
+    players = sorted(report["players"].items(), key=lambda item: item[1]["net"])
+    print(f"{'Player':<20} {'Wagers':>10} {'Staked':>14} {'Net':>14}")
+    for name, row in players[:top] + players[max(top, len(players) - top):]:
+        print(f"{name:<20} {row['wagers']:>10,} {row['staked']:>14,.0f} {row['net']:>+14,.0f}")
+
+
+# ------------------ Risk Limits ------------------
+
+_risk = None
+
+
+class RiskLimits:
+    def __init__(self, max_bet=None, session_loss=None, table_max_bet=None, max_exposure=None):
+        """
+        Initialize a set of limits, where None leaves a limit off.
+
+        max_bet caps a player's single bet and session_loss what they may lose in a session, counting the
+        stakes of bets still open. table_max_bet caps any single bet at a table, and max_exposure what the
+        house could owe on any one roulette number across every open bet at the table.
+        """
+        self.max_bet = max_bet
+        self.session_loss = session_loss
+        self.table_max_bet = table_max_bet
+        self.max_exposure = max_exposure
+
+
+class RiskEngine:
+    def __init__(self, limits=None, keep=1000):
+        """
+        Initialize limit checks backed by counters updated on every bet and settlement, so a check is O(1).
+
+        Counters live in dicts: each player has their session net and the chips on open bets, and each
+        roulette table a 37-slot vector of the house's net payout on each number. Refused bets are reported
+        as limit_breach event dicts, kept in breaches, passed to each listener and counted in the metrics.
+        """
+        self.limits = limits or RiskLimits()
+        self.player_limits = {}  # Player name -> RiskLimits used instead of the defaults, e.g. set by the player
+        self.table_limits = {}  # Table -> RiskLimits used instead of the defaults
+        self.sessions = {}  # Player name -> [net chips won this session, chips staked on open bets]
+        self.exposure = {}  # Table -> net payout to players for each winning number over the open bets
+        self.breaches = deque(maxlen=keep)  # Most recent breach events
+        self.listeners = []  # Callables given every breach event
+
+    def place_bet(self, player, table, amount, vector=None):
+        """
+        Check a bet against the limits and count it if it passes; return the breach event if it does not.
+
+        vector is a roulette bet's net payout per chip on each winning number, as RouletteCore.payout_vector()
+        gives it, and adds the bet to the table's exposure.
+        """
+        name = getattr(player, "name", player)
+        limits = self.player_limits.get(name, self.limits)
+        table_limits = self.table_limits.get(table, self.limits)
+        session = self.sessions.get(name)
+        if session is None:
+            session = self.sessions[name] = [0, 0]
+        if limits.max_bet is not None and amount > limits.max_bet:
+            return self.breach("max_bet", "player", name, table, amount, limits.max_bet,
+                               f"Bet refused: your maximum bet is {limits.max_bet}.")
+        if table_limits.table_max_bet is not None and amount > table_limits.table_max_bet:
+            return self.breach("table_max_bet", "table", name, table, amount, table_limits.table_max_bet,
+                               f"Bet refused: the table maximum is {table_limits.table_max_bet}.")
+        loss = session[1] + amount - session[0]
+        if limits.session_loss is not None and loss > limits.session_loss:
+            return self.breach("session_loss", "player", name, table, loss, limits.session_loss,
+                               f"Bet refused: you could lose {loss} this session, over your limit of "
+                               f"{limits.session_loss}.")
+        if vector is not None:
+            exposure = self.exposure.get(table)
+            exposure = amount * vector if exposure is None else exposure + amount * vector
+            if table_limits.max_exposure is not None:
+                number = int(exposure.argmax())
+                if exposure[number] > table_limits.max_exposure:
+                    return self.breach("max_exposure", "table", name, table, float(exposure[number]),
+                                       table_limits.max_exposure,
+                                       f"Bet refused: the table would owe {exposure[number]:g} on {number}, "
+                                       f"over its limit of {table_limits.max_exposure}.", number=number)
+            self.exposure[table] = exposure
+        session[1] += amount
+        return None
+
+    def breach(self, limit, scope, player, table, value, threshold, message, **details):
+        """
+        Report a refused bet and return its event.
+        """
+        event = {"event": "limit_breach", "limit": limit, "scope": scope, "player": player, "table": table,
+                 "value": value, "threshold": threshold, **details, "message": message}
+        self.breaches.append(event)
+        for listener in self.listeners:
+            listener(event)
+        if _metrics:
+            _metrics.inc("risk_breaches_total", limit=limit)
+        return event
+
+    def settle(self, player, stake, returned):
+        """
+        Close a player's bets of stake chips that returned returned chips, stake included.
+        """
+        session = self.sessions.setdefault(getattr(player, "name", player), [0, 0])
+        session[0] += returned - stake
+        session[1] -= stake
+
+    def clear_exposure(self, table, exposure=None):
+        """
+        Reset a table's exposure once its spin is settled, or set it to a recomputed vector.
+        """
+        if exposure is None:
+            self.exposure.pop(table, None)
         else:
-            return int(value)
+            self.exposure[table] = exposure
 
-    def calculate_hand(self, hand):
+    def session_limit_reached(self, player):
         """
-        Calculate the total value of a hand of cards, adjusting for Aces if necessary.
+        True once a player has lost as much this session as their session loss limit allows.
         """
-        total = sum([self.card_value(card) for card in hand])
-        aces = sum(1 for card in hand if card['value'] == 'ACE')
+        name = getattr(player, "name", player)
+        limit = self.player_limits.get(name, self.limits).session_loss
+        net, at_risk = self.sessions.get(name, (0, 0))
+        return limit is not None and at_risk - net >= limit
 
-        while total > 21 and aces:
-            total -= 10
-            aces -= 1
+    def end_session(self, player):
+        """
+        Forget a player's session counters, e.g. when they disconnect.
+        """
+        self.sessions.pop(getattr(player, "name", player), None)
 
-        return total
 
-    def show_hand(self, hand, owner="Player"):
+def get_risk_engine():
+    """
+    Return the process-wide risk engine, or None if no limits are enforced.
+    """
+    return _risk
+
+
+def set_risk_engine(engine):
+    """
+    Replace the process-wide risk engine and return it.
+    """
+    global _risk
+    _risk = engine
+    return engine
+
+
+def check_bet_limits(player, table, amount, vector=None):
+    """
+    Pass a bet through the process-wide risk engine, raising ValueError with the breach message if it is refused.
+    """
+    breach = _risk.place_bet(player, table, amount, vector) if _risk else None
+    if breach:
+        raise ValueError(breach["message"])
+
+
+def configure_risk_limits(arguments):
+    """
+    Apply --max-bet, --session-loss, --table-max-bet and --max-exposure N from the command line;
+    return the other arguments.
+    """
+    flags = {"--max-bet": "max_bet", "--session-loss": "session_loss", "--table-max-bet": "table_max_bet",
+             "--max-exposure": "max_exposure"}
+    limits = {}
+    rest = []
+    arguments = iter(arguments)
+    for argument in arguments:
+        if argument in flags:
+            limits[flags[argument]] = int(next(arguments, "0"))
+        else:
+            rest.append(argument)
+    if limits:
+        set_risk_engine(RiskEngine(RiskLimits(**limits)))
+    return rest
+
+
+# ------------------ Table Server ------------------
+
+class Player:
+    def __init__(self, name, ledger, chips=1000, writer=None):
         """
-        Display the hand of a player or dealer.
+        Initialize a connected player whose chips live in the ledger under their name, and their stream.
         """
-        cards = ", ".join([f"{card['value']} of {card['suit']}" for card in hand])
-        total = self.calculate_hand(hand)
-        print(f"{owner}'s hand: {cards} (Total: {total})")
+        self.name = name
+        self.ledger = ledger
+        self.ledger.open_account(name, chips)
+        self.writer = writer
+        self.table = None
 
-    def place_bet(self):
+    @property
+    def chips(self):
         """
-        Allow the player to place a bet and validate the amount.
+        The player's current balance in the ledger.
         """
-        while True:
-            print(f"You have {self.chips} chips.")
-            try:
-                bet = int(input("Place your bet: "))
-                if bet > self.chips or bet <= 0:
-                    print("Invalid bet amount. Try again.")
-                else:
-                    return bet
-            except ValueError:
-                print("Please enter a valid number.")
+        return self.ledger.balance(self.name)
 
-    def player_turn(self):
+    def bet(self, game, amount):
         """
-        Handle the player's turn to either hit or stand.
+        Take chips for a bet.
         """
-        while True:
-            self.show_hand(self.player_hand, "Player")
-            action = input("Do you want to 'hit' or 'stand'? ").lower()
-            if action == 'hit':
-                self.player_hand += self.draw_card(1)
-                if self.calculate_hand(self.player_hand) > 21:
-                    self.show_hand(self.player_hand, "Player")
-                    print("Bust! You've gone over 21.")
-                    return False
-            elif action == 'stand':
-                return True
-            else:
-                print("Invalid action. Please choose 'hit' or 'stand'.")
+        self.ledger.bet(self.name, game, amount)
 
-    def dealer_turn(self):
+    def pay(self, game, amount):
+        """
+        Pay chips to the player.
+        """
+        self.ledger.pay(self.name, game, amount)
+
+    def send(self, line):
+        """
+        Queue a line for the player without waiting on the network.
+        """
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.write((line + "\n").encode())
+
+
+class PlayerDirectory(dict):
+    def __init__(self, ledger, players=()):
+        """
+        Initialize a name -> player mapping for restoring tables, starting from players already connected.
+        """
+        super().__init__((player.name, player) for player in players)
+        self.ledger = ledger
+
+    def __missing__(self, name):
+        """
+        Recreate a player named in a snapshot without a connection; their chips are already in the ledger.
+        """
+        player = self[name] = Player(name, self.ledger, 0)
+        return player
+
+
+def parse_bet(args, chips):
+    """
+    Parse a bet amount argument and check it against the player's chips.
+    """
+    try:
+        bet = int(args[0])
+    except (IndexError, ValueError):
+        raise ValueError("Please enter a valid number.")
+    if bet > chips or bet <= 0:
+        raise ValueError("Invalid bet amount.")
+    return bet
+
+
+def hand_codes(cards):
+    """
+    Format integer cards as space-separated API codes, e.g. 'AS 0H'.
+    """
+    return " ".join(CARD_CODES[card] for card in cards)
+
+
+class BlackjackTable:
+    game = "blackjack"
+    max_seats = 7
+
+    def __init__(self, table_id, rng=None, rules=None):
+        """
+        Initialize a blackjack table where every seat plays its own hands against the dealer from one shoe.
+        """
+        self.table_id = table_id
+        self.name = f"{self.game} {table_id}"  # Label for risk limits and their breach events
+        self.rules = rules or get_blackjack_rules()
+        self.shoe = LocalShoe(deck_count=self.rules.decks, rng=rng)
+        self.seats = {}  # Player -> BlackjackCore holding that seat's hands
+
+    def join(self, player):
+        """
+        Seat a player with their own hands dealt from the table's shoe.
+        """
+        self.seats[player] = BlackjackCore(deck=self.shoe, rules=self.rules)
+
+    def leave(self, player, refund=False):
+        """
+        Remove a player and return the events that follow; a hand left in progress is forfeited, or its stake
+        given back if refund is set.
+        """
+        seat = self.seats.pop(player)
+        if seat.phase == "player":
+            returned = seat.staked if refund else 0
+            if refund:
+                player.pay(self.game, returned)
+            if _risk:
+                _risk.settle(player, seat.staked, returned)
+        return []
+
+    def settle_seat(self, player, state):
+        """
+        Pay a settled round and return its reply.
+        """
+        player.pay(self.game, state["payout"])
+        if _risk:
+            _risk.settle(player, state["staked"], state["payout"])
+        if _history:
+            _history.record(self.game, player, state["staked"], state["payout"])
+        return f"OK {('push', 'win', 'lose')[state['outcome']]} total {'/'.join(map(str, state['totals']))} " \
+               f"dealer {hand_codes(state['dealer'])} total {state['dealer_total']} chips {player.chips}"
+
+    def handle(self, player, command, args):
+        """
+        Apply a BET, HIT, STAND, DOUBLE, SPLIT or SURRENDER command and return (reply, events).
+        """
+        seat = self.seats[player]
+        if command == "BET":
+            if seat.phase == "player":
+                raise ValueError("Finish your current hand first.")
+            bet = parse_bet(args, player.chips)
+            check_bet_limits(player, self.name, bet)
+            player.bet(self.game, bet)
+            state, _ = seat.start_round(bet)
+            if state["phase"] == "settled":
+                return self.settle_seat(player, state), []
+            return f"OK hand {hand_codes(state['player'])} total {state['player_total']} " \
+                   f"dealer {CARD_CODES[state['dealer'][0]]}", []
+        if seat.phase != "player":
+            raise ValueError("Place a bet first.")
+        action = command.lower()
+        if action not in seat.ACTIONS:
+            raise ValueError(f"Unknown command {command}.")
+        if action not in seat.legal_actions():
+            raise ValueError(f"You cannot {action} now.")
+        if action in ("double", "split"):
+            extra = seat.bets[seat.active]
+            if extra > player.chips:
+                raise ValueError(f"You need {extra} more chips to {action}.")
+            check_bet_limits(player, self.name, extra)
+            player.bet(self.game, extra)
+        state, _ = seat.apply_action(action)
+        if state["phase"] == "settled":
+            return self.settle_seat(player, state), []
+        return f"OK hand {hand_codes(state['player'])} total {state['player_total']}", []
+
+    def snapshot(self):
+        """
+        Return the shoe and every seat's round as a binary record.
+        """
+        return b"".join([SNAPSHOT_HEADERS["blackjack_table"], pack_blob(self.shoe.snapshot()), pack_names(self.seats)]
+                        + [pack_blob(seat.snapshot(include_deck=False)) for seat in self.seats.values()])
+
+    def restore(self, data, players):
         """
-        Handle the dealer's turn, hitting until the total is at least 17.
+        Load a record written by snapshot() and return the table, seating players found by name in players.
         """
-        while self.calculate_hand(self.dealer_hand) < 17:
-            self.dealer_hand += self.draw_card(1)
+        shoe, offset = unpack_blob(data, read_snapshot_header(data, "blackjack_table"))
+        self.shoe.restore(shoe)
+        seated, offset = unpack_names(data, offset, players)
+        self.seats = {}
+        for player in seated:
+            seat, offset = unpack_blob(data, offset)
+            self.seats[player] = BlackjackCore(deck=self.shoe, rules=self.rules).restore(seat)
+        return self
 
-    def determine_winner(self, bet):
+
+class RouletteTable:
+    game = "roulette"
+    max_seats = 100
+
+    def __init__(self, table_id, rng=None):
         """
-        Determine the winner between player and dealer and adjust chips.
+        Initialize a roulette table where bets from every player are settled together on each spin.
         """
-        player_total = self.calculate_hand(self.player_hand)
-        dealer_total = self.calculate_hand(self.dealer_hand)
+        self.table_id = table_id
+        self.name = f"{self.game} {table_id}"  # Label for risk limits and their breach events
+        self.wheel = RouletteCore(rng=rng)
+        self.wheel.start_round()  # Amounts are taken from players when they bet
+        self.players = set()
 
-        self.show_hand(self.dealer_hand, "Dealer")
+    def join(self, player):
+        """
+        Seat a player at the wheel.
+        """
+        self.players.add(player)
 
-        if dealer_total > 21:
-            print("Dealer busts! You win!")
-            self.chips += bet
-        elif player_total > dealer_total:
-            print("Congratulations, you win!")
-            self.chips += bet
-        elif player_total < dealer_total:
-            print("Dealer wins. Better luck next time.")
-            self.chips -= bet
-        else:
-            print("It's a tie!")
+    def leave(self, player, refund=False):
+        """
+        Remove a player, give back their unsettled bets (refund or not) and return the events that follow.
+        """
+        staked = int(self.wheel.book.remove_player(player))
+        player.pay(self.game, staked)
+        self.players.discard(player)
+        if _risk:
+            _risk.settle(player, staked, staked)
+            _risk.clear_exposure(self.name, self.wheel.book.exposure())
+        return []
 
-    def play(self):
+    def handle(self, player, command, args):
         """
-        Play the Blackjack game, allowing the player to bet and take turns.
+        Apply a BET or SPIN command and return (reply, events).
         """
-        print("Welcome to Blackjack!")
-        while self.chips > 0:
-            bet = self.place_bet()
-            self.player_hand = self.draw_card(2)
-            self.dealer_hand = self.draw_card(2)
-            print(f"Dealer's first card: {self.dealer_hand[0]['value']} of {self.dealer_hand[0]['suit']}")
+        if command == "BET":
+            amount = parse_bet(args, player.chips)
+            bet_details = parse_roulette_bet(args[1:], self.wheel)
+            check_bet_limits(player, self.name, amount, self.wheel.payout_vector(bet_details))
+            self.wheel.apply_action("bet", player, bet_details, amount)
+            player.bet(self.game, amount)
+            return f"OK bet {amount} chips {player.chips}", []
+        if command == "SPIN":
+            state, settled = self.wheel.apply_action("spin")
+            events = []
+            for event in settled[1:]:
+                bettor = event["player"]
+                bettor.pay(self.game, event["returned"])
+                if _risk:
+                    _risk.settle(bettor, event["returned"] - event["payout"], event["returned"])
+                if bettor is not player:
+                    events.append((bettor, f"EVENT roulette result {state['result']} payout {event['payout']} "
+                                           f"chips {bettor.chips}"))
+            if _risk:
+                _risk.clear_exposure(self.name)
+            if _history:
+                _history.record_book(self.game, self.wheel.book, state["result"])
+            self.wheel.start_round()
+            return f"OK result {state['result']} chips {player.chips}", events
+        raise ValueError(f"Unknown command {command}.")
 
-            if self.player_turn():
-                self.dealer_turn()
+    def snapshot(self):
+        """
+        Return the players and the wheel's book of bets as a binary record.
+        """
+        return SNAPSHOT_HEADERS["roulette_table"] + pack_names(self.players) + self.wheel.snapshot()
 
-            self.determine_winner(bet)
+    def restore(self, data, players):
+        """
+        Load a record written by snapshot() and return the table, seating players found by name in players.
+        """
+        seated, offset = unpack_names(data, read_snapshot_header(data, "roulette_table"), players)
+        self.players = set(seated)
+        self.wheel.restore(data[offset:], players)
+        return self
 
-            if self.chips <= 0:
-                print("You're out of chips! Game over.")
-                break
-            else:
-                play_again = input("Do you want to play another round? (yes/no): ").lower()
-                if play_again != 'yes':
-                    print(f"You left the game with {self.chips} chips. Goodbye!")
-                    break
 
-# ------------------ Slot Machine Game ------------------
+class SlotTable:
+    game = "slots"
+    max_seats = 50
 
-class SlotMachine:
-    def __init__(self):
+    def __init__(self, table_id, rng=None):
         """
-        Initialize the slot machine with symbols, their values, and starting chips.
+        Initialize a bank of slot machines sharing one random stream.
         """
-        self.emojis = ["🍒", "🍋", "🍊", "🍉", "🍇", "⭐", "🔔", "🍀", "💎", "👑"]
-        self.values = {
-            "🍒": 10, "🍋": 20, "🍊": 30, "🍉": 50,
-            "🍇": 75, "⭐": 100, "🔔": 150, "🍀": 200,
-            "💎": 300, "👑": 500
-        }
-        self.chips = 500  # Starting chips for the player
+        self.table_id = table_id
+        self.name = f"{self.game} {table_id}"  # Label for risk limits and their breach events
+        self.machine = SlotCore(rng=rng)
+        self.players = set()
 
-    def spin(self):
+    def join(self, player):
         """
-        Simulate a spin of the slot machine by requesting three random numbers via the Random.org API.
+        Give a player a machine in the bank.
         """
-        base_url = "https://www.random.org/integers/"
-        params = {
-            "num": 3, "min": 0, "max": 9, "col": 1,
-            "base": 10, "format": "plain", "rnd": "new"
-        }
-        response = requests.get(base_url, params=params)
+        self.players.add(player)
 
-        if response.status_code == 200:
-            random_numbers = list(map(int, response.text.strip().split()))
-            return [self.emojis[number] for number in random_numbers]
-        else:
-            print("Could not retrieve random values. Please try again later.")
-            return ["❌", "❌", "❌"]  # Fallback in case of error
+    def leave(self, player, refund=False):
+        """
+        Free the player's machine and return the events that follow; spins settle at once, so refund has no effect.
+        """
+        self.players.discard(player)
+        return []
 
-    def calculate_payout(self, result, bet):
+    def handle(self, player, command, args):
         """
-        Calculate the payout based on the spin result.
+        Apply a SPIN command and return (reply, events).
         """
-        if result[0] == result[1] == result[2]:
-            return self.values[result[0]] * bet
-        else:
-            return 0
+        if command != "SPIN":
+            raise ValueError(f"Unknown command {command}.")
+        bet = parse_bet(args, player.chips)
+        if bet * len(self.machine.paylines) > player.chips:
+            raise ValueError("Invalid bet amount.")
+        check_bet_limits(player, self.name, bet * len(self.machine.paylines))
+        player.bet(self.game, bet * len(self.machine.paylines))
+        state, events = self.machine.start_round(bet)
+        player.pay(self.game, events[-1]["returned"])
+        if _risk:
+            _risk.settle(player, bet * len(self.machine.paylines), events[-1]["returned"])
+        if _history:
+            _history.record(self.game, player, bet * len(self.machine.paylines), events[-1]["returned"], "spin")
+        return f"OK result {' / '.join(' '.join(row) for row in state['window'])} " \
+               f"payout {state['payout']} chips {player.chips}", []
 
-    def place_bet(self):
+    def snapshot(self):
         """
-        Allow the player to place a bet and validate the amount.
+        Return the players and the last spin as a binary record.
         """
-        while True:
-            print(f"You have {self.chips} chips.")
-            try:
-                bet = int(input("Place your bet: "))
-                if bet > self.chips or bet <= 0:
-                    print("Invalid bet amount. Please try again.")
-                else:
-                    return bet
-            except ValueError:
-                print("Please enter a valid number.")
+        return SNAPSHOT_HEADERS["slot_table"] + pack_names(self.players) + self.machine.snapshot()
 
-    def play(self):
+    def restore(self, data, players):
         """
-        Play the slot machine, allowing the player to place bets and spin.
+        Load a record written by snapshot() and return the table, seating players found by name in players.
         """
-        print("Welcome to the Slot Machine!")
-        while self.chips > 0:
-            bet = self.place_bet()
-            result = self.spin()
-            print(f"Result: {' | '.join(result)}")
+        seated, offset = unpack_names(data, read_snapshot_header(data, "slot_table"), players)
+        self.players = set(seated)
+        self.machine.restore(data[offset:])
+        return self
 
-            payout = self.calculate_payout(result, bet)
-            if payout > 0:
-                print(f"Congratulations! You won {payout} chips!")
-                self.chips += payout
-            else:
-                print("Sorry, you did not win this time.")
-                self.chips -= bet
 
-            if self.chips <= 0:
-                print("You have no chips left! Game over.")
-                break
-            else:
-                play_again = input("Do you want to spin again? (yes/no): ").lower()
-                if play_again != 'yes':
-                    print(f"You left the game with {self.chips} chips. Goodbye!")
-                    break
+HOLDEM_TABLE_RECORD = struct.Struct("<qqq")  # Small blind, big blind, hands played
+HOLDEM_COMMANDS = {"CHECK": "check", "CALL": "call", "FOLD": "fold", "BET": "bet", "RAISE": "raise"}
 
-# ------------------ Roulette Game ------------------
 
-def choose_bet_type():
-    """
-    Display the list of bet types and allow the player to choose one.
-    """
-    print("\nBet Types:")
-    print("1: Straight Bet (bet on a single number, 35:1 payout)")
-    print("2: Color Bet (bet on Red or Black, 1:1 payout)")
-    print("3: Odd/Even Bet (bet on Odd or Even numbers, 1:1 payout)")
-    print("4: Low/High Bet (bet on Low 1-18 or High 19-36, 1:1 payout)")
+class HoldemTable:
+    game = "holdem"
+    max_seats = 10
 
-    while True:
-        try:
-            choice = int(input("Choose a bet type (1-4): "))
-            if choice in [1, 2, 3, 4]:
-                return choice
-            else:
-                print("Invalid choice. Please choose a valid bet type.")
-        except ValueError:
-            print("Please enter a number between 1 and 4.")
+    def __init__(self, table_id, rng=None, small_blind=5, big_blind=10):
+        """
+        Initialize a no-limit hold'em table played on HoldemCore, with blinds, raises and side pots.
 
+        Each hand is dealt between the seated players with at least a big blind, in seat order, their stacks
+        being their chips. Chips are taken from a player as they go into the pot and paid back when it is won.
+        """
+        self.table_id = table_id
+        self.name = f"{self.game} {table_id}"  # Label for risk limits and their breach events
+        self.core = HoldemCore(LocalShoe(deck_count=1, penetration=1.0, rng=rng), small_blind, big_blind)
+        self.seats = []
+        self.dealt = []  # Players in the hand in progress, indexed like its seats; kept after they leave
+        self.stakes = {}  # Player -> chips staked this hand, for players still seated in it
+        self.hands_played = 0  # Moves the button one dealt seat per hand
 
-class RouletteGame:
-    def __init__(self):
+    def join(self, player):
         """
-        Initialize the Roulette game with starting chips and red/black numbers.
+        Seat a player; they are dealt in from the next hand.
         """
-        self.chips = 1000
-        self.red_numbers = {1, 3, 5, 7, 9, 12, 14, 16, 18, 19, 21, 23, 25, 27, 30, 32, 34, 36}
-        self.black_numbers = {2, 4, 6, 8, 10, 11, 13, 15, 17, 20, 22, 24, 26, 28, 29, 31, 33, 35}
+        self.seats.append(player)
 
-    def spin_wheel(self):
+    def leave(self, player, refund=False):
         """
-        Simulate a spin of the roulette wheel.
+        Remove a player and return the events that follow. A hand in progress is folded for them, or called off
+        with every stake given back if refund is set; if they are all in, they are still paid what they win.
         """
-        return random.randint(0, 36)
+        self.seats.remove(player)
+        if player not in self.stakes:
+            return []
+        hand = self.core.hand
+        if refund:
+            for seat, dealt in enumerate(self.dealt):
+                dealt.pay(self.game, hand.committed[seat])
+                if dealt in self.stakes:
+                    self.settle_wager(dealt, hand.committed[seat])
+            self.core.hand, self.dealt, self.stakes = None, [], {}
+            return self.broadcast("EVENT holdem called_off")
+        stake = self.stakes.pop(player)
+        if _risk:
+            _risk.settle(player, stake, 0)
+        return self.fold_departed()
 
-    def place_bet(self):
+    def settle_wager(self, player, returned):
         """
-        Allow the player to place a bet and validate the amount.
+        Close a player's part in the hand, recording what they staked and got back.
         """
-        while True:
-            print(f"You have {self.chips} chips.")
+        stake = self.stakes.pop(player)
+        if _risk:
+            _risk.settle(player, stake, returned)
+        if _history:
+            _history.record(self.game, player, stake, returned)
+
+    def broadcast(self, line, skip=None):
+        """
+        Return events sending a line to every seated player except skip.
+        """
+        return [(seat, line) for seat in self.seats if seat is not skip]
+
+    def handle(self, player, command, args):
+        """
+        Apply a DEAL, CHECK, CALL, FOLD, BET <total> or RAISE <total> command and return (reply, events).
+        """
+        if command == "DEAL":
+            return self.deal(player)
+        if command not in HOLDEM_COMMANDS:
+            raise ValueError(f"Unknown command {command}.")
+        hand = self.core.hand
+        if self.core.phase != "betting" or self.dealt[hand.to_act] is not player:
+            raise ValueError("It is not your turn.")
+        action = HOLDEM_COMMANDS[command]
+        actions = self.core.legal_actions()
+        if action not in actions:
+            raise ValueError(f"You cannot {action} now; you may {' or '.join(actions)}.")
+        seat = hand.to_act
+        amount = 0
+        if action in ("bet", "raise"):
             try:
-                bet = int(input("Place your bet amount: "))
-                if bet > self.chips or bet <= 0:
-                    print("Invalid bet amount. Try again.")
-                else:
-                    return bet
-            except ValueError:
-                print("Please enter a valid number.")
+                amount = int(args[0])
+            except (IndexError, ValueError):
+                raise ValueError(f"Usage: {command} <total to {action} to>.")
+            low, high = actions[action]
+            if not low <= amount <= high:
+                raise ValueError(f"{action.capitalize()} to between {low} and {high}.")
+            chips = amount - hand.street_bets[seat]
+        else:
+            chips = actions.get("call", 0) if action == "call" else 0
+        if chips:
+            check_bet_limits(player, self.name, chips)
+        events = self.apply(self.core.apply_action(action, amount)[1], skip=player)
+        return f"OK {action} chips {player.chips}", events + self.fold_departed()
 
-    def get_bet_details(self, choice):
+    def deal(self, player):
         """
-        Get the specific details for the selected bet type.
+        Deal a hand between the seated players with at least a big blind and return (reply, events).
         """
-        if choice == 1:
-            while True:
-                try:
-                    number = int(input("Enter a number to bet on (0-36): "))
-                    if 0 <= number <= 36:
-                        return {"type": "straight", "number": number}
-                    else:
-                        print("Invalid number. Please choose a number between 0 and 36.")
-                except ValueError:
-                    print("Please enter a valid number.")
-        elif choice == 2:
-            color = input("Enter 'red' or 'black': ").lower()
-            if color in ["red", "black"]:
-                return {"type": "color", "color": color}
-            else:
-                print("Invalid color. Please choose 'red' or 'black'.")
-                return self.get_bet_details(choice)
-        elif choice == 3:
-            odd_even = input("Enter 'odd' or 'even': ").lower()
-            if odd_even in ["odd", "even"]:
-                return {"type": "odd_even", "odd_even": odd_even}
-            else:
-                print("Invalid choice. Please choose 'odd' or 'even'.")
-                return self.get_bet_details(choice)
-        elif choice == 4:
-            low_high = input("Enter 'low' (1-18) or 'high' (19-36): ").lower()
-            if low_high in ["low", "high"]:
-                return {"type": "low_high", "low_high": low_high}
-            else:
-                print("Invalid choice. Please choose 'low' or 'high'.")
-                return self.get_bet_details(choice)
+        if self.core.phase == "betting":
+            raise ValueError("A hand is already in progress.")
+        big_blind = self.core.big_blind
+        dealt = [seat for seat in self.seats if seat.chips >= big_blind]
+        events = []
+        if _risk:  # Players whose limits refuse a big blind sit the hand out
+            breaches = {seat: _risk.place_bet(seat, self.name, big_blind) for seat in dealt}
+            events += [(seat, f"EVENT holdem sitout {breach['message']}") for seat, breach in breaches.items()
+                       if breach]
+            dealt = [seat for seat in dealt if not breaches[seat]]
+            if len(dealt) < 2:
+                for seat in dealt:
+                    _risk.settle(seat, big_blind, big_blind)
+        if len(dealt) < 2:
+            raise ValueError("At least two players with enough chips are needed.")
+        self.dealt = dealt
+        self.stakes = dict.fromkeys(dealt, 0)
+        state, core_events = self.core.start_round([seat.chips for seat in dealt], self.hands_played % len(dealt))
+        self.hands_played += 1
+        hand = self.core.hand
+        for seat, dealt_player in enumerate(dealt):
+            events.append((dealt_player, f"EVENT holdem hole {hand_codes(hand.hole(seat))}"))
+            if _risk:  # Keep the part of the checked big blind each player actually posted
+                unposted = big_blind - hand.committed[seat]
+                _risk.settle(dealt_player, unposted, unposted)
+        return "OK dealt", events + self.apply(core_events)
 
-    def determine_payout(self, result, bet_details, bet_amount):
+    def apply(self, core_events, skip=None):
         """
-        Determine the payout based on the result and the bet placed.
+        Move the chips behind core events between the ledger and the pot, and return them as events for the
+        seated players; the acting player, skip, is sent the reply rather than their own action.
         """
-        if bet_details["type"] == "straight":
-            if result == bet_details["number"]:
-                return bet_amount * 35
-        elif bet_details["type"] == "color":
-            if (bet_details["color"] == "red" and result in self.red_numbers) or \
-                    (bet_details["color"] == "black" and result in self.black_numbers):
-                return bet_amount
-        elif bet_details["type"] == "odd_even":
-            if (bet_details["odd_even"] == "odd" and result % 2 != 0 and result != 0) or \
-                    (bet_details["odd_even"] == "even" and result % 2 == 0 and result != 0):
-                return bet_amount
-        elif bet_details["type"] == "low_high":
-            if (bet_details["low_high"] == "low" and 1 <= result <= 18) or \
-                    (bet_details["low_high"] == "high" and 19 <= result <= 36):
-                return bet_amount
-
-        return -bet_amount
+        hand = self.core.hand
+        events = []
+        for event in core_events:
+            kind = event["event"]
+            if kind == "deal":
+                for seat, player in enumerate(self.dealt):
+                    self.take(player, hand.committed[seat])  # The blinds
+                events += self.broadcast(f"EVENT holdem deal button {self.dealt[hand.button].name} "
+                                         f"blinds {event['small_blind']}/{event['big_blind']}")
+            elif kind == "action":
+                player = self.dealt[event["seat"]]
+                self.take(player, hand.committed[event["seat"]])
+                to = f" to {event['to']}" if event["action"] in ("bet", "raise") else ""
+                events += self.broadcast(f"EVENT holdem {event['action']} {player.name}{to}", skip=skip)
+            elif kind == "street":
+                events += self.broadcast(f"EVENT holdem street {event['street']} {hand_codes(event['board'])}")
+            elif kind == "showdown":
+                evaluator = get_hand_evaluator()
+                for seat, value in event["values"].items():
+                    events += self.broadcast(f"EVENT holdem shows {self.dealt[seat].name} "
+                                             f"{hand_codes(hand.hole(seat))} "
+                                             f"{evaluator.category(value).replace(' ', '_')}")
+            elif kind == "settle":
+                events += self.settle_hand(event["payouts"])
+        if self.core.phase == "betting":
+            events += self.broadcast(f"EVENT holdem turn {self.dealt[hand.to_act].name} "
+                                     f"{format_holdem_actions(self.core.legal_actions())}")
+        return events
 
-    def play(self):
+    def take(self, player, committed):
         """
-        Play the Roulette game, allowing the player to place and resolve bets.
+        Take the chips a player has put in the pot since the last call, given their total in it so far.
         """
-        print("Welcome to the Roulette Game!")
-        while self.chips > 0:
-            bet_amount = self.place_bet()
-            bet_type = choose_bet_type()
-            bet_details = self.get_bet_details(bet_type)
-            result = self.spin_wheel()
-            print(f"\nThe ball landed on: {result}")
+        if player in self.stakes:
+            chips = committed - self.stakes[player]
+            if chips:
+                player.bet(self.game, chips)
+                self.stakes[player] = committed
 
-            payout = self.determine_payout(result, bet_details, bet_amount)
-            if payout > 0:
-                print(f"Congratulations! You won {payout} chips!")
-                self.chips += payout
-            else:
-                print("Sorry, you lost.")
-                self.chips += payout
+    def settle_hand(self, payouts):
+        """
+        Pay every dealt player what they won, close their wagers and return the result event.
+        """
+        hand = self.core.hand
+        for seat, player in enumerate(self.dealt):
+            if payouts[seat]:
+                player.pay(self.game, payouts[seat])
+            if player in self.stakes:
+                self.settle_wager(player, payouts[seat])
+            elif _history:  # Left during the hand; their risk counters were closed then
+                _history.record(self.game, player, hand.committed[seat], payouts[seat])
+        won = " ".join(f"{self.dealt[seat].name}:{payout}" for seat, payout in enumerate(payouts) if payout)
+        return self.broadcast(f"EVENT holdem won pot {hand.pot} {won}")
 
-            print(f"You have {self.chips} chips remaining.")
-            if self.chips <= 0:
-                print("You're out of chips! Game over.")
-                break
-            else:
-                play_again = input("Do you want to play another round? (yes/no): ").lower()
-                if play_again != 'yes':
-                    print(f"You left the game with {self.chips} chips. Goodbye!")
-                    break
+    def fold_departed(self):
+        """
+        Fold for players who have left while the turn is theirs, and return the events that follow.
+        """
+        events = []
+        while self.core.phase == "betting" and self.dealt[self.core.hand.to_act] not in self.stakes:
+            events += self.apply(self.core.apply_action("fold")[1])
+        return events
 
-# ------------------ Texas Hold'em Poker Game ------------------
+    def snapshot(self):
+        """
+        Return the seats, the players dealt in, their stakes and the core's hand and deck as a binary record.
+        """
+        return b"".join((SNAPSHOT_HEADERS["holdem_table"],
+                         HOLDEM_TABLE_RECORD.pack(self.core.small_blind, self.core.big_blind, self.hands_played),
+                         pack_names(self.seats), pack_names(self.dealt),
+                         array('q', (self.stakes.get(player, -1) for player in self.dealt)).tobytes(),
+                         self.core.snapshot()))
+
+    def restore(self, data, players):
+        """
+        Load a record written by snapshot() and return the table, seating players found by name in players.
+        """
+        offset = read_snapshot_header(data, "holdem_table")
+        self.core.small_blind, self.core.big_blind, self.hands_played = HOLDEM_TABLE_RECORD.unpack_from(data, offset)
+        self.seats, offset = unpack_names(data, offset + HOLDEM_TABLE_RECORD.size, players)
+        self.dealt, offset = unpack_names(data, offset, players)
+        stakes = array('q', data[offset:offset + 8 * len(self.dealt)])
+        self.stakes = {player: stake for player, stake in zip(self.dealt, stakes) if stake >= 0}
+        self.core.restore(data[offset + 8 * len(self.dealt):])
+        return self
 
-def get_card_value(card):
+
+def format_holdem_actions(actions):
     """
-    Convert card values to numeric values for comparison.
+    Format legal hold'em actions for the protocol, e.g. 'fold call 10 raise 20-990'.
     """
-    if card['value'] in ['JACK', 'QUEEN', 'KING']:
-        return 10
-    elif card['value'] == 'ACE':
-        return 11
-    else:
-        return int(card['value'])
+    return " ".join(action if action in ("fold", "check") else
+                    f"{action} {limits}" if action == "call" else f"{action} {limits[0]}-{limits[1]}"
+                    for action, limits in actions.items())
 
 
-class TexasHoldemPoker:
-    def __init__(self):
+SERVER_RECORD = struct.Struct("<II")  # Players seen, tables
+
+
+class TableServer:
+    TABLE_TYPES = {table.game: table for table in (BlackjackTable, RouletteTable, SlotTable, HoldemTable)}
+
+    def __init__(self, host="127.0.0.1", port=8765, starting_chips=1000, ledger=None, rng=None):
         """
-        Initialize the Texas Hold'em Poker game with a shuffled deck and initial chips.
+        Initialize an asyncio server hosting any number of tables of every game in one process.
         """
-        self.base_url = "https://deckofcardsapi.com/api/deck/"
-        self.deck_id = self.get_new_deck()  # Get a new shuffled deck ID
-        self.community_cards = []  # Cards on the table
-        self.players = {
-            "Player 1": {"hand": [], "chips": 1000, "current_bet": 0},
-            "Player 2": {"hand": [], "chips": 1000, "current_bet": 0}
-        }
-        self.pot = 0  # Initialize the pot
+        self.host = host
+        self.port = port
+        self.starting_chips = starting_chips
+        self.ledger = ledger or get_chip_ledger()
+        self.rng = rng or get_random_source()  # Tables draw from independent streams spawned from this
+        self.tables = {}  # (game, table_id) -> table
+        self.players_seen = 0
+        self.server = None
 
-    def get_new_deck(self):
+    async def start(self):
         """
-        Get a new shuffled deck using the API.
+        Start listening; with port 0 the chosen port is stored in self.port.
         """
-        response = requests.get(f"{self.base_url}new/shuffle/?deck_count=1")
-        deck_data = response.json()
-        return deck_data['deck_id']
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port,
+                                                 limit=4096, backlog=4096)
+        self.port = self.server.sockets[0].getsockname()[1]
 
-    def draw_cards(self, count=1):
+    async def close(self):
         """
-        Draw a specified number of cards from the deck.
+        Stop listening and wait for open connections to finish.
+        """
+        self.server.close()
+        await self.server.wait_closed()
+
+    def find_table(self, game, table_id=None):
         """
-        response = requests.get(f"{self.base_url}{self.deck_id}/draw/?count={count}")
-        return response.json()['cards']
+        Return the requested table, or the first one of that game with a free seat, creating it if needed.
+        """
+        if game not in self.TABLE_TYPES:
+            raise ValueError(f"Unknown game {game}.")
+        table_type = self.TABLE_TYPES[game]
+        if table_id is None:
+            table_id = 1
+            while (game, table_id) in self.tables and self.seated(self.tables[game, table_id]) >= table_type.max_seats:
+                table_id += 1
+        if (game, table_id) not in self.tables:
+            self.tables[game, table_id] = table_type(table_id, self.rng.spawn(1)[0])  # Each table gets its own stream
+        table = self.tables[game, table_id]
+        if self.seated(table) >= table_type.max_seats:
+            raise ValueError("That table is full.")
+        return table
+
+    @staticmethod
+    def seated(table):
+        """
+        Number of players seated at a table.
+        """
+        return len(getattr(table, "seats", None) or getattr(table, "players", ()))
 
-    def deal_hole_cards(self):
+    def checkpoint(self):
         """
-        Deal two cards to each player.
+        Return every table as one binary record, for restore() after a crash or in another worker process.
         """
-        for player in self.players:
-            self.players[player]["hand"] = self.draw_cards(2)
+        started = time.perf_counter()
+        data = b"".join([SNAPSHOT_HEADERS["table_server"], SERVER_RECORD.pack(self.players_seen, len(self.tables))]
+                        + [pack_blob(game.encode()) + BLOB_LENGTH.pack(table_id) + pack_blob(table.snapshot())
+                           for (game, table_id), table in self.tables.items()])
+        if _metrics:
+            _metrics.observe("checkpoint_seconds", time.perf_counter() - started)
+            _metrics.gauge("checkpoint_bytes", len(data))
+        return data
 
-    def deal_flop(self):
+    def restore(self, data, players=()):
         """
-        Deal the Flop (3 community cards).
+        Rebuild the tables saved by checkpoint() and return a PlayerDirectory of everyone seated at them.
+
+        Seated players are looked up among the connected players given; anyone else comes back without
+        a connection, to be handed one or to leave their table.
         """
-        self.community_cards = self.draw_cards(3)
+        offset = read_snapshot_header(data, "table_server")
+        players_seen, count = SERVER_RECORD.unpack_from(data, offset)
+        offset += SERVER_RECORD.size
+        self.players_seen = max(self.players_seen, players_seen)  # New connections must not reuse a saved name
+        directory = PlayerDirectory(self.ledger, players)
+        for _ in range(count):
+            game, offset = unpack_blob(data, offset)
+            (table_id,) = BLOB_LENGTH.unpack_from(data, offset)
+            record, offset = unpack_blob(data, offset + BLOB_LENGTH.size)
+            game = bytes(game).decode()
+            if game not in self.TABLE_TYPES:
+                raise ValueError(f"Unknown game {game}.")
+            table = self.TABLE_TYPES[game](table_id, self.rng.spawn(1)[0]).restore(record, directory)
+            self.tables[game, table_id] = table
+            for player in getattr(table, "seats", None) or getattr(table, "players", ()):
+                player.table = table
+        return directory
 
-    def deal_turn(self):
+    def save_checkpoint(self, path):
         """
-        Deal the Turn (1 additional community card).
+        Write a checkpoint to path, replacing the previous one only once it is complete.
         """
-        self.community_cards += self.draw_cards(1)
+        with open(path + ".tmp", "wb") as file:
+            file.write(self.checkpoint())
+        os.replace(path + ".tmp", path)
 
-    def deal_river(self):
+    async def checkpoint_every(self, path, interval=1.0):
         """
-        Deal the River (1 additional community card).
+        Save a checkpoint to path every interval seconds until cancelled.
         """
-        self.community_cards += self.draw_cards(1)
+        while True:
+            await asyncio.sleep(interval)
+            self.save_checkpoint(path)
 
-    def display_cards(self):
+    def dispatch(self, player, words):
         """
-        Display the players' hands and community cards.
+        Apply one command line from a player and return (reply, events) without touching the network.
         """
-        for player, details in self.players.items():
-            hand = details["hand"]
-            print(f"{player} hand: {', '.join([f'{card['value']} of {card['suit']}' for card in hand])}")
-        print(f"Community cards: {', '.join([f'{card['value']} of {card['suit']}' for card in self.community_cards])}")
+        if not words:
+            raise ValueError("Empty command.")
+        command, args = words[0].upper(), words[1:]
+        if command == "JOIN":
+            if player.table is not None:
+                raise ValueError("Leave your current table first.")
+            table_id = int(args[1]) if len(args) > 1 and args[1].isdigit() else None
+            player.table = self.find_table(args[0].lower() if args else "", table_id)
+            player.table.join(player)
+            return f"OK joined {player.table.game} {player.table.table_id} chips {player.chips}", []
+        if command == "CHIPS":
+            return f"OK chips {player.chips}", []
+        if command in ("LEAVE", "QUIT"):
+            events = []
+            if player.table is not None:
+                events = player.table.leave(player)
+                player.table = None
+            return ("OK bye" if command == "QUIT" else f"OK left chips {player.chips}"), events
+        if player.table is None:
+            raise ValueError("Join a table first.")
+        return player.table.handle(player, command, args)
 
-    def compare_hands(self):
+    async def handle_connection(self, reader, writer):
         """
-        A simplified comparison of hands based on the highest card value.
+        Serve one client: read command lines, reply, and fan events out to other players.
         """
-        for player, details in self.players.items():
-            combined_hand = details["hand"] + self.community_cards
-            hand_values = [get_card_value(card) for card in combined_hand]
-            best_hand_value = max(hand_values)
-            self.players[player]["best_hand"] = best_hand_value  # Store the best hand value
+        self.players_seen += 1
+        player = Player(f"player{self.players_seen}", self.ledger, self.starting_chips, writer)
+        player.send(f"OK welcome {player.name} chips {player.chips}")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                started = time.perf_counter()
+                try:
+                    reply, events = self.dispatch(player, line.decode(errors="replace").split())
+                except ValueError as error:
+                    reply, events = f"ERR {error}", []
+                if _metrics:
+                    game = player.table.game if player.table is not None else "lobby"
+                    _metrics.observe("table_command_seconds", time.perf_counter() - started, game=game)
+                    if reply.startswith("ERR"):
+                        _metrics.inc("table_errors_total", game=game)
+                player.send(reply)
+                for target, event in events:
+                    target.send(event)
+                await writer.drain()
+                if reply == "OK bye":
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            if player.table is not None:
+                for target, event in player.table.leave(player):
+                    target.send(event)
+            if _risk:
+                _risk.end_session(player)
+            writer.close()
 
-        # Compare hands and determine the winner
-        player1_value = self.players["Player 1"]["best_hand"]
-        player2_value = self.players["Player 2"]["best_hand"]
 
-        if player1_value > player2_value:
-            print("Player 1 wins!")
-            self.players["Player 1"]["chips"] += self.pot
-        elif player2_value > player1_value:
-            print("Player 2 wins!")
-            self.players["Player 2"]["chips"] += self.pot
-        else:
-            print("It's a tie!")
-            # Split the pot if it's a tie
-            self.players["Player 1"]["chips"] += self.pot // 2
-            self.players["Player 2"]["chips"] += self.pot // 2
+LOAD_TEST_SCRIPTS = {
+    "slots": ["SPIN 1"],
+    "roulette": ["BET 1 color red", "SPIN"],
+    "blackjack": ["BET 1", "STAND"],
+}
+
+
+async def load_test_client(host, port, game, rounds, latencies):
+    """
+    Connect one simulated player, play rounds of a game and record the latency of every command.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    await reader.readline()  # Welcome line
+
+    async def command(line):
+        start = time.perf_counter()
+        writer.write((line + "\n").encode())
+        reply = b"EVENT"
+        while reply.startswith(b"EVENT"):
+            reply = await reader.readline()
+        latencies.append(time.perf_counter() - start)
+        return reply
+
+    await command(f"JOIN {game}")
+    for _ in range(rounds):
+        for line in LOAD_TEST_SCRIPTS[game]:
+            await command(line)
+    await command("QUIT")
+    writer.close()
+
+
+async def run_load_test(clients=1000, rounds=20, game="slots", ledger=None):
+    """
+    Run a TableServer on localhost against many simulated clients and return throughput and latency figures.
+
+    Bets go to a throwaway in-memory ledger unless one is given.
+    """
+    server = TableServer(port=0, ledger=ledger or ChipLedger(":memory:"))
+    await server.start()
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(load_test_client(server.host, server.port, game, rounds, latencies)
+                           for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    await server.close()
+    server.ledger.flush()
+    latencies.sort()
+    return {"clients": clients, "commands": len(latencies), "commands_per_sec": len(latencies) / elapsed,
+            "p50_ms": latencies[len(latencies) // 2] * 1000, "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000}
+
+
+async def serve_tables(port=8765, checkpoint=None, interval=1.0):
+    """
+    Run the table server until interrupted, checkpointing its tables to a file every interval seconds if given one.
+
+    An existing checkpoint is restored first. The players seated in it lost their connections with the
+    old process, so they leave their tables with any open bets and hands refunded.
+    """
+    server = TableServer(port=port)
+    if checkpoint and os.path.exists(checkpoint):
+        with open(checkpoint, "rb") as file:
+            players = server.restore(file.read())
+        for player in players.values():
+            player.table.leave(player, refund=True)
+            player.table = None
+        print(f"Restored {len(server.tables)} tables from {checkpoint}")
+    await server.start()
+    print(f"PyPop Casino tables listening on {server.host}:{server.port}")
+    checkpoints = asyncio.ensure_future(server.checkpoint_every(checkpoint, interval)) if checkpoint else None
+    try:
+        await server.server.serve_forever()
+    finally:
+        if checkpoints:
+            checkpoints.cancel()
+
+
+# ------------------ Benchmarks ------------------
+
+BENCHMARK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks.json")  # Tracked baselines
+
 
-        self.pot = 0  # Reset the pot after determining the winner
+def time_to_prompts(command, prompts, answer):
+    """
+    Start command, return the seconds until each of prompts appears on its output, then answer and wait for exit.
+    """
+    import subprocess
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b""
+    elapsed = []
+    for prompt in prompts:
+        while prompt not in output:
+            chunk = os.read(process.stdout.fileno(), 4096)
+            if not chunk:
+                raise RuntimeError(f"{command} exited before showing {prompt!r}.")
+            output += chunk
+        elapsed.append(time.perf_counter() - start)
+    process.communicate(answer)
+    return elapsed
+
+
+def startup_benchmark(runs=15):
+    """
+    Measure interpreter start, script import and the first menu prompt, as medians in ms from process start.
+
+    The import and the first prompt are timed in the same process, so the prompt always includes the import.
+    """
+    script = os.path.abspath(__file__)
+    load = f"import runpy; casino = runpy.run_path({script!r}, run_name='benchmark'); print('loaded', flush=True); " \
+           "casino['casino_main']()"
+    samples = {"interpreter_ms": [], "import_ms": [], "first_prompt_ms": []}
+    for _ in range(runs):
+        samples["interpreter_ms"] += time_to_prompts([sys.executable, "-c", "print('ready')"], [b"ready"], b"")
+        loaded, prompted = time_to_prompts([sys.executable, "-c", load], [b"loaded", b"Please choose an option"],
+                                           b"5\n")
+        samples["import_ms"].append(loaded)
+        samples["first_prompt_ms"].append(prompted)
+    return {name: round(sorted(values)[len(values) // 2] * 1000, 1) for name, values in samples.items()}
 
-    def betting_round(self):
+
+def run_startup_benchmark(update=False, profile=None):
+    """
+    Print the startup benchmark next to the profile's baseline in benchmarks.json, and store it as the new
+    baseline if asked.
+
+    Returns 1 when there is no baseline to compare with and none is being recorded, so callers can fail on it.
+    """
+    baselines = load_baselines(profile)
+    results = startup_benchmark()
+    baseline = baselines.get("startup", {})
+    for name, value in results.items():
+        previous = baseline.get(name)
+        change = f" (baseline {previous} ms, {value - previous:+.1f} ms)" if previous is not None else ""
+        print(f"{name}: {value} ms{change}")
+    if update:
+        baselines["startup"] = results
+        save_baselines(baselines, profile)
+    elif not baseline:
+        print(f"No startup baseline for {benchmark_profile(profile)}; record one with --update.")
+        return 1
+    return 0
+
+
+class StubApiServer:
+    def __init__(self, latency=0.0):
         """
-        Conduct a betting round where both players can bet, call, raise, or fold.
+        Initialize a local stand-in for deckofcardsapi.com and random.org, answering on a free localhost port.
         """
-        # Reset current bets for both players
-        for player in self.players:
-            self.players[player]["current_bet"] = 0
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs, urlparse
 
-        highest_bet = 0  # Track the highest bet placed in this round
-
-        for player, details in self.players.items():
-            if details["chips"] <= 0:
-                print(f"{player} is out of chips and cannot bet.")
-                continue
+        rng = random.Random(0)
 
-            print(f"\n{player}'s turn. You have {details['chips']} chips.")
-            while True:
-                action = input("Do you want to 'call', 'raise', or 'fold'? ").lower()
-                if action == "call":
-                    call_amount = highest_bet - details["current_bet"]
-                    if details["chips"] >= call_amount:
-                        self.pot += call_amount
-                        details["chips"] -= call_amount
-                        details["current_bet"] += call_amount
-                        print(f"{player} calls {call_amount}.")
-                    else:
-                        self.pot += details["chips"]
-                        details["chips"] = 0
-                        details["current_bet"] += call_amount
-                        print(f"{player} goes all in with {call_amount}.")
-                    break
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real APIs
+            disable_nagle_algorithm = True  # Headers and body go out as separate writes
 
-                elif action == "raise":
-                    raise_amount = int(input("Enter the amount you want to raise: "))
-                    if raise_amount > details["chips"]:
-                        print("You do not have enough chips to raise that amount.")
-                    elif raise_amount + highest_bet > details["chips"]:
-                        print("You cannot raise more than your total chips.")
-                    else:
-                        self.pot += raise_amount + highest_bet - details["current_bet"]
-                        details["chips"] -= (raise_amount + highest_bet - details["current_bet"])
-                        details["current_bet"] = raise_amount + highest_bet
-                        highest_bet = details["current_bet"]
-                        print(f"{player} raises to {highest_bet}.")
-                        break
-
-                elif action == "fold":
-                    print(f"{player} folds.")
-                    details["folded"] = True
-                    return
+            def log_message(self, *args):
+                pass
 
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {name: values[0] for name, values in parse_qs(url.query).items()}
+                time.sleep(latency)
+                if url.path == "/integers/":
+                    numbers = [rng.randint(int(query["min"]), int(query["max"])) for _ in range(int(query["num"]))]
+                    body = "\n".join(map(str, numbers)).encode()
+                elif url.path.endswith("/shuffle/"):
+                    body = json.dumps({"success": True, "deck_id": "stub"}).encode()
                 else:
-                    print("Invalid action. Please choose 'call', 'raise', or 'fold'.")
+                    cards = [CARD_DICTS[rng.randrange(52)] for _ in range(int(query.get("count", 1)))]
+                    body = json.dumps({"success": True, "cards": cards}).encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
 
-    def play(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
         """
-        Play a simplified game of Texas Hold'em Poker with betting.
+        Stop the server.
         """
-        print("Welcome to Texas Hold'em Poker!")
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def benchmark_cases(stub_url):
+    """
+    Return {name: setup} for every benchmark; setup() returns (run, operations) where run() does that many operations.
+    """
+    rng = NumpySource(1)
+    evaluator = get_hand_evaluator()
+    client = HttpClient()
+
+    def calculate_hand():
+        hands = [rng.integers(0, 51, rng.randint(2, 5)) for _ in range(1000)]
+        return (lambda: [BlackjackGame.calculate_hand(hand) for hand in hands]), len(hands)
+
+    def determine_payout():
+        game = RouletteGame(rng=rng)
+        bets = [{"type": "straight", "number": 17}, {"type": "color", "color": "red"}, {"type": "dozen", "dozen": 2},
+                {"type": "corner", "numbers": [1, 2, 4, 5]}] * 250
+        results = rng.integers(0, 36, len(bets))
+        return (lambda: [game.determine_payout(result, bet, 10) for result, bet in zip(results, bets)]), len(bets)
+
+    def calculate_payout():
+        machine = SlotMachine(rng=rng, **FIVE_LINE_SLOT)
+        spins = [machine.spin() for _ in range(1000)]
+        return (lambda: [machine.calculate_payout(result, 1) for result in spins]), len(spins)
+
+    def compare_hands():
+        deals = [rng.permutation(52)[:9] for _ in range(1000)]  # Two hole hands and a board per deal
+        return (lambda: [evaluator.evaluate(deal[0:2] + deal[4:9]) > evaluator.evaluate(deal[2:4] + deal[4:9])
+                         for deal in deals]), len(deals)
+
+    def blackjack_round():
+        return (lambda: simulate_blackjack(2000, basic_strategy, seed=1)), 2000
+
+    def slots_round():
+        machine = SlotMachine(rng=NumpySource(2), **FIVE_LINE_SLOT)
+        return (lambda: [machine.net_payout(machine.spin(), 1) for _ in range(2000)]), 2000
 
-        # Deal hole cards to players
-        self.deal_hole_cards()
-        print("\nDealing hole cards...")
-        self.display_cards()
+    def roulette_round():
+        game = RouletteGame(rng=NumpySource(3))
+        bet = {"type": "color", "color": "red"}
 
-        # Pre-flop betting round
-        print("\nPre-flop betting round:")
-        self.betting_round()
+        def run():
+            for _ in range(1000):
+                book = RouletteBetBook(game)
+                book.add("player", bet, 10)
+                book.settle(game.spin_wheel())
+        return run, 1000
 
-        # Deal the Flop
-        print("\nDealing the Flop...")
-        self.deal_flop()
-        self.display_cards()
+    def holdem_round():
+        return (lambda: simulate_holdem_table(200, ("value", "passive", "random"), seed=4)), 200
 
-        # Post-flop betting round
-        print("\nPost-flop betting round:")
-        self.betting_round()
+    def local_shoe():
+        shoe = LocalShoe(deck_count=6, rng=NumpySource(5))
+        return (lambda: [shoe.draw(1) for _ in range(5000)]), 5000
 
-        # Deal the Turn
-        print("\nDealing the Turn...")
-        self.deal_turn()
-        self.display_cards()
+    def remote_deck():
+        deck = RemoteDeck(deck_count=6, client=client, base_url=f"{stub_url}/api/deck/")
+        return (lambda: [deck.draw(1) for _ in range(5000)]), 5000
 
-        # Post-turn betting round
-        print("\nPost-turn betting round:")
-        self.betting_round()
+    def pcg64_randint():
+        source = NumpySource(6)
+        return (lambda: [source.randint(0, 36) for _ in range(10000)]), 10000
 
-        # Deal the River
-        print("\nDealing the River...")
-        self.deal_river()
-        self.display_cards()
+    def system_randint():
+        source = SystemSource()
+        return (lambda: [source.randint(0, 36) for _ in range(10000)]), 10000
 
-        # Post-river betting round
-        print("\nPost-river betting round:")
-        self.betting_round()
+    def remote_integers():
+        pool = EntropyPool(0, RemoteSource.WORD_RANGE - 1,
+                           RandomOrgIntegers(0, RemoteSource.WORD_RANGE - 1, client=client, base_url=f"{stub_url}/integers/"),
+                           block_size=5000, low_water=2500)
+        source = RemoteSource(pool)
+        return (lambda: [source.randint(0, 36) for _ in range(2000)]), 2000
 
-        # Determine the winner after all community cards are dealt and betting is complete
-        print("\nComparing hands...")
-        self.compare_hands()
+    return {
+        "blackjack.calculate_hand": calculate_hand,
+        "roulette.determine_payout": determine_payout,
+        "slots.calculate_payout": calculate_payout,
+        "holdem.compare_hands": compare_hands,
+        "blackjack.round": blackjack_round,
+        "slots.round": slots_round,
+        "roulette.round": roulette_round,
+        "holdem.round": holdem_round,
+        "deck.local_shoe": local_shoe,
+        "deck.remote": remote_deck,
+        "rng.pcg64": pcg64_randint,
+        "rng.system": system_randint,
+        "rng.remote": remote_integers,
+    }
 
-        # Display the final chip counts for both players
-        print("\nFinal chip counts:")
-        for player, details in self.players.items():
-            print(f"{player}: {details['chips']} chips")
 
-        # Reset the deck and community cards for the next game
-        self.deck_id = self.get_new_deck()
-        self.community_cards = []
+def measure(setup, repeats=7, sample_time=0.05):
+    """
+    Time a benchmark case and trace its memory; return operations per second and allocated bytes per operation.
+
+    Each timing sample calls run() enough times to last about sample_time seconds; the best of repeats
+    samples is kept, as timeit does, since noise only ever makes a run slower.
+    """
+    import tracemalloc
+
+    run, operations = setup()
+    loops = max(1, int(sample_time / timed(run, 1)))  # The first call also warms caches and remote buffers
+    best = min(timed(run, loops) for _ in range(repeats)) / loops
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ops_per_sec": round(operations / best, 1), "bytes_per_op": round(peak / operations, 1)}
+
+
+def timed(run, loops):
+    """
+    Return the seconds loops calls of run take.
+    """
+    start = time.perf_counter()
+    for _ in range(loops):
+        run()
+    return time.perf_counter() - start
+
+
+def run_benchmarks(names=(), update=False, threshold=0.15, profile=None):
+    """
+    Run the benchmark suite against a local stub API, compare it with the profile's baseline and flag regressions.
+
+    A case regresses when its throughput falls more than threshold below the baseline. A case with no baseline
+    fails too, unless update records one. Returns the number of failed cases so callers can fail a build on it.
+    """
+    stub = StubApiServer()
+    cases = benchmark_cases(stub.base_url)
+    selected = [name for name in cases if not names or any(name.startswith(prefix) for prefix in names)]
+    baselines = load_baselines(profile)
+    baseline = baselines.get("benchmarks", {})
+    results = {}
+    regressions = 0
+    missing = 0 if update else sum(name not in baseline for name in selected)
+    print(f"{'benchmark':<28}{'ops/sec':>14}{'baseline':>14}{'change':>9}{'bytes/op':>11}")
+    for name in selected:
+        results[name] = measure(cases[name])
+        previous = baseline.get(name, {}).get("ops_per_sec")
+        change = results[name]["ops_per_sec"] / previous - 1 if previous else None
+        flag = ""
+        if change is not None and change < -threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{name:<28}{results[name]['ops_per_sec']:>14,.0f}{previous or 0:>14,.0f}"
+              f"{'' if change is None else f'{change:+.1%}':>9}{results[name]['bytes_per_op']:>11,.1f}{flag}")
+    stub.close()
+    if update:
+        baselines["benchmarks"] = {**baseline, **results}
+        save_baselines(baselines, profile)
+    print(f"{regressions} regression(s) past {threshold:.0%}.")
+    if missing:
+        print(f"{missing} case(s) have no baseline for {benchmark_profile(profile)}; record them with --update.")
+    return regressions + missing
+
+
+def benchmark_profile(profile=None):
+    """
+    Return the key baselines are kept under: the named profile if given, else the machine architecture,
+    Python implementation and minor version, e.g. 'x86_64 CPython 3.13'.
+    """
+    import platform
+
+    return profile or f"{platform.machine()} {platform.python_implementation()} " \
+                      f"{'.'.join(platform.python_version_tuple()[:2])}"
+
+
+def read_benchmark_file():
+    """
+    Return everything in benchmarks.json, or an empty dict if there is nothing yet.
+    """
+    try:
+        with open(BENCHMARK_FILE) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_baselines(profile=None):
+    """
+    Return the baselines benchmarks.json tracks for a profile, or an empty dict if there are none.
+    """
+    return read_benchmark_file().get("profiles", {}).get(benchmark_profile(profile), {})
+
+
+def save_baselines(baselines, profile=None):
+    """
+    Write a profile's baselines back to benchmarks.json, keeping those of other profiles.
+    """
+    tracked = read_benchmark_file()
+    tracked.setdefault("profiles", {})[benchmark_profile(profile)] = baselines
+    with open(BENCHMARK_FILE, "w") as file:
+        json.dump(tracked, file, indent=2, sort_keys=True)
+        file.write("\n")
+    print(f"Saved the baseline for {benchmark_profile(profile)} to {BENCHMARK_FILE}.")
+
 
 # ------------------ Casino Main Menu ------------------
 
@@ -621,7 +6241,11 @@ def casino_main():
 
         elif choice == "4":
             print("\nStarting Texas Hold'em Poker...")
-            game = TexasHoldemPoker()
+            seats = input("How many players (2-10)? ")
+            seats = int(seats) if seats.isdigit() and 2 <= int(seats) <= 10 else 2
+            bots = input(f"How many of them are bots (0-{seats - 1})? ")
+            bots = int(bots) if bots.isdigit() and int(bots) < seats else 0
+            game = TexasHoldemPoker(seats=seats, bots={seat: "value" for seat in range(seats - bots, seats)})
             game.play()
 
         elif choice == "5":
@@ -635,4 +6259,46 @@ def casino_main():
 # ------------------ Run the Casino App ------------------
 
 if __name__ == "__main__":
-    casino_main()
+    arguments = configure_blackjack_rules(configure_risk_limits(configure_history(configure_metrics(
+        configure_random_source(sys.argv[1:])))))
+    if arguments[:1] == ["serve"]:
+        port, rest = (int(arguments[1]), arguments[2:]) if arguments[1:2] and arguments[1].isdigit() \
+            else (8765, arguments[1:])
+        options = dict(zip(rest[::2], rest[1::2]))
+        asyncio.run(serve_tables(port, options.get("--checkpoint"), float(options.get("--checkpoint-interval", 1))))
+    elif arguments[:1] == ["count-edge"]:
+        options = dict(zip(arguments[1::2], arguments[2::2]))
+        run_count_analysis(int(options.get("--shoes", 10_000)), get_blackjack_rules().decks,
+                           float(options.get("--penetration", 0.75)), options.get("--system", "hi-lo"))
+    elif arguments[:1] == ["house-edge"]:
+        workers = arguments[arguments.index("--workers") + 1] if "--workers" in arguments else None
+        run_house_edge(workers=workers and int(workers))
+    elif arguments[:1] == ["tournament"]:
+        bots = [argument for argument in arguments[1:] if argument in HOLDEM_BOTS]
+        count = arguments[arguments.index("--tournaments") + 1] if "--tournaments" in arguments else 1000
+        run_tournaments(bots or ("passive", "random", "value"), int(count))
+    elif arguments[:1] == ["history"]:
+        top = arguments[arguments.index("--top") + 1] if "--top" in arguments else 10
+        print_history_report(arguments[1] if len(arguments) > 1 else "pypop-history", int(top))
+    elif arguments[:1] == ["preflop-table"]:
+        options = dict(zip(arguments[1::2], arguments[2::2]))
+        workers = options.get("--workers")
+        table = get_preflop_table().build(int(options.get("--opponents", 9)), int(options.get("--samples", 200_000)),
+                                          workers=workers and int(workers))
+        print(f"Saved preflop equity for {len(table.results)} hand classes to {table.path}")
+    elif arguments[:1] == ["bench-startup"]:
+        profile = arguments[arguments.index("--baseline-profile") + 1] if "--baseline-profile" in arguments else None
+        sys.exit(run_startup_benchmark(update="--update" in arguments, profile=profile))
+    elif arguments[:1] == ["bench"]:
+        names, threshold, profile, options = [], 0.15, None, iter(arguments[1:])
+        for option in options:
+            if option == "--threshold":
+                threshold = float(next(options))
+            elif option == "--baseline-profile":
+                profile = next(options)
+            elif option != "--update":
+                names.append(option)
+        sys.exit(1 if run_benchmarks(names, update="--update" in arguments, threshold=threshold, profile=profile)
+                 else 0)
+    else:
+        casino_main()
@@ -0,0 +1,839 @@
+import importlib.util
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+os.environ["HOME"] = tempfile.mkdtemp()  # Keep the chip ledger and cached tables out of the real home directory
+spec = importlib.util.spec_from_file_location("pypop", os.path.join(os.path.dirname(__file__), "PyPop_Casino_v0.1.py"))
+casino = importlib.util.module_from_spec(spec)
+sys.modules["pypop"] = casino  # Worker processes look functions up by module name
+spec.loader.exec_module(casino)
+
+
+# ------------------ Startup ------------------
+
+STARTUP = """
+import importlib.util, json, sys
+heavy = ("numpy", "requests", "asyncio", "sqlite3", "concurrent.futures")
+spec = importlib.util.spec_from_file_location("pypop", sys.argv[1])
+casino = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(casino)
+loaded = [[name for name in heavy if name in sys.modules]]
+games = [casino.BlackjackGame(), casino.TexasHoldemPoker(), casino.RouletteGame()]
+loaded.append([name for name in heavy if name in sys.modules])
+casino.SlotMachine()
+loaded.append([name for name in heavy if name in sys.modules] + [type(casino.np).__name__])
+print(json.dumps(loaded))
+"""
+
+
+def test_startup_defers_heavy_imports_until_a_game_needs_them(tmp_path):
+    """
+    Importing the script and building the card and roulette games loads no heavy module; the slot machine
+    loads NumPy on first use and the lazy proxy hands over to the real module.
+    """
+    started = subprocess.run([sys.executable, "-c", STARTUP, casino.__file__], capture_output=True, text=True,
+                             env={**os.environ, "HOME": str(tmp_path)}, check=True)
+    assert json.loads(started.stdout) == [[], [], ["numpy", "module"]]
+
+
+# ------------------ Metrics ------------------
+
+def test_metrics_count_game_paths_and_export_them(monkeypatch):
+    """
+    With a registry installed, deals, spins and payouts are counted and timed, and both the Prometheus
+    endpoint and StatsD packets carry them; with none installed nothing is recorded.
+    """
+    metrics = casino.Metrics()
+    monkeypatch.setattr(casino, "_metrics", metrics)
+    blackjack = casino.BlackjackCore(deck=casino.LocalShoe(rng=casino.NumpySource(18)))
+    slots = casino.SlotCore(rng=casino.NumpySource(18))
+    roulette = casino.RouletteCore(rng=casino.NumpySource(18))
+    for _ in range(10):
+        blackjack.start_round(10)
+        while blackjack.phase == "player":
+            blackjack.apply_action("stand")
+        slots.start_round(1)
+        roulette.start_round()
+        roulette.apply_action("bet", "p", {"type": "color", "color": "red"}, 1)
+        roulette.apply_action("spin")
+    assert metrics.counters["spins_total", (("game", "slots"),)] == 10
+    assert metrics.counters["spins_total", (("game", "roulette"),)] == 10
+    assert metrics.counters["cards_drawn_total", (("backend", "local"),)] >= 40
+    for game in ("blackjack", "slots", "roulette"):
+        assert metrics.histograms["payout_seconds", (("game", game),)][2] == 10
+
+    server = casino.MetricsServer(metrics, port=0)
+    try:
+        text = casino.requests.get(server.url, timeout=5).text
+    finally:
+        server.close()
+    assert "# TYPE pypop_payout_seconds histogram" in text.splitlines()
+    assert 'pypop_spins_total{game="slots"} 10' in text.splitlines()
+    assert 'pypop_payout_seconds_bucket{game="slots",le="+Inf"} 10' in text.splitlines()
+
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(5)
+    metrics.statsd = casino.StatsdExporter(port=receiver.getsockname()[1], interval=3600)
+    metrics.inc("spins_total", 3, game="slots")
+    metrics.inc("spins_total", 2, game="slots")
+    metrics.observe("payout_seconds", 0.002, game="slots")
+    metrics.statsd.close()
+    assert receiver.recv(2048).decode().splitlines() == ["pypop.spins_total.slots:5|c",
+                                                         "pypop.payout_seconds.slots:2|ms"]
+    receiver.close()
+
+    monkeypatch.setattr(casino, "_metrics", None)
+    slots.start_round(1)
+    assert metrics.counters["spins_total", (("game", "slots"),)] == 15
+
+
+# ------------------ Remote Backends ------------------
+
+@pytest.fixture
+def stub():
+    """
+    Run a local stand-in for the remote card and random number APIs.
+    """
+    server = casino.StubApiServer(latency=0.01)
+    yield server
+    server.close()
+
+
+def test_remote_deck_fetches_each_shoe_in_two_requests(stub):
+    """
+    A shoe costs one shuffle request and one draw request, however many cards are dealt from it.
+    """
+    client = casino.HttpClient()
+    deck = casino.RemoteDeck(deck_count=2, penetration=0.75, client=client, base_url=f"{stub.base_url}/api/deck/")
+    latencies = []
+    for shoe in range(1, 4):
+        deck.shuffle()
+        while not deck.needs_shuffle:
+            started = casino.time.perf_counter()
+            deck.draw(1)
+            latencies.append(casino.time.perf_counter() - started)
+        assert client.request_count == 2 * shoe
+    latencies.sort()
+    assert latencies[int(len(latencies) * 0.99)] < 0.01  # Draws come from the prefetched shoe, not the network
+
+
+def test_remote_deck_reshuffles_when_dry(stub):
+    """
+    Drawing past the end of the prefetched shoe reshuffles it with the same two requests.
+    """
+    client = casino.HttpClient()
+    deck = casino.RemoteDeck(deck_count=1, client=client, base_url=f"{stub.base_url}/api/deck/")
+    assert len(deck.draw(52)) == 52
+    assert client.request_count == 2
+    deck.draw(1)
+    assert client.request_count == 4
+
+
+def test_decks_refuse_to_deal_more_than_a_shoe(stub):
+    """
+    Local and remote shoes both deal every card of a shoe, and refuse a draw bigger than the shoe.
+    """
+    client = casino.HttpClient()
+    decks = [casino.LocalShoe(deck_count=1), casino.RemoteDeck(deck_count=1, client=client,
+                                                              base_url=f"{stub.base_url}/api/deck/")]
+    for deck in decks:
+        deck.draw(10)
+        assert len(deck.draw(52)) == 52  # Reshuffles rather than dealing the 42 left
+        with pytest.raises(ValueError):
+            deck.draw(53)
+
+
+def test_random_org_integers_fetch_one_request_per_block(stub):
+    """
+    Integers are bought block_size at a time, so small takes only hit the network once per block.
+    """
+    client = casino.HttpClient()
+    source = casino.RandomOrgIntegers(0, 36, block_size=100, client=client, base_url=f"{stub.base_url}/integers/")
+    numbers = []
+    for _ in range(100):
+        numbers += source.take(7)
+    assert client.request_count == 7  # 700 integers in blocks of 100
+    assert len(numbers) == 700 and all(0 <= number <= 36 for number in numbers)
+    assert len(source.take(250)) == 250  # A take bigger than a block is still one request
+    assert client.request_count == 8
+
+
+class ShortSource:
+    """
+    A remote integer source whose responses always come back malformed.
+    """
+    def fetch_block(self, count):
+        """
+        Fail the way RandomOrgIntegers.fetch_block does on a short response.
+        """
+        raise ValueError("random.org sent 3 integers for 1000 in [0, 36].")
+
+
+def test_entropy_pool_counts_malformed_refills_and_falls_back():
+    """
+    A malformed refill is counted as an error and cools down; takes meanwhile fall back to the local CSPRNG.
+    """
+    pool = casino.EntropyPool(0, 36, source=ShortSource(), retry_delay=60.0)
+    while pool.refilling:
+        casino.time.sleep(0.001)
+    assert pool.refill_errors == 1 and pool.next_refill > casino.time.monotonic()
+    numbers = pool.take(10)
+    assert len(numbers) == 10 and all(0 <= number <= 36 for number in numbers)
+    assert pool.stats() == {"depth": 0, "refills": 0, "refill_errors": 1, "fallbacks": 1}
+
+
+# ------------------ Random Sources ------------------
+
+def play_session(source):
+    """
+    Play blackjack, slots and roulette on child streams of a random source and return everything that happened.
+    """
+    shoe_rng, slot_rng, wheel_rng = source.spawn(3)
+    blackjack = casino.BlackjackCore(deck=casino.LocalShoe(rng=shoe_rng))
+    slots = casino.SlotCore(rng=slot_rng, **casino.FIVE_LINE_SLOT)
+    roulette = casino.RouletteCore(rng=wheel_rng)
+    events = []
+    for _ in range(50):
+        events += blackjack.start_round(10)[1]
+        while blackjack.phase == "player":
+            events += blackjack.apply_action(source.choice(blackjack.legal_actions()))[1]
+        events += slots.start_round(1)[1]
+        roulette.start_round()
+        roulette.apply_action("bet", "p", {"type": "straight", "number": source.randint(0, 36)}, 1)
+        events += roulette.apply_action("spin")[1]
+    return events, slots.spin_batch(1000, slot_rng).tolist()
+
+
+def test_replayed_draws_reproduce_the_recorded_rounds(tmp_path):
+    """
+    Replaying a saved log of an unseeded session, child streams included, plays exactly the same rounds.
+    """
+    recording = casino.RecordingSource(casino.NumpySource())
+    played = play_session(recording)
+    recording.save(tmp_path / "draws.jsonl")
+    assert play_session(casino.ReplaySource.load(tmp_path / "draws.jsonl")) == played
+    assert play_session(casino.NumpySource()) != played
+
+    replay = casino.ReplaySource.load(tmp_path / "draws.jsonl")
+    with pytest.raises(ValueError):
+        replay.permutation(52)  # The session's first root draw was a randint
+
+
+# ------------------ Hand Evaluator ------------------
+
+FIVE_CARD_CATEGORY_COUNTS = {"Straight Flush": 40, "Four of a Kind": 624, "Full House": 3744, "Flush": 5108,
+                             "Straight": 10200, "Three of a Kind": 54912, "Two Pair": 123552,
+                             "One Pair": 1098240, "High Card": 1302540}
+
+
+def reference_strength(cards):
+    """
+    Rank five cards by the textbook rules, independently of the evaluator's tables.
+    """
+    ranks = sorted((card >> 2 for card in cards), reverse=True)
+    flush = len({card & 3 for card in cards}) == 1
+    groups = sorted(((ranks.count(rank), rank) for rank in set(ranks)), reverse=True)
+    shape = [count for count, _ in groups]
+    ordered = [rank for _, rank in groups]
+    straight = None
+    if shape == [1] * 5 and ranks[0] - ranks[4] == 4:
+        straight = ranks[0]
+    elif ranks == [12, 3, 2, 1, 0]:
+        straight = 3
+    if straight is not None:
+        return (8 if flush else 4, [straight])
+    if flush:
+        return (5, ordered)
+    return ({(4, 1): 7, (3, 2): 6, (3, 1, 1): 3, (2, 2, 1): 2, (2, 1, 1, 1): 1}.get(tuple(shape), 0), ordered)
+
+
+@pytest.fixture(scope="module")
+def evaluator():
+    """
+    Build the hand evaluator once.
+    """
+    return casino.HandEvaluator()
+
+
+def test_every_five_card_hand(evaluator):
+    """
+    All 2,598,960 five card hands fall into the known category counts over exactly 7462 distinct values.
+    """
+    values = casino.np.fromiter((evaluator.evaluate(five) for five in casino.combinations(range(52), 5)),
+                                dtype=casino.np.uint16, count=2_598_960)
+    counts = casino.np.bincount(values, minlength=7463)
+    assert counts[0] == 0
+    assert casino.np.count_nonzero(counts) == 7462 and values.max() == 7462
+    categories = casino.Counter()
+    for value in casino.np.flatnonzero(counts):
+        categories[evaluator.category(value)] += int(counts[value])
+    assert categories == FIVE_CARD_CATEGORY_COUNTS
+
+
+def test_values_order_hands_like_the_rules(evaluator):
+    """
+    Comparing two hands by value agrees with the textbook ranking.
+    """
+    rng = casino.random.Random(4)
+    for _ in range(20_000):
+        first, second = rng.sample(range(52), 5), rng.sample(range(52), 5)
+        expected = (reference_strength(first) > reference_strength(second)) - \
+            (reference_strength(first) < reference_strength(second))
+        value_first, value_second = evaluator.evaluate(first), evaluator.evaluate(second)
+        assert (value_first > value_second) - (value_first < value_second) == expected
+
+
+def test_seven_card_hands_play_the_best_five(evaluator):
+    """
+    evaluate and evaluate_batch give seven cards the value of their best five card subset.
+    """
+    rng = casino.np.random.default_rng(7)
+    hands = casino.np.array([rng.permutation(52)[:7] for _ in range(20_000)])
+    batch = evaluator.evaluate_batch(hands)
+    for hand, batch_value in zip(hands.tolist(), batch.tolist()):
+        best = max(evaluator.evaluate(five) for five in casino.combinations(hand, 5))
+        assert evaluator.evaluate(hand) == best == batch_value
+
+
+# ------------------ Texas Hold'em ------------------
+
+def random_action(hand, rng):
+    """
+    Pick a random legal action for the seat to act, going all in often so short all-ins come up.
+    """
+    actions = hand.legal_actions()
+    action = rng.choice(sorted(actions))
+    if action in ("bet", "raise"):
+        low, high = actions[action]
+        return action, high if rng.random() < 0.3 else rng.randint(low, high)
+    return action, 0
+
+
+def test_holdem_hands_conserve_chips():
+    """
+    Random hands at random tables never create, lose or overdraw chips, and short all-ins do not reopen betting.
+    """
+    rng = casino.random.Random(14)
+    for _ in range(2000):
+        seats = rng.randint(2, 10)
+        stacks = [rng.choice((0, rng.randint(1, 40), rng.randint(40, 2000))) for _ in range(seats)]
+        if sum(stack > 0 for stack in stacks) < 2:
+            continue
+        deck = casino.LocalShoe(deck_count=1, penetration=1.0, rng=casino.random.Random(rng.random()))
+        button = rng.randrange(seats)
+        hand = casino.HoldemHand(stacks, button, 5, 10, deck)
+        live = [seat for seat in range(button, button + seats) if stacks[seat % seats] > 0]
+        blinds = [seat % seats for seat in (live[:2] if len(live) == 2 else live[1:3])]  # Small then big
+        assert [seat for seat in range(seats) if hand.committed[seat]] == sorted(blinds)
+        assert hand.committed[blinds[0]] == min(5, stacks[blinds[0]])
+        street, full_raise, acted_at = -1, 10, {}  # Size of the last full raise; seat -> bet it last acted on
+        while not hand.finished:
+            assert sum(hand.stacks) + hand.pot == sum(stacks)
+            assert min(hand.stacks) >= 0
+            if hand.street != street:
+                street, full_raise, acted_at = hand.street, 10, {}
+            seat = hand.to_act
+            if seat in acted_at and hand.current_bet - acted_at[seat] < full_raise:
+                assert not {"bet", "raise"} & set(hand.legal_actions())  # Only short all-ins since it acted
+            action, amount = random_action(hand, rng)
+            if action in ("bet", "raise"):
+                full_raise = max(full_raise, amount - hand.current_bet)
+            hand.act(action, amount)
+            acted_at[seat] = hand.current_bet
+        assert sum(hand.payouts) == hand.pot
+        assert sum(hand.stacks) == sum(stacks) and min(hand.stacks) >= 0
+
+
+def test_holdem_blinds_skip_an_empty_button():
+    """
+    When the button seat has no chips the blinds come from the seats that do, in heads-up order.
+    """
+    hand = casino.HoldemHand([0, 1000, 1000], 0, 5, 10, casino.LocalShoe(deck_count=1, penetration=1.0))
+    assert hand.committed.tolist() == [0, 5, 10] and hand.to_act == 1
+
+
+def test_holdem_short_all_in_does_not_reopen_betting():
+    """
+    A seat that raised is only allowed to call a later all-in smaller than a full raise.
+    """
+    hand = casino.HoldemHand([1000, 1000, 45], 0, 5, 10, casino.LocalShoe(deck_count=1, penetration=1.0))
+    hand.act("raise", 30)  # Seat 0 raises by a full 20
+    hand.act("call")
+    hand.act("raise", 45)  # The big blind's all in is 15 more, short of a full raise
+    assert hand.to_act == 0 and hand.legal_actions() == {"fold": 0, "call": 15}
+
+
+def test_preflop_table_is_seeded_and_read_only(tmp_path, monkeypatch):
+    """
+    The preflop table comes out the same on every build, queries never add to it, and table answers have
+    the same keys as computed ones.
+    """
+    first = casino.PreflopEquityTable(str(tmp_path / "first.json")).build(1, samples=2000, workers=1)
+    second = casino.PreflopEquityTable(str(tmp_path / "second.json")).build(1, samples=2000, workers=1)
+    assert first.results == second.results and len(first.results) == 169
+    assert casino.PreflopEquityTable(first.path).results == first.results
+    monkeypatch.setattr(casino, "_preflop_table", first)
+    cached = casino.holdem_equity([48, 44], opponents=1)
+    sampled = casino.holdem_equity([48, 44], opponents=2, samples=2000, seed=1)
+    assert cached["method"] == "table" and cached["equity"] == first.results["AKs"]["1"]["equity"]
+    assert cached.keys() == sampled.keys()
+    assert "2" not in first.results["AKs"] and casino.PreflopEquityTable(first.path).results == first.results
+
+
+# ------------------ Chip Ledger ------------------
+
+CRASHING_LEDGER = """
+import importlib.util, json, os, sys
+spec = importlib.util.spec_from_file_location("pypop", sys.argv[1])
+casino = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(casino)
+ledger = casino.ChipLedger(sys.argv[2], flush_interval=3600)
+rng = casino.random.Random(13)
+for index in range(5000):
+    ledger.record(f"p{index % 7}", "roulette", "bet", rng.randint(-50, 50))
+ledger.flush()
+print(json.dumps(ledger.balances), flush=True)
+ledger.record("p0", "roulette", "payout", 10 ** 6)  # Never committed
+os._exit(1)
+"""
+
+
+def test_chip_ledger_survives_a_crash_and_replays_the_same_balances(tmp_path):
+    """
+    A process killed without closing its ledger keeps every committed entry, and replays rebuild the balances.
+    """
+    path = str(tmp_path / "ledger.sqlite3")
+    crashed = subprocess.run([sys.executable, "-c", CRASHING_LEDGER, casino.__file__, path],
+                             capture_output=True, text=True, env={**os.environ, "HOME": str(tmp_path)})
+    assert crashed.returncode == 1
+    committed = json.loads(crashed.stdout)
+
+    ledger = casino.ChipLedger(path)
+    try:
+        assert ledger.balances == committed and ledger.next_id == 5001
+        totals = dict(ledger.connection.execute("SELECT account, SUM(amount) FROM entries GROUP BY account"))
+        assert totals == committed
+        ledger.connection.execute("DELETE FROM balances")  # Lose the balance table: replay it from the log
+        assert ledger.replay().balances == committed
+        ledger.connection.execute("UPDATE balances SET chips = 0")
+        assert ledger.replay(full=True).balances == committed
+        assert ledger.record("p0", "casino", "open", 1) == committed["p0"] + 1
+    finally:
+        ledger.close()
+
+
+# ------------------ Table Server ------------------
+
+@pytest.fixture
+def ledger():
+    """
+    Keep chips in a throwaway in-memory ledger.
+    """
+    ledger = casino.ChipLedger(":memory:")
+    yield ledger
+    ledger.close()
+
+
+def seat(table, ledger, *names):
+    """
+    Seat new players with 1000 chips each at a table and return them.
+    """
+    players = [casino.Player(name, ledger, 1000) for name in names]
+    for player in players:
+        player.table = table
+        table.join(player)
+    return players
+
+
+def test_holdem_table_plays_raises_and_side_pots(ledger):
+    """
+    A networked hand runs on the hold'em engine: blinds, a raise, a short stack's all-in and a side pot.
+    """
+    table = casino.HoldemTable(1, rng=casino.random.Random(21))
+    a, b = seat(table, ledger, "a", "b")
+    c = casino.Player("c", ledger, 100)
+    table.join(c)
+    _, events = table.handle(a, "DEAL", [])
+    assert (a, "EVENT holdem deal button a blinds 5/10") in events
+    assert (a, "EVENT holdem turn a fold call 10 raise 20-1000") in events
+    assert (b.chips, c.chips) == (995, 90)  # Blinds are taken as they are posted
+    hand = table.core.hand
+    hand.hole_cards = casino.array('B', [44, 45, 5, 14, 48, 49])  # a: KK, b: 3 5, c: AA
+    board = iter([0, 21, 30, 39, 8])  # 2 7 9 J 4 in mixed suits, no flush or straight
+    table.core.deck.draw = lambda count: [next(board) for _ in range(count)]
+    table.handle(a, "RAISE", ["40"])
+    table.handle(b, "CALL", [])
+    _, events = table.handle(c, "RAISE", ["100"])
+    assert c.chips == 0 and (a, "EVENT holdem raise c to 100") in events
+    table.handle(a, "CALL", [])
+    _, events = table.handle(b, "CALL", [])
+    assert (c, f"EVENT holdem street flop {casino.hand_codes([0, 21, 30])}") in events
+    assert (b, "EVENT holdem turn b check bet 10-900") in events
+    table.handle(b, "CHECK", [])
+    table.handle(a, "BET", ["100"])
+    table.handle(b, "CALL", [])
+    for player in (b, a, b, a):  # Turn and river
+        _, events = table.handle(player, "CHECK", [])
+    assert (b, "EVENT holdem won pot 500 a:200 c:300") in events
+    assert (a.chips, b.chips, c.chips) == (1000, 800, 300)
+    assert table.stakes == {} and table.core.phase == "settled"
+
+
+def test_holdem_table_checks_turns_and_amounts(ledger):
+    """
+    Commands out of turn, illegal actions and raises outside the legal range are refused without moving chips.
+    """
+    table = casino.HoldemTable(1, rng=casino.random.Random(22))
+    a, b = seat(table, ledger, "a", "b")
+    table.handle(a, "DEAL", [])
+    for player, command, args in ((b, "CALL", []), (a, "CHECK", []), (a, "RAISE", ["15"]), (a, "RAISE", [])):
+        with pytest.raises(ValueError):
+            table.handle(player, command, args)
+    assert (a.chips, b.chips) == (995, 990)
+
+
+def test_holdem_leave_ends_the_hand_when_one_player_is_left(ledger):
+    """
+    A player leaving on their turn folds, finishing the hand instead of locking the pot.
+    """
+    table = casino.HoldemTable(1, rng=casino.random.Random(1))
+    a, b = seat(table, ledger, "a", "b")
+    table.handle(a, "DEAL", [])
+    table.handle(a, "CALL", [])
+    events = table.leave(b)
+    assert any(line.startswith("EVENT holdem won pot 20") for _, line in events)
+    assert (a.chips, b.chips, table.core.phase) == (1010, 990, "settled")
+    (c,) = seat(table, ledger, "c")
+    assert table.handle(c, "DEAL", [])[0] == "OK dealt"
+
+
+def test_holdem_leave_passes_the_turn_on(ledger):
+    """
+    When the player to act leaves, the next player is told it is their turn; a player who left out of turn
+    is folded when the turn reaches them.
+    """
+    table = casino.HoldemTable(1, rng=casino.random.Random(2))
+    a, b, c = seat(table, ledger, "a", "b", "c")
+    table.handle(a, "DEAL", [])  # a has the button and acts first, b and c post the blinds
+    events = table.leave(a)
+    assert (b, "EVENT holdem turn b fold call 5 raise 20-1000") in events
+    assert table.leave(c) == []
+    _, events = table.handle(b, "CALL", [])
+    assert (b, "EVENT holdem won pot 20 b:20") in events
+    assert (a.chips, b.chips, c.chips) == (1000, 1010, 990)
+
+
+def test_roulette_player_joining_after_a_leave_keeps_their_own_bets(ledger):
+    """
+    A player who bets after another has left is settled on their own bets, not on a remaining player's.
+    """
+    table = casino.RouletteTable(1)
+    a, b = seat(table, ledger, "a", "b")
+    table.handle(a, "BET", ["100", "color", "red"])
+    table.handle(b, "BET", ["100", "color", "red"])
+    table.leave(a)
+    (c,) = seat(table, ledger, "c")
+    table.handle(c, "BET", ["100", "color", "black"])
+    table.wheel.spin_wheel = lambda: 17  # Black
+    table.handle(b, "SPIN", [])
+    assert (a.chips, b.chips, c.chips) == (1000, 900, 1100)
+
+
+def restored(table, ledger):
+    """
+    Return a copy of a table rebuilt from its snapshot, with its players recreated from the ledger.
+    """
+    return type(table)(table.table_id).restore(table.snapshot(), casino.PlayerDirectory(ledger))
+
+
+def test_restored_tables_refund_open_hands(ledger):
+    """
+    Players leaving tables restored from a checkpoint get back the stakes of hands the old process never settled.
+    """
+    holdem = casino.HoldemTable(1, rng=casino.random.Random(5))
+    a, b = seat(holdem, ledger, "a", "b")
+    holdem.handle(a, "DEAL", [])
+    holdem.handle(a, "RAISE", ["60"])
+    holdem = restored(holdem, ledger)
+    for player in list(holdem.seats):
+        holdem.leave(player, refund=True)
+    assert (a.chips, b.chips, holdem.core.hand, holdem.stakes) == (1000, 1000, None, {})
+
+    blackjack = casino.BlackjackTable(1, rng=casino.random.Random(6))
+    (c,) = seat(blackjack, ledger, "c")
+    while blackjack.seats[c].phase != "player":
+        blackjack.handle(c, "BET", ["100"])
+    chips = c.chips + 100
+    blackjack = restored(blackjack, ledger)
+    for player in list(blackjack.seats):
+        blackjack.leave(player, refund=True)
+    assert c.chips == chips
+
+
+def test_blackjack_pays_whole_chips(ledger):
+    """
+    Surrenders on odd bets and naturals paid 6:5 pay whole chips, rounded down, and report that same amount.
+    """
+    rules = casino.BlackjackRules(blackjack_payout=1.2, surrender=True)
+    table = casino.BlackjackTable(1, rng=casino.random.Random(8), rules=rules)
+    (a,) = seat(table, ledger, "a")
+    surrendered = naturals = 0
+    while not (surrendered and naturals):
+        chips = a.chips
+        reply, _ = table.handle(a, "BET", ["7"])
+        core = table.seats[a]
+        if core.phase == "player":
+            reply, _ = table.handle(a, "SURRENDER", [])
+            assert (core.payout, core.exact_payout, a.chips) == (3, 3.5, chips - 4)
+            surrendered += 1
+        elif core.hands[0].natural and not core.dealer_hand.natural:
+            assert (core.payout, a.chips) == (15, chips + 8)  # 7 back plus 8.4 rounded down
+            naturals += 1
+        assert reply.endswith(f"chips {a.chips}") and isinstance(core.payout, int)
+
+
+# ------------------ Blackjack ------------------
+
+def test_blackjack_rules_refuse_shoes_too_big_for_shoe_keys():
+    """
+    Shoe keys pack each rank's count into a byte, so rules stop at MAX_DECKS decks and bigger shoes are refused.
+    """
+    assert casino.BlackjackRules(decks=casino.MAX_DECKS).decks == casino.MAX_DECKS
+    for decks in (0, casino.MAX_DECKS + 1):
+        with pytest.raises(ValueError):
+            casino.BlackjackRules(decks=decks)
+    with pytest.raises(ValueError):
+        casino.shoe_key([64] * 9 + [256])
+    counts = [4 * casino.MAX_DECKS] * 9 + [16 * casino.MAX_DECKS]
+    assert casino.shoe_counts(casino.shoe_key(counts)) == counts
+
+
+def test_count_edge_simulation_agrees_with_the_exact_house_edge():
+    """
+    Over all true counts, the count simulator's edge matches the exact analysis of the same rules.
+    """
+    stats = casino.simulate_count_edge(2000, seed=1)
+    edge, _ = casino.exact_house_edge(casino.BlackjackRules(), workers=1)
+    low, high = stats.overall.confidence_interval()
+    assert low < -edge < high and abs(stats.overall.mean + edge) < 0.005
+
+
+
+def dict_hand_total(cards):
+    """
+    Total a hand of deckofcardsapi card dicts the way the game did before it used integer cards.
+    """
+    values = [11 if card["value"] == "ACE" else 10 if card["value"] in ("JACK", "QUEEN", "KING") else
+              int(card["value"]) for card in cards]
+    total, aces = sum(values), values.count(11)
+    while total > 21 and aces:
+        total -= 10
+        aces -= 1
+    return total
+
+
+def test_integer_hands_total_like_api_card_dicts():
+    """
+    Cards convert once from API dicts, and hand totals kept as cards are added match totalling the dicts.
+    """
+    assert [casino.card_index(card) for card in casino.CARD_DICTS] == list(range(52))
+    rng = casino.random.Random(8)
+    for _ in range(5000):
+        cards = rng.sample(range(52), rng.randint(2, 6))
+        hand = casino.BlackjackHand(cards[:1])
+        for card in cards[1:]:
+            hand += [card]
+        expected = dict_hand_total([casino.make_card_dict(card) for card in cards])
+        assert hand.total == casino.BlackjackGame.calculate_hand(cards) == expected
+        assert hand.natural == (len(cards) == 2 and expected == 21)
+        assert list(hand) == cards
+
+
+# ------------------ Headless Simulation ------------------
+
+@pytest.mark.parametrize("game, rounds, options", [
+    ("roulette", 20_000, {"bet_details": {"type": "color", "color": "red"}}),
+    ("slots", 20_000, {}),
+    ("blackjack", 400, {}),
+])
+def test_sharded_simulations_do_not_depend_on_the_worker_count(game, rounds, options):
+    """
+    Shards are seeded and merged in order, so one worker and a process pool give the same statistics.
+    """
+    serial = casino.run_sharded(game, rounds, seed=6, shards=8, workers=1, **options)
+    pooled = casino.run_sharded(game, rounds, seed=6, shards=8, workers=2, **options)
+    assert serial.rounds == pooled.rounds == rounds
+    assert (serial.total, serial.total_sq, serial.histogram) == (pooled.total, pooled.total_sq, pooled.histogram)
+    assert serial.summary() != casino.run_sharded(game, rounds, seed=7, shards=8, workers=1, **options).summary()
+
+
+
+def test_simulations_are_seeded_and_centred_on_the_exact_edge():
+    """
+    Seeded simulations repeat exactly, and their confidence intervals cover the exact roulette and slot returns.
+    """
+    red = {"type": "color", "color": "red"}
+    stats = casino.simulate_roulette(1_000_000, red, seed=5)
+    assert stats.summary() == casino.simulate_roulette(1_000_000, red, seed=5).summary()
+    low, high = stats.confidence_interval()
+    assert low < -1 / 37 < high and stats.variance == pytest.approx(1, abs=0.01)
+
+    stats = casino.simulate_slots(1_000_000, seed=5, **casino.FIVE_LINE_SLOT)
+    low, high = stats.confidence_interval()
+    assert low < casino.SlotCore(**casino.FIVE_LINE_SLOT).paytable_report()["rtp"] - 1 < high
+
+    first, second = (casino.simulate_blackjack(300, casino.optimal_strategy, seed=5) for _ in range(2))
+    assert (first.rounds, first.total, first.histogram) == (second.rounds, second.total, second.histogram)
+
+
+
+def test_tournaments_rank_every_seat_and_keep_every_chip():
+    """
+    Each freeze-out ranks the seats 1 to 3 with the winner holding every chip, blinds follow the schedule,
+    and sharded tournament statistics do not depend on the worker count.
+    """
+    rng = casino.NumpySource(20)
+    deck = casino.LocalShoe(deck_count=1, penetration=1.0, rng=rng)
+    blinds = []
+
+    def watched(hand, rng):
+        """
+        Play the passive bot, noting the big blind of every hand it acts in.
+        """
+        blinds.append(hand.big_blind)
+        return casino.passive_bot(hand, rng)
+
+    players = [watched, casino.random_bot, casino.value_bot]
+    levels = set()
+    for _ in range(20):
+        blinds.clear()
+        places, hands, survived, curve = casino.play_tournament(players, rng, deck, hands_per_level=5)
+        winner = places.index(1)
+        assert sorted(places) == [1, 2, 3] and survived[winner] == hands
+        assert all(sum(stacks) == 3000 for stacks in zip(*curve)) and curve[winner][-1] == 3000
+        assert blinds == sorted(blinds) and set(blinds) <= {big for _, big in casino.BLIND_SCHEDULE}
+        levels.add(len(set(blinds)))
+    assert max(levels) > 1
+
+    serial = casino.run_sharded("tournament", 16, seed=20, shards=4, workers=1)
+    pooled = casino.run_sharded("tournament", 16, seed=20, shards=4, workers=2)
+    assert serial.summary() == pooled.summary() and sum(serial.wins) == serial.tournaments == 16
+    assert sum(row["average_finish"] for row in serial.summary()) == pytest.approx(6)
+
+
+# ------------------ Slot Machine ------------------
+
+def test_slot_paytable_report_matches_every_spin_enumerated():
+    """
+    The vectorized RTP calculator agrees with paying out every combination of reel stops one spin at a time.
+    """
+    machine = casino.SlotCore(**casino.FIVE_LINE_SLOT)
+    nets, hits = [], 0
+    for stops in itertools.product(range(machine.stops), repeat=3):
+        window = [[machine.emojis[machine.windows[reel, stop, row]] for reel, stop in enumerate(stops)]
+                  for row in range(3)]
+        nets.append(machine.net_payout(window, 1) / len(machine.paylines))
+        hits += any(machine.line_pays(window))
+    nets = casino.np.array(nets)
+    report = machine.paytable_report()
+    assert report["combinations"] == len(nets) == machine.stops ** 3
+    assert report["rtp"] == pytest.approx(1 + nets.mean())
+    assert report["hit_frequency"] == pytest.approx(hits / len(nets))
+    assert report["variance"] == pytest.approx(nets.var())
+    assert round(report["rtp"], 3) == 0.969 and round(report["hit_frequency"], 3) == 0.407
+
+
+# ------------------ Hand History ------------------
+
+WAGERS = [  # Game, player, stake, returned, bet type
+    ("blackjack", "ann", 10, 25, "hand"), ("blackjack", "bob", 10, 0, "hand"), ("slots", "ann", 5, 0, "spin"),
+    ("roulette", "bob", 2, 72, "straight"), ("roulette", "cat", 4, 8, "color"), ("roulette", "ann", 1, 0, "straight"),
+    ("holdem", "cat", 20, 45, "hand"), ("slots", "bob", 5, 15, "spin"), ("blackjack", "cat", 10, 20, "hand"),
+]
+
+
+def test_history_chunks_and_summary_match_the_recorded_wagers(tmp_path):
+    """
+    Rows come back chunk by chunk, memory-mapped, with players renumbered per chunk, and the summary's games,
+    bet types and players add up to the wagers recorded.
+    """
+    history = casino.HandHistory(str(tmp_path), chunk_rows=4)
+    for game, player, stake, returned, bet_type in WAGERS:
+        history.record(game, player, stake, returned, bet_type)
+    history.record_many("slots", "dan", [1, 1, 1, 1], [0, 2, 0, 0], "spin")
+    wagers = WAGERS + [("slots", "dan", 1, returned, "spin") for returned in (0, 2, 0, 0)]
+    reader = casino.HistoryReader(str(tmp_path))
+    assert sum(len(columns["game"]) for columns, _ in reader.chunks()) == 12  # The last row is not written yet
+    history.close()
+
+    rows = []
+    for columns, players in reader.chunks():
+        assert isinstance(columns["stake"], casino.np.memmap) and len(columns["stake"]) <= 4
+        rows += [(casino.HISTORY_GAMES[game], players[player], stake, returned, casino.HISTORY_BET_TYPES[bet_type])
+                 for game, player, stake, returned, bet_type in zip(
+                     *(columns[name].tolist() for name in ("game", "player", "stake", "returned", "bet_type")))]
+    assert rows == wagers and len(list(reader.chunks())) == 4
+
+    report = reader.summary()
+    for game in casino.HISTORY_GAMES:
+        played = [wager for wager in wagers if wager[0] == game]
+        units = casino.np.array([(returned - stake) / stake for _, _, stake, returned, _ in played])
+        staked = sum(wager[2] for wager in played)
+        assert report["games"][game]["wagers"] == len(played)
+        assert report["games"][game]["rtp"] == pytest.approx(sum(wager[3] for wager in played) / staked)
+        assert report["games"][game]["volatility"] == pytest.approx(units.std())
+    assert report["bet_types"]["roulette"] == {"straight": {"wagers": 2, "share": 3 / 7},
+                                               "color": {"wagers": 1, "share": 4 / 7}}
+    for name in ("ann", "bob", "cat", "dan"):
+        played = [wager for wager in wagers if wager[1] == name]
+        assert report["players"][name] == {"wagers": len(played), "staked": sum(wager[2] for wager in played),
+                                           "net": sum(wager[3] - wager[2] for wager in played)}
+
+
+# ------------------ Risk Limits ------------------
+
+def test_risk_engine_refuses_bets_over_each_limit(monkeypatch):
+    """
+    Bets over a player, table, session or exposure limit are refused with a breach event and leave the counters
+    alone; bets up to the limits are counted.
+    """
+    engine = casino.RiskEngine(casino.RiskLimits(max_bet=100, session_loss=150, table_max_bet=80, max_exposure=1000))
+    events = []
+    engine.listeners.append(events.append)
+    engine.player_limits["bob"] = casino.RiskLimits(max_bet=10)
+
+    assert engine.place_bet("ann", 1, 101)["limit"] == "max_bet"
+    assert engine.place_bet("ann", 1, 81)["limit"] == "table_max_bet"
+    assert engine.place_bet("ann", 1, 80) is None and engine.place_bet("ann", 1, 70) is None
+    breach = engine.place_bet("ann", 1, 1)
+    assert (breach["limit"], breach["value"], breach["threshold"]) == ("session_loss", 151, 150)
+    assert engine.sessions["ann"] == [0, 150]
+    engine.settle("ann", 150, 0)
+    assert engine.sessions["ann"] == [-150, 0] and engine.session_limit_reached("ann")
+    assert engine.place_bet("ann", 1, 1)["limit"] == "session_loss"
+
+    assert engine.place_bet("bob", 1, 11)["limit"] == "max_bet"
+    assert engine.place_bet("bob", 1, 10) is None
+
+    wheel = casino.RouletteCore()
+    straight = wheel.payout_vector({"type": "straight", "number": 17})
+    assert engine.place_bet("cat", 2, 20, straight) is None  # The house would owe 700 on 17
+    breach = engine.place_bet("dan", 2, 30, straight)
+    assert (breach["limit"], breach["number"], breach["value"]) == ("max_exposure", 17, 1750)
+    assert engine.exposure[2][17] == 700 and engine.sessions["dan"] == [0, 0]
+    engine.clear_exposure(2)
+    assert engine.place_bet("dan", 2, 28, straight) is None  # 980 once the last spin is settled
+
+    assert events == list(engine.breaches) and [event["limit"] for event in events] == [
+        "max_bet", "table_max_bet", "session_loss", "session_loss", "max_bet", "max_exposure"]
+    monkeypatch.setattr(casino, "_risk", engine)
+    with pytest.raises(ValueError, match="maximum bet is 10"):
+        casino.check_bet_limits("bob", 1, 20)